@@ -3,59 +3,102 @@
 # of the various concurrency strategies.
 ###########################################################
 
+import argparse
+import importlib
+import json
+import os
 import threading
 import time
 import queue
 from multiprocessing import Pool
+from concurrent.futures import ProcessPoolExecutor
 import asyncio
+from dataclasses import asdict
+from functools import partial
+
+from generate_corpus import load_corpus
+from run_stats import measure, rss_source
+from stats_cache import StatsCache
+
+try:
+    from concurrent.futures import InterpreterPoolExecutor  # Python 3.14+
+except ImportError:
+    InterpreterPoolExecutor = None
 
 q = queue.Queue()   # For thread sync
+WORK_SECONDS = 2    # simulated processing time per file
+MAX_PROCESSES = 64  # one process per file stops being sensible for large corpora
+
+def split_cached(files, cache):
+    # -> (lines and chars already known from the cache, [(file, cache key)] still to process)
+    # Workers store their result under the key taken here, so with --hash
+    # each file is hashed once per run.
+    if cache is None:
+        return 0, 0, [(file, None) for file in files]
+    cached_lines = 0
+    cached_chars = 0
+    todo = []
+    for file in files:
+        key = cache.key(file)
+        stats = cache.get(key)
+        if stats is None:
+            todo.append((file, key))
+        else:
+            cached_lines += stats[0]
+            cached_chars += stats[1]
+    return cached_lines, cached_chars, todo
 
-def process_seq(name):
+def process_seq(name, cache=None, encoding=None, key=None):
     print(f"Processing {name}...")
+    if cache and key is None:
+        key = cache.key(name)
     num_lines = 0
     num_chars = 0
-    with open(name, 'r') as f:
+    with open(name, 'r', encoding=encoding) as f:
         for line in f:
             processed_line = line.strip()
             if len(processed_line) > 0:
                 num_lines += 1
                 num_chars += len(processed_line)
-        time.sleep(2)  # simulates file processing
+        time.sleep(WORK_SECONDS)  # simulates file processing
+    if cache:
+        cache.put(key, (num_lines, num_chars))
     return num_lines, num_chars
 
-def process_files_seq(files):
+def process_files_seq(files, cache=None, encoding=None):
     start = time.perf_counter()
-    total_lines = 0
-    total_chars = 0
-    for file in files:
-        seq_lines, seq_chars = process_seq(file)
+    total_lines, total_chars, files = split_cached(files, cache)
+    for file, key in files:
+        seq_lines, seq_chars = process_seq(file, cache, encoding, key)
         total_lines += seq_lines
         total_chars += seq_chars
 
     dur = f"{(time.perf_counter() - start):.2f} s"
     return dur, total_lines, total_chars
 
-def process_thread(name):
+def process_thread(name, cache=None, encoding=None, key=None):
     print(f"Processing {name}...")
+    if cache and key is None:
+        key = cache.key(name)
     num_lines = 0
     num_chars = 0
-    with open(name, 'r') as f:
+    with open(name, 'r', encoding=encoding) as f:
         for line in f:
             processed_line = line.strip()
             if len(processed_line) > 0:
                 num_lines += 1
                 num_chars += len(processed_line)
-        time.sleep(2)  # simulates file processing
+        time.sleep(WORK_SECONDS)  # simulates file processing
+    if cache:
+        cache.put(key, (num_lines, num_chars))
     q.put((num_lines, num_chars))
 
-def process_files_threaded(files):
+def process_files_threaded(files, cache=None, encoding=None):
     start = time.perf_counter()
     threads = []
-    total_lines = 0
-    total_chars = 0
-    for file in files:
-        thread = threading.Thread(target=process_thread, args=(file,))
+    total_lines, total_chars, files = split_cached(files, cache)
+    for file, key in files:
+        thread = threading.Thread(target=process_thread, args=(file, cache, encoding, key))
         threads.append(thread)
 
     # Start all the threads
@@ -75,12 +118,19 @@ def process_files_threaded(files):
     dur = f"{(time.perf_counter() - start):.2f} s"
     return dur, total_lines, total_chars
 
-def process_files_multiprocessing(files):
+def _process_keyed(item, cache=None, encoding=None):
+    # Pool.map passes one argument: a (file, cache key) pair from split_cached
+    name, key = item
+    return process_seq(name, cache, encoding, key)
+
+def process_files_multiprocessing(files, cache=None, encoding=None):
     start = time.perf_counter()
-    total_lines = 0
-    total_chars = 0
-    with Pool(len(files)) as p:
-        results = p.map(process_seq, files)
+    total_lines, total_chars, files = split_cached(files, cache)
+    results = []
+    if files:
+        # Workers get a pickled copy of the cache and write their own entries
+        with Pool(min(len(files), MAX_PROCESSES), initializer=_init_worker, initargs=(WORK_SECONDS,)) as p:
+            results = p.map(partial(_process_keyed, cache=cache, encoding=encoding), files)
 
     for result in results:
         num_lines, num_chars = result
@@ -91,65 +141,241 @@ def process_files_multiprocessing(files):
     dur = f"{(end - start):.2f} s"
     return dur, total_lines, total_chars
 
-async def process_file_async(file):
+async def process_file_async(file, cache=None, encoding=None, key=None):
     print(f"Processing {file}...")
+    if cache and key is None:
+        key = cache.key(file)
     num_lines = 0
     num_chars = 0
-    with open(file, 'r') as f:
+    with open(file, 'r', encoding=encoding) as f:
         for line in f:
             processed_line = line.strip()
             if len(processed_line) > 0:
                 num_lines += 1
                 num_chars += len(processed_line)
-        await asyncio.sleep(2)  # simulates file processing
+        await asyncio.sleep(WORK_SECONDS)  # simulates file processing
+    if cache:
+        cache.put(key, (num_lines, num_chars))
     return num_lines, num_chars
 
-async def process_files_async(files):
+async def process_files_async(files, cache=None, encoding=None):
     start = time.perf_counter()
     results = []
+    cached_lines, cached_chars, files = split_cached(files, cache)
 
-    tasks = [asyncio.create_task(process_file_async(file)) for file in files]
+    tasks = [asyncio.create_task(process_file_async(file, cache, encoding, key)) for file, key in files]
 
     for task in tasks:
         results.append(await task)
 
-    total_lines = sum(r[0] for r in results)
-    total_chars = sum(r[1] for r in results)
+    total_lines = cached_lines + sum(r[0] for r in results)
+    total_chars = cached_chars + sum(r[1] for r in results)
 
     dur = f"{(time.perf_counter() - start):.2f} s"
     return dur, total_lines, total_chars
 
-def main():
-    files = [f"resources/file-{i}.txt" for i in range(1, 11)]
-    # Sequential processing
-    print("Starting sequential processing...")
-    print( "----------------------------------------------------------")
-    seq_dur, total_seq_lines, total_seq_chars = process_files_seq(files)
+def read_file(name, encoding=None):
+    with open(name, 'r', encoding=encoding) as f:
+        return f.read()
 
-    # Threaded processing
-    print("Starting concurrent thread processing...")
-    print("----------------------------------------------------------")
-    thread_dur, total_thread_lines, total_thread_chars = process_files_threaded(files)
+def count_buffer(buffer):
+    # Runs in a worker process: the CPU-bound part of the pipeline.
+    # Walks the buffer line by line instead of split(), which would hold a
+    # second copy of the whole file.
+    num_lines = 0
+    num_chars = 0
+    start = 0
+    end = len(buffer)
+    while start < end:
+        newline = buffer.find('\n', start)
+        if newline == -1:
+            newline = end
+        processed_line = buffer[start:newline].strip()
+        if len(processed_line) > 0:
+            num_lines += 1
+            num_chars += len(processed_line)
+        start = newline + 1
+    time.sleep(WORK_SECONDS)  # simulates file processing
+    return num_lines, num_chars
+
+async def process_file_hybrid(executor, name, cache=None, limit=None, encoding=None, key=None):
+    print(f"Processing {name}...")
+    loop = asyncio.get_running_loop()
+    if cache and key is None:
+        key = cache.key(name)
+    # The event loop schedules the I/O, the process pool does the counting.
+    # A buffer is held from its read until its count is done, so the limit
+    # bounds how many files are in memory at once.
+    async with limit or asyncio.Semaphore(1):
+        buffer = await asyncio.to_thread(read_file, name, encoding)
+        stats = await loop.run_in_executor(executor, count_buffer, buffer)
+        del buffer
+    if cache:
+        await asyncio.to_thread(cache.put, key, stats)
+    return stats
+
+# Sample run on the ten resource files (1 CPU, 2 s simulated work per file):
+#   Sequential 20.01 s | Threaded 2.00 s | Multiprocessing 2.07 s
+#   Asyncio 2.00 s     | Async+Processes 2.07 s
+# With real CPU-bound counting only the process-backed strategies scale with cores;
+# the hybrid one also keeps reads off the workers and reports files as they finish.
+async def process_files_hybrid(files, executor=None, cache=None, max_in_flight=None, encoding=None):
+    start = time.perf_counter()
+    total_lines, total_chars, files = split_cached(files, cache)
+    own_executor = executor is None and len(files) > 0
+    workers = min(len(files), MAX_PROCESSES)
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(WORK_SECONDS,))
+    else:
+        workers = getattr(executor, "_max_workers", None) or os.cpu_count() or 1
+    # Reads run at most this far ahead of the workers: one file each in
+    # progress plus one queued, however large the corpus
+    limit = asyncio.Semaphore(max_in_flight or 2 * workers)
 
-    # Multiprocessing
-    print("Starting concurrent multiprocessing...")
-    print("----------------------------------------------------------")
-    multi_dur, multi_lines, multi_chars = process_files_multiprocessing(files)
+    try:
+        tasks = [asyncio.create_task(process_file_hybrid(executor, file, cache, limit, encoding, key))
+                 for file, key in files]
 
-    # Asyncio
-    print("Starting concurrent asynchronous processing...")
-    print("----------------------------------------------------------")
-    asyncio_dur, asyncio_lines, asyncio_chars = asyncio.run(process_files_async(files))
+        # Aggregate results in completion order, not submission order
+        for next_done in asyncio.as_completed(tasks):
+            num_lines, num_chars = await next_done
+            total_lines += num_lines
+            total_chars += num_chars
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    dur = f"{(time.perf_counter() - start):.2f} s"
+    return dur, total_lines, total_chars
+
+def _importable(fn):
+    # Sub-interpreters unpickle callables by module name; when this file runs
+    # as a script its functions live in __main__, which they cannot import.
+    if fn.__module__ == "__main__":
+        module = importlib.import_module(os.path.splitext(os.path.basename(__file__))[0])
+        return getattr(module, fn.__name__)
+    return fn
+
+def _init_worker(work_seconds):
+    # Workers that import this module afresh need the configured work time
+    global WORK_SECONDS
+    WORK_SECONDS = work_seconds
+
+def process_files_interpreters(files, cache=None, encoding=None):
+    # One interpreter (and GIL) per worker, without fork/spawn or pickling the
+    # whole process state. Falls back to processes before Python 3.14.
+    start = time.perf_counter()
+    total_lines, total_chars, files = split_cached(files, cache)
+    executor_cls = InterpreterPoolExecutor or ProcessPoolExecutor
+    if files:
+        with executor_cls(max_workers=min(len(files), MAX_PROCESSES),
+                          initializer=_importable(_init_worker), initargs=(WORK_SECONDS,)) as executor:
+            count = partial(_importable(_process_keyed), cache=cache, encoding=encoding)
+            for num_lines, num_chars in executor.map(count, files):
+                total_lines += num_lines
+                total_chars += num_chars
+
+    dur = f"{(time.perf_counter() - start):.2f} s"
+    return dur, total_lines, total_chars
+
+def main(argv=None):
+    global WORK_SECONDS
+    parser = argparse.ArgumentParser(description="Compare file processing concurrency strategies")
+    parser.add_argument("--corpus", help="expected.json written by generate_corpus.py")
+    parser.add_argument("--work-seconds", type=float, default=WORK_SECONDS,
+                        help="simulated processing time per file")
+    parser.add_argument("--cache", help="stats index (SQLite) used to skip unchanged files")
+    parser.add_argument("--hash", action="store_true",
+                        help="also key cache entries on a SHA-256 of the content")
+    parser.add_argument("--json", help="also write the per-strategy measurements to this file")
+    parser.add_argument("--no-tracemalloc", action="store_true",
+                        help="skip tracemalloc, which slows down Python-heavy strategies")
+    args = parser.parse_args(argv)
+    WORK_SECONDS = args.work_seconds
+    cache = StatsCache(args.cache, use_hash=args.hash) if args.cache else None
+
+    def hit_rate():
+        # Hit rate of the strategy that just ran; each strategy starts afresh
+        if cache is None:
+            return "-"
+        rate = f"{cache.hit_rate:.0%}"
+        cache.reset_stats()
+        return rate
+
+    expected = None
+    encoding = None  # the bundled resources are read with the locale's encoding
+    if args.corpus:
+        files, exp_lines, exp_chars, encoding = load_corpus(args.corpus)
+        expected = (exp_lines, exp_chars)
+    else:
+        files = [f"resources/file-{i}.txt" for i in range(1, 11)]
+
+    # The last field marks strategies that start worker processes. Those run
+    # without tracemalloc: forked children would inherit the tracing hooks
+    # and its overhead would show up in the CPU times being compared.
+    strategies = [
+        ("Sequential", "Starting sequential processing...",
+         lambda: process_files_seq(files, cache, encoding), False),
+        ("Threaded", "Starting concurrent thread processing...",
+         lambda: process_files_threaded(files, cache, encoding), False),
+        ("Multiprocessing", "Starting concurrent multiprocessing...",
+         lambda: process_files_multiprocessing(files, cache, encoding), True),
+        ("Asyncio", "Starting concurrent asynchronous processing...",
+         lambda: asyncio.run(process_files_async(files, cache, encoding)), False),
+        ("Async+Processes", "Starting hybrid asyncio + process pool processing...",
+         lambda: asyncio.run(process_files_hybrid(files, cache=cache, encoding=encoding)), True),
+        ("Interpreters" if InterpreterPoolExecutor else "Interpreters*",
+         "Starting interpreter pool processing...",
+         lambda: process_files_interpreters(files, cache, encoding), InterpreterPoolExecutor is None),
+    ]
+
+    rows = []
+    for label, banner, run, starts_processes in strategies:
+        print(banner)
+        print("----------------------------------------------------------")
+        traced = not args.no_tracemalloc and not starts_processes
+        with measure(trace_python_allocations=traced) as stats:
+            dur, num_lines, num_chars = run()
+        rows.append({
+            "strategy": label.rstrip("*"),
+            "duration": dur,
+            "lines": num_lines,
+            "chars": num_chars,
+            "cache_hit_rate": hit_rate(),
+            "tracemalloc": traced,
+            **asdict(stats),
+        })
 
     # Summary
-    print( "----------------------------------------------------------")
-    print(f"| Strategy        | Duration   | # Lines    | # Chars    |")
-    print( "----------------------------------------------------------")
-    print(f"| Sequential      | {seq_dur:<10} | {total_seq_lines:<10} | {total_seq_chars:<10} |")
-    print(f"| Threaded        | {thread_dur:<10} | {total_thread_lines:<10} | {total_thread_chars:<10} |")
-    print(f"| Multiprocessing | {multi_dur:<10} | {multi_lines:<10} | {multi_chars:<10} |")
-    print(f"| Asyncio         | {asyncio_dur:<10} | {asyncio_lines:<10} | {asyncio_chars:<10} |")
-    print( "----------------------------------------------------------")
+    mb = 1024 * 1024
+    line = "-" * 141
+    print(line)
+    print(f"| Strategy        | Duration   | # Lines    | # Chars    | Cache hits | Peak RSS   "
+          f"| Procs | User CPU | Sys CPU  | Ctx switch | Py peak    |")
+    print(line)
+    for label, row in zip((s[0] for s in strategies), rows):
+        rss = f"{row['peak_rss_bytes'] / mb:.1f} MB"
+        user = f"{row['user_s']:.2f} s"
+        system = f"{row['sys_s']:.2f} s"
+        switches = row['voluntary_switches'] + row['involuntary_switches']
+        py_peak = f"{row['tracemalloc_peak_bytes'] / mb:.2f} MB" if row["tracemalloc"] else "-"
+        print(f"| {label:<15} | {row['duration']:<10} | {row['lines']:<10} | {row['chars']:<10} "
+              f"| {row['cache_hit_rate']:<10} | {rss:<10} | {row['peak_children']:<5} | {user:<8} "
+              f"| {system:<8} | {switches:<10} | {py_peak:<10} |")
+    if expected:
+        print(f"| {'Expected':<15} | {'':<10} | {expected[0]:<10} | {expected[1]:<10} "
+              f"| {'':<10} | {'':<10} | {'':<5} | {'':<8} | {'':<8} | {'':<10} | {'':<10} |")
+    print(line)
+    print(f"Peak RSS is this process plus its children (source: {rss_source()}); "
+          "Py peak is the tracemalloc peak of this process only, and is not traced (-) for "
+          "strategies that start processes.")
+    if InterpreterPoolExecutor is None:
+        print("* process pool fallback, InterpreterPoolExecutor needs Python 3.14+")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"files": len(files), "work_seconds": WORK_SECONDS, "runs": rows}, f, indent=2)
+        print(f"Wrote {args.json}")
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
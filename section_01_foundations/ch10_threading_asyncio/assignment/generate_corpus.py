@@ -0,0 +1,212 @@
+# This program generates reproducible text corpora for exercising the
+# file_process_sim strategies at scale. Next to the generated files it
+# writes an expected.json manifest with the per-file and total line and
+# character counts, computed with the same rules the strategies use
+# (a line counts when it is non-empty after strip()).
+#
+# Usage:
+#   python generate_corpus.py out/ --files 10000 --size-dist loguniform \
+#       --min-size 1K --max-size 50M --blank-ratio 0.2 --seed 7 --jobs 4
+#   python file_process_sim.py --corpus out/expected.json --work-seconds 0
+###########################################################
+
+import argparse
+import codecs
+import json
+import math
+import os
+import random
+import time
+from multiprocessing import Pool
+
+MAX_FILES = 1_000_000
+FILES_PER_SHARD = 1000      # keeps directories small for large corpora
+POOL_LINES = 2048           # distinct lines each corpus is assembled from
+CHUNK_BYTES = 1 << 20       # write buffer size
+
+SIZE_DISTRIBUTIONS = ("fixed", "uniform", "loguniform", "lognormal")
+BLANK_LINES = ["", "   ", "\t", " \t "]   # all of them count as empty
+
+ALPHABETS = {
+    "ascii": "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789",
+    "latin-1": "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789éèàüöçñß",
+    "unicode": "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789éüßąłżΩλжя漢字😀",
+}
+
+def parse_size(text):
+    # "512", "4K", "10M", "20G" -> bytes
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+    text = text.strip().upper().removesuffix("B")
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+def alphabet_for(encoding):
+    name = codecs.lookup(encoding).name
+    if name == "ascii":
+        return ALPHABETS["ascii"]
+    if name.startswith("utf"):
+        return ALPHABETS["unicode"]
+    return ALPHABETS["latin-1"]
+
+def build_line_pool(rng, alphabet, min_line, max_line):
+    # Every corpus is assembled from a fixed pool of lines so that generating
+    # gigabytes does not mean drawing every character from the RNG.
+    pool = []
+    for _ in range(POOL_LINES):
+        length = rng.randint(min_line, max_line)
+        chars = []
+        while len(chars) < length:
+            word = rng.choices(alphabet, k=rng.randint(1, 12))
+            if chars:
+                chars.append(" ")
+            chars.extend(word)
+        text = "".join(chars[:length]).strip()
+        indent = " " * rng.choice((0, 0, 0, 2, 4))
+        pool.append((indent + text, len(text)))
+    return pool
+
+def file_size(rng, dist, min_size, max_size):
+    if dist == "fixed":
+        return max_size
+    if dist == "uniform":
+        return rng.randint(min_size, max_size)
+    low, high = math.log(max(min_size, 1)), math.log(max(max_size, 1))
+    if dist == "loguniform":
+        value = math.exp(rng.uniform(low, high))
+    else:
+        # lognormal centred between the bounds, ~99.7% of the mass inside them
+        value = rng.lognormvariate((low + high) / 2, max(high - low, 1e-9) / 6)
+    return int(min(max(value, min_size), max_size))
+
+def write_file(path, target_size, rng, encoded_pool, blank_pool, header, blank_ratio):
+    num_lines = 0
+    num_chars = 0
+    written = 0
+    chunk = [header]
+    chunk_size = len(header)
+    with open(path, "wb") as f:
+        while written + chunk_size < target_size:
+            if rng.random() < blank_ratio:
+                chunk.append(rng.choice(blank_pool))
+            else:
+                data, chars = rng.choice(encoded_pool)
+                chunk.append(data)
+                num_lines += 1
+                num_chars += chars
+            chunk_size += len(chunk[-1])
+            if chunk_size >= CHUNK_BYTES:
+                f.write(b"".join(chunk))
+                written += chunk_size
+                chunk, chunk_size = [], 0
+        f.write(b"".join(chunk))
+        written += chunk_size
+    return num_lines, num_chars, written
+
+def _generate_one(job):
+    index, out_dir, params, encoded_pool, blank_pool, header = job
+    # Each file has its own RNG stream, so the corpus is identical no matter
+    # how many jobs generate it or in which order.
+    rng = random.Random(f"{params['seed']}:{index}")
+    size = file_size(rng, params["size_dist"], params["min_size"], params["max_size"])
+    rel_path = os.path.join(f"shard-{index // FILES_PER_SHARD:04d}", f"file-{index + 1}.txt")
+    num_lines, num_chars, num_bytes = write_file(
+        os.path.join(out_dir, rel_path), size, rng, encoded_pool, blank_pool, header,
+        params["blank_ratio"],
+    )
+    return {"path": rel_path, "lines": num_lines, "chars": num_chars, "bytes": num_bytes}
+
+def generate_corpus(out_dir, num_files=10, *, size_dist="uniform", min_size=1024,
+                    max_size=64 * 1024, min_line=20, max_line=120, blank_ratio=0.1,
+                    encoding="utf-8", seed=0, jobs=1):
+    if not 1 <= num_files <= MAX_FILES:
+        raise ValueError(f"num_files must be between 1 and {MAX_FILES:,}")
+    if size_dist not in SIZE_DISTRIBUTIONS:
+        raise ValueError(f"size_dist must be one of {', '.join(SIZE_DISTRIBUTIONS)}")
+    if not 0 <= min_size <= max_size:
+        raise ValueError("expected 0 <= min_size <= max_size")
+    if not 1 <= min_line <= max_line:
+        raise ValueError("expected 1 <= min_line <= max_line")
+    if not 0.0 <= blank_ratio <= 1.0:
+        raise ValueError("blank_ratio must be between 0 and 1")
+
+    params = {
+        "num_files": num_files, "size_dist": size_dist, "min_size": min_size,
+        "max_size": max_size, "min_line": min_line, "max_line": max_line,
+        "blank_ratio": blank_ratio, "encoding": codecs.lookup(encoding).name, "seed": seed,
+    }
+
+    # Encode the pool once; an incremental encoder emits the BOM (if any) only
+    # on its first call, which becomes the header of every file.
+    encoder = codecs.getincrementalencoder(encoding)()
+    header = encoder.encode("")
+    pool = build_line_pool(random.Random(f"{seed}:pool"), alphabet_for(encoding), min_line, max_line)
+    encoded_pool = [(encoder.encode(text + "\n"), chars) for text, chars in pool]
+    blank_pool = [encoder.encode(text + "\n") for text in BLANK_LINES]
+
+    os.makedirs(out_dir, exist_ok=True)
+    for shard in range((num_files - 1) // FILES_PER_SHARD + 1):
+        os.makedirs(os.path.join(out_dir, f"shard-{shard:04d}"), exist_ok=True)
+
+    start = time.perf_counter()
+    job_args = ((i, out_dir, params, encoded_pool, blank_pool, header) for i in range(num_files))
+    if jobs > 1:
+        with Pool(jobs) as p:
+            files = list(p.imap(_generate_one, job_args, chunksize=64))
+    else:
+        files = [_generate_one(job) for job in job_args]
+
+    manifest = {
+        "params": params,
+        "total_lines": sum(f["lines"] for f in files),
+        "total_chars": sum(f["chars"] for f in files),
+        "total_bytes": sum(f["bytes"] for f in files),
+        "generated_in": f"{(time.perf_counter() - start):.2f} s",
+        "files": files,
+    }
+    manifest_path = os.path.join(out_dir, "expected.json")
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    return manifest_path
+
+def load_corpus(manifest_path):
+    # -> (absolute file paths, expected lines, expected chars, encoding to read them with)
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    files = [os.path.join(base, entry["path"]) for entry in manifest["files"]]
+    return files, manifest["total_lines"], manifest["total_chars"], manifest["params"]["encoding"]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a reproducible text corpus")
+    parser.add_argument("out_dir")
+    parser.add_argument("--files", type=int, default=10, help=f"number of files (1 to {MAX_FILES:,})")
+    parser.add_argument("--size-dist", choices=SIZE_DISTRIBUTIONS, default="uniform",
+                        help="file size distribution; 'fixed' makes every file --max-size")
+    parser.add_argument("--min-size", type=parse_size, default="1K", help="e.g. 0, 512, 4K")
+    parser.add_argument("--max-size", type=parse_size, default="64K", help="e.g. 64K, 10M, 20G")
+    parser.add_argument("--min-line", type=int, default=20, help="shortest non-blank line (chars)")
+    parser.add_argument("--max-line", type=int, default=120, help="longest non-blank line (chars)")
+    parser.add_argument("--blank-ratio", type=float, default=0.1,
+                        help="fraction of lines that are empty or whitespace-only")
+    parser.add_argument("--encoding", default="utf-8")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--jobs", type=int, default=1, help="generator processes")
+    args = parser.parse_args(argv)
+
+    try:
+        manifest_path = generate_corpus(
+            args.out_dir, args.files, size_dist=args.size_dist, min_size=args.min_size,
+            max_size=args.max_size, min_line=args.min_line, max_line=args.max_line,
+            blank_ratio=args.blank_ratio, encoding=args.encoding, seed=args.seed, jobs=args.jobs,
+        )
+    except (ValueError, LookupError) as e:
+        parser.error(str(e))
+
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    print(f"Wrote {args.files} files ({manifest['total_bytes']:,} bytes) in {manifest['generated_in']}")
+    print(f"Expected: {manifest['total_lines']} lines, {manifest['total_chars']} chars -> {manifest_path}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+# Resource instrumentation for the file_process_sim strategies.
+# measure() wraps one strategy run and records:
+#   - peak RSS of this process plus all of its children (sampled)
+#   - user/system CPU time, including children that have been reaped
+#   - voluntary/involuntary context switches
+#   - the tracemalloc peak (Python allocations in this process only); pass
+#     trace_python_allocations=False around code that forks, since the
+#     children inherit the tracing and its CPU overhead
+#
+# psutil is used for RSS sampling when installed; otherwise /proc is read
+# directly (Linux), and elsewhere the ru_maxrss high-water mark is used.
+# The sampler thread itself adds ~100 context switches per second.
+###########################################################
+
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+SAMPLE_INTERVAL = 0.01
+
+@dataclass
+class RunStats:
+    wall_s: float = 0.0
+    user_s: float = 0.0
+    sys_s: float = 0.0
+    voluntary_switches: int = 0
+    involuntary_switches: int = 0
+    peak_rss_bytes: int = 0
+    peak_children: int = 0
+    tracemalloc_peak_bytes: int = 0
+    rss_source: str = ""
+
+    @property
+    def cpu_s(self):
+        return self.user_s + self.sys_s
+
+    @property
+    def context_switches(self):
+        return self.voluntary_switches + self.involuntary_switches
+
+def _proc_children(pid):
+    # Direct children of every thread of pid (needs CONFIG_PROC_CHILDREN)
+    children = []
+    try:
+        tids = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return children  # exited while we were walking the tree
+    for tid in tids:
+        try:
+            with open(f"/proc/{pid}/task/{tid}/children") as f:
+                children.extend(int(c) for c in f.read().split())
+        except OSError:
+            pass
+    for child in list(children):
+        children.extend(_proc_children(child))
+    return children
+
+def _proc_rss(pid):
+    with open(f"/proc/{pid}/statm") as f:
+        return int(f.read().split()[1]) * PAGE_SIZE
+
+def rss_source():
+    if psutil is not None:
+        return "psutil"
+    if os.path.exists("/proc/self/statm"):
+        return "procfs"
+    return "ru_maxrss"
+
+def sample_rss():
+    # -> (rss of this process plus all descendants, number of descendants)
+    source = rss_source()
+    if source == "psutil":
+        me = psutil.Process()
+        total = me.memory_info().rss
+        children = me.children(recursive=True)
+        for child in children:
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass  # exited between listing and sampling
+        return total, len(children)
+    if source == "procfs":
+        pid = os.getpid()
+        total = _proc_rss(pid)
+        children = _proc_children(pid)
+        for child in children:
+            try:
+                total += _proc_rss(child)
+            except OSError:
+                pass
+        return total, len(children)
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale, 0
+
+class RssSampler(threading.Thread):
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        super().__init__(name="rss-sampler", daemon=True)
+        self.interval = interval
+        self.peak_rss = 0
+        self.peak_children = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while True:
+            rss, children = sample_rss()
+            self.peak_rss = max(self.peak_rss, rss)
+            self.peak_children = max(self.peak_children, children)
+            if self._stop_event.wait(self.interval):
+                break
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+@contextmanager
+def measure(trace_python_allocations=True):
+    stats = RunStats(rss_source=rss_source())
+    sampler = RssSampler()
+    self_before = resource.getrusage(resource.RUSAGE_SELF)
+    children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # Don't take over tracemalloc if someone else (e.g. a test run) started it
+    own_tracing = trace_python_allocations and not tracemalloc.is_tracing()
+    if own_tracing:
+        tracemalloc.start()
+    elif trace_python_allocations:
+        tracemalloc.reset_peak()
+    sampler.start()
+    start = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        stats.wall_s = time.perf_counter() - start
+        sampler.stop()
+        if trace_python_allocations:
+            stats.tracemalloc_peak_bytes = tracemalloc.get_traced_memory()[1]
+        if own_tracing:
+            tracemalloc.stop()
+        self_after = resource.getrusage(resource.RUSAGE_SELF)
+        children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+        def delta(field):
+            return (getattr(self_after, field) - getattr(self_before, field)
+                    + getattr(children_after, field) - getattr(children_before, field))
+
+        stats.user_s = delta("ru_utime")
+        stats.sys_s = delta("ru_stime")
+        stats.voluntary_switches = delta("ru_nvcsw")
+        stats.involuntary_switches = delta("ru_nivcsw")
+        stats.peak_rss_bytes = sampler.peak_rss
+        stats.peak_children = sampler.peak_children
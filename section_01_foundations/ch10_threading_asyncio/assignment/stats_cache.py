@@ -0,0 +1,119 @@
+# A persistent per-file stats index for file_process_sim.
+# Entries are keyed on (path, size, mtime_ns) and optionally a SHA-256
+# of the content, and store (num_lines, num_chars). A changed file gets a
+# different key, so its stale entry simply stops matching.
+#
+# The index is a SQLite database in WAL mode: every thread and process
+# opens its own connection and concurrent writers wait on the database
+# lock instead of corrupting the file.
+###########################################################
+
+import hashlib
+import os
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS file_stats (
+    path      TEXT PRIMARY KEY,
+    size      INTEGER NOT NULL,
+    mtime_ns  INTEGER NOT NULL,
+    digest    TEXT NOT NULL,
+    num_lines INTEGER NOT NULL,
+    num_chars INTEGER NOT NULL
+)
+"""
+
+def file_digest(name):
+    h = hashlib.sha256()
+    with open(name, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+class StatsCache:
+    def __init__(self, path, use_hash=False, timeout=30.0):
+        self.path = path
+        self.use_hash = use_hash
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(SCHEMA)
+            conn.commit()
+        finally:
+            conn.close()
+
+    # Connections are per thread and per process; pickling (for Pool workers)
+    # only carries the settings, the worker reconnects on first use.
+    def __getstate__(self):
+        return {"path": self.path, "use_hash": self.use_hash, "timeout": self.timeout}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = self._connect()
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def key(self, name):
+        # Take the key *before* reading the file: if it changes while being
+        # processed, the stored entry is already stale and will be recomputed.
+        st = os.stat(name)
+        digest = file_digest(name) if self.use_hash else ""
+        return os.path.abspath(name), st.st_size, st.st_mtime_ns, digest
+
+    def get(self, key):
+        path, size, mtime_ns, digest = key
+        row = self._conn().execute(
+            "SELECT num_lines, num_chars FROM file_stats "
+            "WHERE path = ? AND size = ? AND mtime_ns = ? AND digest = ?",
+            (path, size, mtime_ns, digest),
+        ).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return row
+
+    def put(self, key, stats):
+        conn = self._conn()
+        with conn:  # one transaction per entry
+            conn.execute(
+                "INSERT OR REPLACE INTO file_stats VALUES (?, ?, ?, ?, ?, ?)",
+                (*key, *stats),
+            )
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -6,10 +6,12 @@ from pathlib import Path
 import types
 import time as _time
 
+import os
 import pytest
 
 # Change this to your module name/path if different
 import file_process_sim as m
+from generate_corpus import generate_corpus, load_corpus
 
 
 @pytest.fixture
@@ -45,6 +47,21 @@ def test_files(tmp_path: Path):
     return files, total_lines, total_chars
 
 
+@pytest.fixture
+def corpus(tmp_path: Path):
+    """
+    A generated corpus: set FILE_PROCESS_SIM_CORPUS to the expected.json of a
+    corpus built with generate_corpus.py to run the strategies at scale.
+    """
+    manifest = os.environ.get("FILE_PROCESS_SIM_CORPUS")
+    if not manifest:
+        manifest = generate_corpus(
+            str(tmp_path / "corpus"), 25, size_dist="loguniform",
+            min_size=0, max_size=50_000, blank_ratio=0.25, seed=1,
+        )
+    return load_corpus(manifest)
+
+
 @pytest.fixture(autouse=True)
 def fast_sleep(monkeypatch):
     """
@@ -119,3 +136,198 @@ def test_process_files_multiprocessing_small(test_files):
     assert total_lines == lines
     assert total_chars == chars
     assert re.match(r"^\d+\.\d{2} s$", dur)
+
+
+def test_count_buffer_matches_line_iteration():
+    assert m.count_buffer("hello\n\nworld\n") == (2, 10)
+    assert m.count_buffer("a\nbcd\n   \n") == (2, 4)
+    assert m.count_buffer("") == (0, 0)
+    assert m.count_buffer("no newline at end") == (1, 17)
+    assert m.count_buffer(" a \r\n\n\t\n b") == (2, 2)
+
+
+def test_process_files_hybrid(test_files):
+    """
+    Hand the hybrid strategy a thread pool so the patched sleep applies;
+    the default ProcessPoolExecutor would run the real 2s sleep per file.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    files, exp_lines, exp_chars = test_files
+
+    with ThreadPoolExecutor(max_workers=len(files)) as executor:
+        dur, total_lines, total_chars = asyncio.run(m.process_files_hybrid(files, executor))
+    assert total_lines == exp_lines
+    assert total_chars == exp_chars
+    assert re.match(r"^\d+\.\d{2} s$", dur)
+
+
+def test_process_files_hybrid_bounds_files_in_memory(test_files, monkeypatch):
+    """A file's buffer lives from its read until its count is done; at most max_in_flight at once."""
+    import threading
+    from concurrent.futures import ThreadPoolExecutor
+
+    files, exp_lines, exp_chars = test_files
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+    read_file, count_buffer = m.read_file, m.count_buffer
+
+    def tracking_read(*args, **kwargs):
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        return read_file(*args, **kwargs)
+
+    def tracking_count(buffer):
+        nonlocal in_flight
+        threading.Event().wait(0.01)  # time.sleep is patched out
+        with lock:
+            in_flight -= 1
+        return count_buffer(buffer)
+
+    monkeypatch.setattr(m, "read_file", tracking_read)
+    monkeypatch.setattr(m, "count_buffer", tracking_count)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        _, total_lines, total_chars = asyncio.run(
+            m.process_files_hybrid(files * 5, executor, max_in_flight=2))
+    assert (total_lines, total_chars) == (exp_lines * 5, exp_chars * 5)
+    assert peak <= 2
+
+
+def test_strategies_on_generated_corpus(corpus):
+    from concurrent.futures import ThreadPoolExecutor
+
+    files, exp_lines, exp_chars, _ = corpus
+
+    while not m.q.empty():
+        _ = m.q.get_nowait()
+
+    _, seq_lines, seq_chars = m.process_files_seq(files)
+    _, thread_lines, thread_chars = m.process_files_threaded(files)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        _, hybrid_lines, hybrid_chars = asyncio.run(m.process_files_hybrid(files, executor))
+
+    assert (seq_lines, seq_chars) == (exp_lines, exp_chars)
+    assert (thread_lines, thread_chars) == (exp_lines, exp_chars)
+    assert (hybrid_lines, hybrid_chars) == (exp_lines, exp_chars)
+
+
+def test_strategies_skip_cached_files(test_files, tmp_path: Path):
+    from stats_cache import StatsCache
+
+    files, exp_lines, exp_chars = test_files
+    cache = StatsCache(str(tmp_path / "stats.db"))
+
+    while not m.q.empty():
+        _ = m.q.get_nowait()
+
+    # Cold run fills the index
+    _, total_lines, total_chars = m.process_files_seq(files, cache)
+    assert (total_lines, total_chars) == (exp_lines, exp_chars)
+    assert cache.hit_rate == 0.0
+
+    runs = [
+        lambda: m.process_files_seq(files, cache),
+        lambda: m.process_files_threaded(files, cache),
+        lambda: m.process_files_multiprocessing(files, cache),
+        lambda: asyncio.run(m.process_files_async(files, cache)),
+        lambda: asyncio.run(m.process_files_hybrid(files, cache=cache)),
+    ]
+    for run in runs:
+        cache.reset_stats()
+        _, total_lines, total_chars = run()
+        assert (total_lines, total_chars) == (exp_lines, exp_chars)
+        assert cache.hit_rate == 1.0
+    cache.close()
+
+
+def test_hash_cache_hashes_each_file_once(test_files, tmp_path: Path, monkeypatch):
+    import stats_cache
+    from concurrent.futures import ThreadPoolExecutor
+
+    files, exp_lines, exp_chars = test_files
+    digests = []
+    file_digest = stats_cache.file_digest
+    monkeypatch.setattr(stats_cache, "file_digest", lambda name: digests.append(name) or file_digest(name))
+
+    while not m.q.empty():
+        _ = m.q.get_nowait()
+
+    runs = [
+        lambda cache: m.process_files_seq(files, cache),
+        lambda cache: m.process_files_threaded(files, cache),
+        lambda cache: asyncio.run(m.process_files_async(files, cache)),
+        lambda cache: asyncio.run(m.process_files_hybrid(files, executor, cache)),
+    ]
+    executor = ThreadPoolExecutor(max_workers=4)
+    for i, run in enumerate(runs):
+        cache = stats_cache.StatsCache(str(tmp_path / f"stats-{i}.db"), use_hash=True)
+        digests.clear()
+        _, total_lines, total_chars = run(cache)  # cold: every file is a miss and then a put
+        assert (total_lines, total_chars) == (exp_lines, exp_chars)
+        assert sorted(digests) == sorted(files)
+        cache.close()
+    executor.shutdown()
+
+
+@pytest.mark.parametrize("encoding", ["utf-16", "latin-1"])
+def test_strategies_read_the_corpus_encoding(tmp_path: Path, monkeypatch, encoding):
+    """Every strategy decodes with the encoding recorded in the manifest."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    manifest = generate_corpus(str(tmp_path / "corpus"), 6, max_size=8_000, encoding=encoding, seed=5)
+    files, exp_lines, exp_chars, corpus_encoding = load_corpus(manifest)
+    monkeypatch.setattr(m, "WORK_SECONDS", 0)  # process workers don't see the patched sleep
+
+    while not m.q.empty():
+        _ = m.q.get_nowait()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        runs = [
+            m.process_files_seq(files, encoding=corpus_encoding),
+            m.process_files_threaded(files, encoding=corpus_encoding),
+            m.process_files_multiprocessing(files, encoding=corpus_encoding),
+            asyncio.run(m.process_files_async(files, encoding=corpus_encoding)),
+            asyncio.run(m.process_files_hybrid(files, executor, encoding=corpus_encoding)),
+            asyncio.run(m.process_files_hybrid(files, encoding=corpus_encoding)),
+            m.process_files_interpreters(files, encoding=corpus_encoding),
+        ]
+    for _, total_lines, total_chars in runs:
+        assert (total_lines, total_chars) == (exp_lines, exp_chars)
+
+
+@pytest.mark.parametrize("force_fallback", [False, True])
+def test_process_files_interpreters(test_files, monkeypatch, force_fallback):
+    """
+    Uses InterpreterPoolExecutor on Python 3.14+ and a process pool otherwise.
+    Workers don't see the patched time.sleep, so zero the simulated work instead.
+    """
+    files, exp_lines, exp_chars = test_files
+    monkeypatch.setattr(m, "WORK_SECONDS", 0)
+    if force_fallback:
+        monkeypatch.setattr(m, "InterpreterPoolExecutor", None)
+
+    dur, total_lines, total_chars = m.process_files_interpreters(files)
+    assert total_lines == exp_lines
+    assert total_chars == exp_chars
+    assert re.match(r"^\d+\.\d{2} s$", dur)
+
+
+def test_process_strategies_pass_the_work_time_to_spawned_workers(test_files, monkeypatch):
+    """Spawned workers import the module afresh, so WORK_SECONDS must reach them explicitly."""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    files, exp_lines, exp_chars = test_files
+    spawn = multiprocessing.get_context("spawn")
+    monkeypatch.setattr(m, "WORK_SECONDS", 0)
+    monkeypatch.setattr(m, "Pool", spawn.Pool)
+    monkeypatch.setattr(m, "ProcessPoolExecutor", lambda **kw: ProcessPoolExecutor(mp_context=spawn, **kw))
+
+    for run in (lambda: m.process_files_multiprocessing(files), lambda: asyncio.run(m.process_files_hybrid(files))):
+        start = _time.perf_counter()
+        _, total_lines, total_chars = run()
+        assert (total_lines, total_chars) == (exp_lines, exp_chars)
+        assert _time.perf_counter() - start < 1.5  # not the default 2 s per file
@@ -0,0 +1,35 @@
+# test_run_stats.py
+import time
+from multiprocessing import Pool
+
+import run_stats as rs
+
+
+def _busy(n):
+    return sum(i * i for i in range(n))
+
+
+def test_measure_records_cpu_and_python_allocations():
+    with rs.measure() as stats:
+        _busy(300_000)
+        blob = [bytes(1024) for _ in range(2000)]  # ~2 MB of Python objects
+        del blob
+
+    assert stats.wall_s > 0
+    assert stats.cpu_s > 0
+    assert stats.tracemalloc_peak_bytes > 2_000_000
+    assert stats.peak_rss_bytes > 0
+    assert stats.context_switches >= 0
+
+
+def test_measure_includes_children():
+    with rs.measure(trace_python_allocations=False) as stats:
+        with Pool(2) as p:
+            p.map(_busy, [200_000, 200_000])
+            time.sleep(0.05)  # let the sampler see the workers
+
+    assert stats.tracemalloc_peak_bytes == 0
+    if stats.rss_source != "ru_maxrss":
+        assert stats.peak_children >= 2
+    # the children's CPU time is added once they have been reaped
+    assert stats.user_s > 0
@@ -0,0 +1,73 @@
+# test_stats_cache.py
+import os
+from multiprocessing import Pool
+from pathlib import Path
+
+import pytest
+
+from stats_cache import StatsCache
+
+
+@pytest.fixture
+def cache(tmp_path: Path):
+    c = StatsCache(str(tmp_path / "stats.db"))
+    yield c
+    c.close()
+
+
+def test_miss_then_hit(tmp_path: Path, cache):
+    p = tmp_path / "a.txt"
+    p.write_text("hello\n")
+
+    key = cache.key(str(p))
+    assert cache.get(key) is None
+    cache.put(key, (1, 5))
+    assert cache.get(cache.key(str(p))) == (1, 5)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.hit_rate == 0.5
+
+
+def test_changed_file_is_a_miss(tmp_path: Path, cache):
+    p = tmp_path / "a.txt"
+    p.write_text("hello\n")
+    cache.put(cache.key(str(p)), (1, 5))
+
+    p.write_text("hello\nworld\n")
+    st = p.stat()
+    os.utime(p, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    assert cache.get(cache.key(str(p))) is None
+
+
+def test_hash_key_catches_same_size_and_mtime(tmp_path: Path):
+    cache = StatsCache(str(tmp_path / "stats.db"), use_hash=True)
+    p = tmp_path / "a.txt"
+    p.write_text("aaaa\n")
+    st = p.stat()
+    cache.put(cache.key(str(p)), (1, 4))
+
+    p.write_text("bbbb\n")
+    os.utime(p, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert cache.get(cache.key(str(p))) is None
+    cache.close()
+
+
+def _put_many(args):
+    cache, paths = args
+    for i, path in enumerate(paths):
+        cache.put(cache.key(path), (i, i * 10))
+    return len(paths)
+
+
+def test_concurrent_writers_from_processes(tmp_path: Path, cache):
+    paths = []
+    for i in range(40):
+        p = tmp_path / f"f{i}.txt"
+        p.write_text("x\n" * i)
+        paths.append(str(p))
+
+    chunks = [(cache, paths[i::4]) for i in range(4)]
+    with Pool(4) as pool:
+        assert sum(pool.map(_put_many, chunks)) == len(paths)
+
+    assert all(cache.get(cache.key(path)) is not None for path in paths)
+    assert cache.hit_rate == 1.0
@@ -1,12 +1,22 @@
 import asyncio
-from dataclasses import dataclass
-from typing import Dict, Any, List, Optional
+import inspect
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Callable, Dict, Any, Iterable, Iterator, List, Optional
+
+from composite_core import CancelToken, cancel_token, child_context
+from composite_loop import is_async_step
+from composite_parallel import ParallelGroup, SequentialGroup, SleepStep, FnStep
+from composite_runtime import run_workflow
 
 @dataclass
 class AResult:
     ok: bool
     output: Dict[str, Any]
     error: Optional[str] = None
+    duration_ms: int = 0
 
 class AStep:
     name: str
@@ -19,32 +29,354 @@ class ASleep(AStep):
         await asyncio.sleep(self.seconds)
         return AResult(True, {self.key: self.value})
 
+async def run_any(step: Any, ctx: Dict[str, Any]) -> AResult:
+    """Awaits an AStep; a sync composite_parallel Step runs in a worker thread instead."""
+    if is_async_step(step):
+        return await step.run(ctx)
+    r = await asyncio.to_thread(step.run, ctx)
+    return AResult(r.ok, r.output, r.error, r.duration_ms)
+
+@dataclass
+class AGroupStats:
+    """Outcome counts and per-step durations of one AParallelGroup run."""
+    succeeded: int = 0
+    failed: int = 0
+    timed_out: int = 0
+    cancelled: int = 0      # stopped or never started: fail_fast, group timeout, caller
+    wall_ms: float = 0.0
+    durations_ms: List[float] = field(default_factory=list)  # finished steps only
+
+    def percentile(self, q: float) -> Optional[float]:
+        values = sorted(self.durations_ms)
+        if not values:
+            return None
+        return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+class _FailFast(Exception):
+    """Raised inside the task group to make it cancel the remaining steps."""
+
 class AParallelGroup(AStep):
-    def __init__(self, name: str, steps: List[AStep], *, fail_fast: bool=False):
+    """
+    Runs child steps concurrently on the running loop and merges outputs.
+    Children run inside an asyncio.TaskGroup: however the group ends (fail_fast,
+    a timeout, or the caller cancelling it), every child task has finished
+    before run() returns, and sync children see their cancel token set.
+    Options:
+      - max_concurrency: at most this many steps in flight (None: all at once)
+      - fail_fast: cancel the remaining steps on first failure
+      - step_timeout: deadline for each step (seconds)
+      - timeout: overall deadline for the group (seconds)
+    After a run, last_stats holds outcome counts and step durations.
+    """
+    def __init__(self, name: str, steps: List[AStep], *, max_concurrency: Optional[int] = None,
+                 fail_fast: bool = False, step_timeout: Optional[float] = None,
+                 timeout: Optional[float] = None):
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError(f"max_concurrency must be at least 1, got {max_concurrency}")
         self.name, self.steps, self.fail_fast = name, steps, fail_fast
+        self.max_concurrency = max_concurrency
+        self.step_timeout = step_timeout
+        self.timeout = timeout
+        self.last_stats: Optional[AGroupStats] = None
+
+    _report_unstarted = True  # AParallelMap sources may be endless: it just stops pulling
+
+    def _children(self) -> Iterator[Any]:
+        return iter(self.steps)
+
+    def _workers(self) -> int:
+        return min(len(self.steps), self.max_concurrency or len(self.steps))
 
     async def run(self, ctx: Dict[str, Any]) -> AResult:
-        tasks = [asyncio.create_task(s.run(ctx.copy())) for s in self.steps]
-        results = {}
-        errors = []
-        for t in asyncio.as_completed(tasks):
-            try:
-                r: AResult = await t
-                if r.ok:
-                    results.update(r.output)
+        start = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout if self.timeout else None
+        stats = AGroupStats()
+        merged: Dict[str, Any] = {}
+        errors: List[str] = []
+        token = CancelToken(parent=cancel_token(ctx))
+        queue = self._children()  # shared by the workers, so at most max_concurrency tasks exist
+
+        async def worker() -> None:
+            for step in queue:
+                res = await self._run_child(step, ctx, token, stats, errors, deadline)
+                if res.ok:
+                    merged.update(res.output)
                 else:
-                    errors.append(r.error or "unknown error")
+                    errors.append(res.error or f"{step.name} failed")
                     if self.fail_fast:
-                        for other in tasks:
-                            other.cancel()
+                        raise _FailFast
+
+        workers = self._workers()
+        try:
+            async with asyncio.timeout_at(deadline):
+                try:
+                    async with asyncio.TaskGroup() as tg:
+                        for _ in range(workers):
+                            tg.create_task(worker())
+                except* _FailFast:
+                    token.cancel("fail_fast")
+        except TimeoutError:
+            token.cancel("timeout")
+        finally:
+            stats.wall_ms = (time.perf_counter() - start) * 1000
+            self.last_stats = stats
+
+        why = "timeout" if token.reason == "timeout" else "cancelled"
+        for step in queue if self._report_unstarted else ():
+            stats.cancelled += 1
+            errors.append(f"{step.name} not started ({why})")
+        if errors:
+            return AResult(False, merged, f"[{self.name}] " + " | ".join(errors), int(stats.wall_ms))
+        return AResult(True, merged, duration_ms=int(stats.wall_ms))
+
+    async def _run_child(self, step: AStep, ctx: Dict[str, Any], token: CancelToken, stats: AGroupStats,
+                         errors: List[str], deadline: Optional[float]) -> AResult:
+        # Async steps stop when their task is cancelled. A sync step's thread only
+        # notices its token, so each gets its own: a step timeout stops just that one.
+        step_token = token if is_async_step(step) else CancelToken(parent=token)
+        start = time.perf_counter()
+        limit = asyncio.timeout(self.step_timeout)
+        try:
+            async with limit:
+                res = await run_any(step, child_context(ctx, step_token))
+        except TimeoutError as e:
+            if not limit.expired():
+                res = AResult(False, {}, f"{step.name} raised: {e!r}")
+            else:
+                if step_token is not token:
+                    step_token.cancel("timeout")
+                stats.timed_out += 1
+                return AResult(False, {}, f"{step.name} timed out",
+                               int((time.perf_counter() - start) * 1000))
+        except asyncio.CancelledError:
+            timed_out = deadline is not None and asyncio.get_running_loop().time() >= deadline
+            if step_token is not token:
+                step_token.cancel("timeout" if timed_out else "cancelled")
+            stats.cancelled += 1
+            errors.append(f"{step.name} {'timed out' if timed_out else 'cancelled'}")
+            raise
+        except Exception as e:
+            res = AResult(False, {}, f"{step.name} raised: {e}")
+        duration_ms = (time.perf_counter() - start) * 1000
+        stats.durations_ms.append(duration_ms)
+        if res.ok:
+            stats.succeeded += 1
+        else:
+            stats.failed += 1
+        return AResult(res.ok, res.output, res.error, int(duration_ms))
+
+class ASequentialGroup(AStep):
+    """
+    Runs child steps one after another, feeding each step's output into ctx.
+    Options:
+      - fail_fast: stop at the first failure (default); otherwise keep going
+        and report every failure
+      - step_timeout: deadline for each step (seconds)
+      - timeout: overall deadline for the group (seconds)
+    Sync steps run in a worker thread; one that times out is abandoned there.
+    """
+    def __init__(self, name: str, steps: List[AStep], fail_fast: bool = True, *,
+                 step_timeout: Optional[float] = None, timeout: Optional[float] = None):
+        self.name, self.steps, self.fail_fast = name, steps, fail_fast
+        self.step_timeout = step_timeout
+        self.timeout = timeout
+
+    async def run(self, ctx: Dict[str, Any]) -> AResult:
+        start = time.perf_counter()
+        merged: Dict[str, Any] = {}
+        errors: List[str] = []
+        token = cancel_token(ctx)
+        current: Optional[AStep] = None
+        try:
+            async with asyncio.timeout(self.timeout):
+                for current in self.steps:
+                    if token.cancelled:
+                        errors.append(f"cancelled before {current.name}")
                         break
-            except Exception as e:
-                errors.append(str(e))
-                if self.fail_fast:
-                    for other in tasks:
-                        other.cancel()
-                    break
-        return AResult(not errors, results, " | ".join(errors) if errors else None)
+                    res = await self._run_step(current, ctx)
+                    if res.ok:
+                        merged.update(res.output)
+                        ctx.update(res.output)
+                    else:
+                        errors.append(res.error or f"{current.name} failed")
+                        if self.fail_fast:
+                            break
+        except TimeoutError:
+            errors.append(f"{current.name} timed out (group timeout)")
+
+        duration_ms = int((time.perf_counter() - start) * 1000)
+        if errors:
+            return AResult(False, merged, f"[{self.name}] " + " | ".join(errors), duration_ms)
+        return AResult(True, merged, duration_ms=duration_ms)
+
+    async def _run_step(self, step: AStep, ctx: Dict[str, Any]) -> AResult:
+        limit = asyncio.timeout(self.step_timeout)
+        try:
+            async with limit:
+                return await run_any(step, ctx)
+        except TimeoutError as e:
+            if limit.expired():
+                return AResult(False, {}, f"{step.name} timed out")
+            return AResult(False, {}, f"{step.name} raised: {e!r}")
+        except Exception as e:
+            return AResult(False, {}, f"{step.name} raised: {e}")
+
+class AFnStep(AStep):
+    """An async fn(arg, ctx) as a step; the async counterpart of FnStep."""
+    def __init__(self, name: str, fn: Callable[[Any, Dict[str, Any]], Any], arg: Any):
+        self.name, self.fn, self.arg = name, fn, arg
+    async def run(self, ctx: Dict[str, Any]) -> AResult:
+        return await self.fn(self.arg, ctx)
+
+class AParallelMap(AParallelGroup):
+    """
+    Applies fn(item, ctx) to every item with at most max_concurrency calls in
+    flight, pulling items lazily so that long generators are mapped in bounded
+    memory. fn returns an AResult (or StepResult) whose outputs are merged; an
+    async fn runs on the loop, a sync one in a worker thread. Accepts the
+    options of AParallelGroup; on fail_fast or timeout it stops pulling items.
+    """
+    _report_unstarted = False
+
+    def __init__(self, name: str, items: Iterable[Any], fn: Callable[[Any, Dict[str, Any]], Any], *,
+                 max_concurrency: int = 64, fail_fast: bool = False,
+                 step_timeout: Optional[float] = None, timeout: Optional[float] = None):
+        super().__init__(name, [], max_concurrency=max_concurrency, fail_fast=fail_fast,
+                         step_timeout=step_timeout, timeout=timeout)
+        self.items, self.fn = items, fn
+
+    def _children(self) -> Iterator[Any]:
+        step_cls = AFnStep if inspect.iscoroutinefunction(self.fn) else FnStep
+        return (step_cls(f"{self.name}-{i}", self.fn, item) for i, item in enumerate(self.items))
+
+    def _workers(self) -> int:
+        return self.max_concurrency
+
+# ---------- Streaming pipelines ----------
+
+_END = object()  # end-of-stream marker passed down the channels
+MAX_REPORTED_ERRORS = 20  # per run; the rest are only counted
+
+@dataclass
+class Stage:
+    """
+    One pipeline stage: fn(item, ctx) returns the item for the next stage, or
+    None to drop it. fn may be async; a sync fn runs in a worker thread.
+    `concurrency` workers run the stage, reading from a channel of `buffer` items.
+    """
+    name: str
+    fn: Callable[[Any, Dict[str, Any]], Any]
+    concurrency: int = 1
+    buffer: int = 64
+
+@dataclass
+class StageStats:
+    processed: int = 0
+    failed: int = 0
+    busy_ms: float = 0.0     # summed over the stage's workers
+    blocked_ms: float = 0.0  # waiting for room downstream: this stage is ahead of the next
+
+class APipeline(AStep):
+    """
+    Streams items from source through stages connected by bounded asyncio.Queue
+    channels, so stages overlap item by item. When a stage falls behind, its
+    input channel fills up and the stages before it (and finally the source)
+    wait: at most the sum of the buffers plus one item per worker is in flight.
+    Options:
+      - output_key: collect what the last stage returns under this key
+        (leave unset when the last stage is a sink, to keep memory bounded)
+      - fail_fast: stop on the first failing item; otherwise failed items are
+        dropped and reported
+    source may be an iterable or an async iterable. After a run, last_stats
+    maps each stage name to its StageStats.
+    """
+    def __init__(self, name: str, source: Any, stages: List[Stage], *,
+                 output_key: Optional[str] = None, fail_fast: bool = True):
+        if not stages:
+            raise ValueError(f"{name}: a pipeline needs at least one stage")
+        for stage in stages:
+            if stage.concurrency < 1 or stage.buffer < 1:
+                raise ValueError(f"{name}: stage {stage.name!r} needs concurrency and buffer of at least 1")
+        self.name, self.source, self.stages = name, source, stages
+        self.output_key = output_key
+        self.fail_fast = fail_fast
+        self.last_stats: Dict[str, StageStats] = {}
+
+    async def run(self, ctx: Dict[str, Any]) -> AResult:
+        start = time.perf_counter()
+        token = CancelToken(parent=cancel_token(ctx))
+        stage_ctx = child_context(ctx, token)
+        channels = [asyncio.Queue(stage.buffer) for stage in self.stages]
+        stats = {stage.name: StageStats() for stage in self.stages}
+        results: List[Any] = []
+        errors: List[str] = []
+
+        async def feed() -> None:
+            if hasattr(self.source, "__aiter__"):
+                async for item in self.source:
+                    await channels[0].put(item)
+            else:
+                for item in self.source:
+                    await channels[0].put(item)
+            for _ in range(self.stages[0].concurrency):
+                await channels[0].put(_END)
+
+        async def work(i: int, stage: Stage, live: List[int]) -> None:
+            st = stats[stage.name]
+            call = stage.fn if inspect.iscoroutinefunction(stage.fn) else partial(asyncio.to_thread, stage.fn)
+            out = channels[i + 1] if i + 1 < len(channels) else None
+            while (item := await channels[i].get()) is not _END:
+                began = time.perf_counter()
+                try:
+                    item = await call(item, stage_ctx)
+                except Exception as e:
+                    st.failed += 1
+                    if len(errors) < MAX_REPORTED_ERRORS:
+                        errors.append(f"{stage.name} raised: {e}")
+                    if self.fail_fast:
+                        raise _FailFast
+                    continue
+                finally:
+                    st.busy_ms += (time.perf_counter() - began) * 1000
+                st.processed += 1
+                if item is None:
+                    continue
+                if out is None:
+                    if self.output_key is not None:
+                        results.append(item)
+                    continue
+                began = time.perf_counter()
+                await out.put(item)
+                st.blocked_ms += (time.perf_counter() - began) * 1000
+            live[0] -= 1
+            if live[0] == 0 and out is not None:  # the stage's last worker ends the next stage
+                for _ in range(self.stages[i + 1].concurrency):
+                    await out.put(_END)
+
+        try:
+            try:
+                async with asyncio.TaskGroup() as tg:
+                    tg.create_task(feed())
+                    for i, stage in enumerate(self.stages):
+                        live = [stage.concurrency]
+                        for _ in range(stage.concurrency):
+                            tg.create_task(work(i, stage, live))
+            except* _FailFast:
+                token.cancel("fail_fast")
+        except BaseException:
+            token.cancel("cancelled")  # sync stages still running in threads should stop too
+            raise
+        finally:
+            self.last_stats = stats
+
+        output = {self.output_key: results} if self.output_key is not None else {}
+        duration_ms = int((time.perf_counter() - start) * 1000)
+        if errors:
+            failed = sum(st.failed for st in stats.values())
+            more = f" (+{failed - len(errors)} more)" if failed > len(errors) else ""
+            return AResult(False, output, f"[{self.name}] " + " | ".join(errors) + more, duration_ms)
+        return AResult(True, output, duration_ms=duration_ms)
 
 async def demo_async():
     g = AParallelGroup("async-fetch", [
@@ -55,4 +387,102 @@ async def demo_async():
     res = await g.run({})
     print(res)
 
-asyncio.run(demo_async())
\ No newline at end of file
+if __name__ == "__main__":
+    asyncio.run(demo_async())
+
+    # Mixed workflow: 2,000 async downloads on the shared event loop next to
+    # sync steps on the thread pool. The async ones take no thread each.
+    workflow = SequentialGroup("mixed-workflow", steps=[
+        ParallelGroup("fetch", steps=[
+            *[ASleep(f"download-{i}", 0.5, f"doc-{i}", i) for i in range(2000)],
+            SleepStep("load-config", 0.3, "config", {"retries": 3}),
+        ], max_workers=2500),
+        AParallelGroup("notify", [ASleep("email", 0.1, "emailed", True),
+                                  SleepStep("audit-log", 0.1, "audited", True)]),
+    ])
+    start = time.perf_counter()
+    result = run_workflow(workflow, {}, max_concurrency=8)
+    print(f"Mixed: OK={result.ok}, {len(result.output)} keys in {(time.perf_counter() - start) * 1000:.0f} ms, "
+          f"{threading.active_count()} threads alive")
+    # 100k I/O steps with at most 1,000 in flight: only 1,000 tasks ever exist.
+    # Then a batch where one step fails: the slow ones are cancelled, and
+    # awaited, before run() returns, so no tasks are left behind.
+    async def demo_structured() -> None:
+        many = AParallelGroup("fetch-100k", [ASleep(f"fetch-{i}", 0.01, f"doc-{i}", i) for i in range(100_000)],
+                              max_concurrency=1000, step_timeout=1.0)
+        res = await many.run({})
+        st = many.last_stats
+        print(f"100k steps: OK={res.ok}, {st.wall_ms:.0f} ms, p50 {st.percentile(50):.1f} ms, "
+              f"p99 {st.percentile(99):.1f} ms per step")
+
+        class AFail(AStep):
+            name = "validate"
+            async def run(self, ctx: Dict[str, Any]) -> AResult:
+                await asyncio.sleep(0.1)
+                return AResult(False, {}, "validate: bad checksum")
+
+        batch = AParallelGroup("fetch-batch", [AFail(), *[ASleep(f"slow-{i}", 10, f"s{i}", i) for i in range(50)]],
+                               fail_fast=True, timeout=5)
+        res = await batch.run({})
+        print(f"Fail-fast: OK={res.ok}, {res.duration_ms} ms, {batch.last_stats.cancelled} cancelled, "
+              f"{len(asyncio.all_tasks()) - 1} tasks left")
+
+    asyncio.run(demo_structured())
+
+    # fetch -> parse -> store over 5,000 records. Storing is the slow stage, so
+    # the channels in front of it fill up and fetching slows to its pace: no
+    # more than ~100 records are ever held, however long the source is.
+    async def demo_pipeline() -> None:
+        in_flight = {"now": 0, "peak": 0}
+
+        def records(n: int):
+            for i in range(n):
+                in_flight["now"] += 1
+                in_flight["peak"] = max(in_flight["peak"], in_flight["now"])
+                yield i
+
+        async def fetch(i: int, ctx: Dict[str, Any]) -> bytes:
+            await asyncio.sleep(0.002)
+            return f'{{"id": {i}}}'.encode()
+
+        def parse(raw: bytes, ctx: Dict[str, Any]) -> Dict[str, Any]:
+            return {"id": int(raw[7:-1])}
+
+        async def store(record: Dict[str, Any], ctx: Dict[str, Any]) -> None:
+            await asyncio.sleep(0.005)
+            in_flight["now"] -= 1
+
+        pipeline = APipeline("import-records", records(5000), [
+            Stage("fetch", fetch, concurrency=32, buffer=16),
+            Stage("parse", parse, concurrency=2, buffer=16),
+            Stage("store", store, concurrency=8, buffer=16),
+        ])
+        res = await pipeline.run({})
+        print(f"Pipeline: OK={res.ok}, {res.duration_ms} ms, peak {in_flight['peak']} records in flight")
+        for name, st in pipeline.last_stats.items():
+            print(f"  {name:<6} processed={st.processed} busy={st.busy_ms:.0f} ms "
+                  f"blocked downstream={st.blocked_ms:.0f} ms")
+
+    asyncio.run(demo_pipeline())
+
+    # The catalog workflow on the asyncio engine: fetch in parallel, then
+    # validate every product, then save. The slow supplier feed is cut off at
+    # its 1s step timeout and, without fail_fast, the workflow carries on.
+    async def demo_workflow() -> None:
+        async def validate(product: int, ctx: Dict[str, Any]) -> AResult:
+            await asyncio.sleep(0.01)
+            return AResult(True, {f"valid-{product}": product % 97 != 0})
+
+        workflow = ASequentialGroup("catalog-workflow", [
+            AParallelGroup("fetch", [
+                ASleep("download-catalog", 0.3, "catalog", list(range(500))),
+                ASleep("download-prices", 0.2, "prices", {"currency": "USD"}),
+                ASleep("download-supplier-feed", 5.0, "feed", None),
+            ], step_timeout=1.0),
+            AParallelMap("validate", range(500), validate, max_concurrency=100),
+            ASleep("save", 0.1, "saved", True),
+        ], fail_fast=False, timeout=10)
+        res = await workflow.run({})
+        print(f"Workflow: OK={res.ok}, {res.duration_ms} ms, {len(res.output)} keys, error: {res.error}")
+
+    asyncio.run(demo_workflow())
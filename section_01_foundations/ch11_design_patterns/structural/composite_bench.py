@@ -0,0 +1,254 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict
+from multiprocessing import get_context
+from typing import Any, Callable, Dict, List, Optional
+
+from composite_core import StepResult, Step
+from composite_parallel import ParallelGroup, ParallelMap
+from composite_runtime import run_workflow
+from composite_asyncio import AParallelGroup, AResult
+
+# Scheduling-overhead benchmarks for composite_parallel. Every step is a
+# no-op, so the numbers are the engine's own cost per step: submission,
+# futures, context forks, result merging. Results can be written as JSON
+# (--json) and compared across releases.
+#
+# The "engines" suite instead compares the thread and asyncio engines on
+# 10, 1k and 100k concurrent I/O-bound steps: wall time, per-step latency,
+# CPU time and peak RSS, each run in a fresh process.
+#
+# Usage:
+#   python composite_bench.py                     # full size
+#   python composite_bench.py --scale 0.1 --json bench.json
+#   python composite_bench.py --suite engines --max-threads 500
+
+class NoopStep:
+    def __init__(self, name: str):
+        self.name = name
+
+    def run(self, ctx: Dict[str, Any]) -> StepResult:
+        return StepResult(True, {self.name: True})
+
+def noop(item: Any, ctx: Dict[str, Any]) -> StepResult:
+    return StepResult(True)
+
+@dataclass
+class BenchResult:
+    name: str
+    steps: int
+    seconds: float            # best of --repeat runs
+    steps_per_sec: float
+    us_per_step: float
+    peak_traced_bytes: int    # tracemalloc peak of one extra run; 0 with --no-memory
+    ok: bool
+
+def flat(n: int) -> Step:
+    return ParallelGroup("flat", [NoopStep(f"noop-{i}") for i in range(n)], max_workers=16)
+
+def deep(depth: int) -> Step:
+    # A binary tree of groups: 2**depth leaves under 2**depth - 1 groups
+    def build(level: int, prefix: str) -> Step:
+        if level == depth:
+            return NoopStep(prefix)
+        return ParallelGroup(prefix, [build(level + 1, f"{prefix}.{i}") for i in range(2)], max_workers=2)
+    return build(0, "root")
+
+def wide(n: int) -> Step:
+    return ParallelGroup("wide", [NoopStep(f"noop-{i}") for i in range(n)], max_workers=n)
+
+def parallel_map(n: int) -> Step:
+    return ParallelMap("map", range(n), noop, max_workers=8, chunk_size=1000)
+
+def count_steps(step: Any) -> int:
+    if isinstance(step, ParallelMap):
+        return len(step.items)
+    children = getattr(step, "steps", None)
+    return 1 + sum(count_steps(s) for s in children) if children else 1
+
+def scenarios(scale: float) -> List[tuple]:
+    # (name, workflow factory) pairs; a fresh workflow per run
+    return [
+        ("flat-10k", lambda: flat(max(1, int(10_000 * scale)))),
+        ("flat-10k-shared-runtime", lambda: flat(max(1, int(10_000 * scale)))),
+        # the tree doubles per level, so scale the depth logarithmically
+        ("deep-10", lambda: deep(max(1, 10 + round(math.log2(scale))))),
+        ("wide-1k", lambda: wide(max(1, int(1000 * scale)))),
+        ("parallel-map-1m", lambda: parallel_map(max(1, int(1_000_000 * scale)))),
+    ]
+
+def run_once(name: str, workflow: Step) -> StepResult:
+    if name.endswith("shared-runtime"):
+        return run_workflow(workflow, {}, max_concurrency=16)
+    return workflow.run({})
+
+def bench(name: str, factory: Callable[[], Step], repeat: int, memory: bool) -> BenchResult:
+    best = float("inf")
+    ok = True
+    steps = 0
+    for _ in range(repeat):
+        workflow = factory()
+        steps = count_steps(workflow)
+        start = time.perf_counter()
+        res = run_once(name, workflow)
+        best = min(best, time.perf_counter() - start)
+        ok = ok and res.ok
+
+    peak = 0
+    if memory:
+        workflow = factory()
+        tracemalloc.start()
+        try:
+            run_once(name, workflow)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return BenchResult(name, steps, round(best, 4), round(steps / best, 1),
+                       round(best / steps * 1e6, 2), peak, ok)
+
+def environment() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+def max_rss_bytes() -> int:
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+# ---------- Thread vs asyncio engines ----------
+
+IO_SECONDS = 0.05  # every step waits this long, as if on a socket
+ENGINE_SIZES = (10, 1000, 100_000)
+
+class IoStep:
+    """Blocks its thread for `seconds`, then records when it finished."""
+    def __init__(self, name: str, seconds: float, done: List[float]):
+        self.name, self.seconds, self.done = name, seconds, done
+
+    def run(self, ctx: Dict[str, Any]) -> StepResult:
+        time.sleep(self.seconds)
+        self.done.append(time.perf_counter())
+        return StepResult(True)
+
+class AIoStep:
+    """Awaits for `seconds`, then records when it finished."""
+    def __init__(self, name: str, seconds: float, done: List[float]):
+        self.name, self.seconds, self.done = name, seconds, done
+
+    async def run(self, ctx: Dict[str, Any]) -> AResult:
+        await asyncio.sleep(self.seconds)
+        self.done.append(time.perf_counter())
+        return AResult(True, {})
+
+@dataclass
+class EngineResult:
+    engine: str
+    steps: int
+    concurrency: int          # threads for the thread engine; in-flight steps for asyncio
+    seconds: float            # wall time of the whole fan-out (best of --repeat)
+    p50_ms: float             # step completion time after the start, minus its own wait
+    p99_ms: float
+    cpu_seconds: float        # process CPU time, all threads
+    peak_rss_bytes: int       # growth of peak RSS over the process baseline
+    ok: bool
+
+def _percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))] if values else 0.0
+
+def measure_engine(engine: str, n: int, max_threads: int) -> EngineResult:
+    # Runs in a fresh process, so peak RSS belongs to this run alone
+    done: List[float] = []
+    baseline = max_rss_bytes()
+    cpu = time.process_time()
+    start = time.perf_counter()
+    if engine == "thread":
+        concurrency = min(n, max_threads)
+        group = ParallelGroup("io", [IoStep(f"io-{i}", IO_SECONDS, done) for i in range(n)],
+                              max_workers=concurrency)
+        res = run_workflow(group, {}, max_concurrency=concurrency)
+    else:
+        concurrency = n
+        res = asyncio.run(AParallelGroup("io", [AIoStep(f"io-{i}", IO_SECONDS, done) for i in range(n)]).run({}))
+    seconds = time.perf_counter() - start
+    latency = [(t - start - IO_SECONDS) * 1000 for t in done]
+    return EngineResult(engine, n, concurrency, round(seconds, 4), round(_percentile(latency, 50), 2),
+                        round(_percentile(latency, 99), 2), round(time.process_time() - cpu, 4),
+                        max(0, max_rss_bytes() - baseline), res.ok and len(done) == n)
+
+def bench_engine(engine: str, n: int, max_threads: int, repeat: int) -> EngineResult:
+    runs = []
+    for _ in range(repeat):
+        with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+            runs.append(pool.submit(measure_engine, engine, n, max_threads).result())
+    return min(runs, key=lambda r: r.seconds)
+
+def engines_main(args: argparse.Namespace) -> List[EngineResult]:
+    results = []
+    print(f"{'engine':<9}{'steps':>10}{'concurrency':>13}{'wall s':>9}{'p50 ms':>9}{'p99 ms':>10}"
+          f"{'CPU s':>8}{'peak MiB':>10}")
+    for size in ENGINE_SIZES:
+        n = max(1, int(size * args.scale))
+        for engine in ("thread", "asyncio"):
+            r = bench_engine(engine, n, args.max_threads, args.repeat)
+            results.append(r)
+            print(f"{r.engine:<9}{r.steps:>10,}{r.concurrency:>13,}{r.seconds:>9.3f}{r.p50_ms:>9.1f}"
+                  f"{r.p99_ms:>10.1f}{r.cpu_seconds:>8.2f}{r.peak_rss_bytes / (1 << 20):>10.1f}"
+                  + ("" if r.ok else "  FAILED"))
+    return results
+
+def main(argv: Optional[List[str]] = None) -> List[Any]:
+    parser = argparse.ArgumentParser(description="Benchmark composite_parallel scheduling overhead")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every workload size")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per scenario (best is kept)")
+    parser.add_argument("--only", action="append", help="run only these scenarios (repeatable)")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc run")
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    parser.add_argument("--suite", choices=("overhead", "engines"), default="overhead",
+                        help="no-op scheduling overhead, or thread vs asyncio engines on I/O-bound steps")
+    parser.add_argument("--max-threads", type=int, default=1000, help="thread engine pool size (engines suite)")
+    args = parser.parse_args(argv)
+
+    if args.suite == "engines":
+        results = engines_main(args)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump({"environment": environment(), "suite": "engines", "scale": args.scale,
+                           "repeat": args.repeat, "io_seconds": IO_SECONDS, "max_threads": args.max_threads,
+                           "results": [asdict(r) for r in results]}, f, indent=2)
+        return results
+
+    results = []
+    print(f"{'scenario':<26}{'steps':>10}{'best s':>10}{'steps/s':>12}{'us/step':>10}{'peak MiB':>10}")
+    for name, factory in scenarios(args.scale):
+        if args.only and name not in args.only:
+            continue
+        r = bench(name, factory, args.repeat, not args.no_memory)
+        results.append(r)
+        print(f"{r.name:<26}{r.steps:>10,}{r.seconds:>10.3f}{r.steps_per_sec:>12,.0f}{r.us_per_step:>10.1f}"
+              f"{r.peak_traced_bytes / (1 << 20):>10.1f}" + ("" if r.ok else "  FAILED"))
+    print(f"max RSS: {max_rss_bytes() / (1 << 20):.0f} MiB")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"environment": environment(), "scale": args.scale, "repeat": args.repeat,
+                       "max_rss_bytes": max_rss_bytes(),
+                       "results": [asdict(r) for r in results]}, f, indent=2)
+    return results
+
+if __name__ == "__main__":
+    main()
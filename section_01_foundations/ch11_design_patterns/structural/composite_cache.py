@@ -0,0 +1,200 @@
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from composite_core import StepResult, Step, CANCEL_KEY
+from composite_loop import run_step
+from composite_parallel import SleepStep, ParallelGroup, SequentialGroup
+
+# Opt-in result cache for composite_parallel steps. A cached step's key is a
+# hash of the step's identity plus the values of the context keys it reads,
+# so identical inputs on a later run reuse the stored StepResult.output.
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+class _StatsMixin:
+    def _init_stats(self) -> None:
+        self.stats: Dict[str, CacheStats] = {}
+        self._stats_lock = threading.Lock()
+
+    def record(self, step_name: str, hit: bool) -> None:
+        with self._stats_lock:
+            st = self.stats.setdefault(step_name, CacheStats())
+            if hit:
+                st.hits += 1
+            else:
+                st.misses += 1
+
+class MemoryCache(_StatsMixin):
+    """In-process LRU cache with optional per-entry TTL (seconds)."""
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Optional[float], Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._init_stats()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, output = entry
+            if expires_at is not None and time.time() >= expires_at:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return output
+
+    def put(self, key: str, output: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._entries[key] = (time.time() + ttl if ttl else None, output)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+class DiskCache(_StatsMixin):
+    """
+    One pickle file per entry, so results survive across processes and runs.
+    Reads refresh a file's mtime, which drives LRU eviction past max_entries.
+    """
+    def __init__(self, directory: str, max_entries: int = 10_000):
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+        self._init_stats()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pkl")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                expires_at, output = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        if expires_at is not None and time.time() >= expires_at:
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass  # evicted concurrently; the value we read is still good
+        return output
+
+    def put(self, key: str, output: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        payload = pickle.dumps((time.time() + ttl if ttl else None, output))
+        # Write-then-rename so readers never see a partial entry
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+        os.replace(tmp, self._path(key))
+        self._evict()
+
+    def _evict(self) -> None:
+        entries = [e for e in os.scandir(self.directory) if e.name.endswith(".pkl")]
+        if len(entries) <= self.max_entries:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime_ns)
+        for e in entries[:len(entries) - self.max_entries]:
+            self._remove(e.path)
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def step_identity(step: Step) -> str:
+    """
+    Class plus constructor state; change either and the cache key changes.
+    State whose repr holds memory addresses (e.g. groups of steps) differs
+    between processes, so pass CachedStep an explicit identity for those.
+    """
+    cls = type(step)
+    state = {k: v for k, v in sorted(vars(step).items()) if not k.startswith("_")}
+    return f"{cls.__module__}.{cls.__qualname__}:{state!r}"
+
+class CachedStep:
+    """
+    Wraps a step so its output is reused when the step and the context keys it
+    reads are unchanged. Only successful results are stored. Steps with side
+    effects or hidden inputs (clock, network state) should not be cached, or
+    should be given a short ttl. The wrapped step's `resources` and `executor`
+    carry over; out of process, the wrapper runs in the worker, so only a
+    DiskCache is shared there.
+    """
+    def __init__(self, step: Step, cache: Any, *, reads: Optional[List[str]] = None,
+                 ttl: Optional[float] = None, identity: Optional[str] = None):
+        self.step = step
+        self.name = step.name
+        self.cache = cache
+        self.reads = list(reads or [])
+        self.ttl = ttl
+        self.identity = identity or step_identity(step)
+        self.resources = getattr(step, "resources", ())
+        self.executor = getattr(step, "executor", None)
+
+    def cache_key(self, ctx: Dict[str, Any]) -> str:
+        inputs = [(k, ctx.get(k)) for k in self.reads if k != CANCEL_KEY]
+        try:
+            blob = pickle.dumps((self.identity, inputs))
+        except Exception:
+            blob = repr((self.identity, inputs)).encode()
+        return hashlib.sha256(blob).hexdigest()
+
+    def run(self, ctx: Dict[str, Any]) -> StepResult:
+        start = time.perf_counter()
+        key = self.cache_key(ctx)
+        output = self.cache.get(key)
+        if output is not None:
+            self.cache.record(self.name, hit=True)
+            return StepResult(True, dict(output), duration_ms=int((time.perf_counter() - start) * 1000))
+
+        self.cache.record(self.name, hit=False)
+        res = run_step(self.step, ctx)
+        if res.ok:
+            try:
+                self.cache.put(key, res.output, self.ttl)
+            except (pickle.PicklingError, TypeError, AttributeError, OSError):
+                pass  # uncacheable output: the step still succeeded
+        return res
+
+
+# ---------- Example: re-running a workflow ----------
+
+if __name__ == "__main__":
+    cache = DiskCache(tempfile.mkdtemp(prefix="composite-cache-"), max_entries=100)
+
+    def build_workflow(currency: str) -> SequentialGroup:
+        return SequentialGroup("catalog-workflow", steps=[
+            ParallelGroup("fetch-assets", steps=[
+                CachedStep(SleepStep("download-catalog", 1.2, "catalog", {"n": 120}), cache, ttl=3600),
+                CachedStep(SleepStep("download-prices", 1.0, "prices", {"currency": currency}), cache, ttl=60),
+            ], max_workers=2),
+            # Re-validated whenever the downloaded catalog changes
+            CachedStep(SleepStep("validate-catalog", 0.2, "validated_catalog", True), cache,
+                       reads=["catalog"]),
+        ])
+
+    for run, currency in enumerate(["USD", "USD", "EUR"], start=1):
+        result = build_workflow(currency).run({})
+        print(f"Run {run} ({currency}): OK={result.ok}, {result.duration_ms} ms")
+
+    for step_name, st in cache.stats.items():
+        print(f"  {step_name:<18} hits={st.hits} misses={st.misses} hit rate={st.hit_rate:.0%}")
@@ -0,0 +1,189 @@
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+import warnings
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from composite_core import StepResult, Step, CANCEL_KEY
+from composite_parallel import SequentialGroup, ParallelGroup, SleepStep, FlakyStep
+from composite_scheduling import DurationHistory
+
+# Checkpoint/resume for long sequential workflows. After every completed
+# step, CheckpointedGroup stores the step's StepResult and a snapshot of the
+# context in a SQLite database, keyed by run id. Running the same run id
+# again with resume=True skips the steps that already completed and starts
+# from the restored context.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    run_id     TEXT NOT NULL,
+    step_index INTEGER NOT NULL,
+    step_name  TEXT NOT NULL,
+    result     BLOB NOT NULL,
+    ctx        BLOB NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (run_id, step_index)
+)
+"""
+
+@dataclass
+class Checkpoint:
+    step_index: int
+    step_name: str
+    result: StepResult
+    ctx: Dict[str, Any]
+    created_at: float
+
+class CheckpointStore:
+    """
+    SQLite-backed checkpoints (WAL mode, one connection per thread), so runs
+    in other threads or processes can share a file.
+    """
+    def __init__(self, path: str, timeout: float = 30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(SCHEMA)
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def save(self, run_id: str, step_index: int, step_name: str,
+             result: StepResult, ctx: Dict[str, Any]) -> None:
+        """Raises pickle's errors, without writing anything, if result or ctx cannot be pickled."""
+        row = (run_id, step_index, step_name, pickle.dumps(result), pickle.dumps(ctx), time.time())
+        conn = self._conn()
+        with conn:  # one transaction per checkpoint
+            conn.execute("INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?)", row)
+
+    def load(self, run_id: str) -> List[Checkpoint]:
+        rows = self._conn().execute(
+            "SELECT step_index, step_name, result, ctx, created_at FROM checkpoints "
+            "WHERE run_id = ? ORDER BY step_index", (run_id,),
+        ).fetchall()
+        return [Checkpoint(i, name, pickle.loads(res), pickle.loads(ctx), at)
+                for i, name, res, ctx, at in rows]
+
+    def clear(self, run_id: str, from_index: int = 0) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM checkpoints WHERE run_id = ? AND step_index >= ?", (run_id, from_index))
+
+    def runs(self) -> List[str]:
+        return [r[0] for r in self._conn().execute("SELECT DISTINCT run_id FROM checkpoints")]
+
+    def close(self) -> None:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+def snapshot_context(ctx: Dict[str, Any]) -> Dict[str, Any]:
+    """The picklable part of ctx; cancel tokens and other live objects are left out."""
+    snapshot = {}
+    for k, v in ctx.items():
+        if k == CANCEL_KEY:
+            continue
+        try:
+            pickle.dumps(v)
+        except Exception:
+            continue
+        snapshot[k] = v
+    return snapshot
+
+class CheckpointedGroup(SequentialGroup):
+    """
+    A SequentialGroup that checkpoints after every successful step. Steps run
+    as in SequentialGroup: under the runtime's resource limits, with their
+    durations recorded.
+    With resume=True, the checkpoints of run_id whose step names still match
+    the group's steps are replayed: their outputs are merged, the context is
+    restored from the last one, and execution continues with the next step.
+    With resume=False, earlier checkpoints of run_id are discarded.
+    Context values that cannot be pickled are not restored. A step whose
+    output cannot be pickled is not checkpointed (with a RuntimeWarning), and
+    neither are the steps after it: a resume starts again from that step.
+    """
+    def __init__(self, name: str, steps: List[Step], store: CheckpointStore, *,
+                 run_id: Optional[str] = None, resume: bool = True, fail_fast: bool = True,
+                 history: Optional[DurationHistory] = None):
+        super().__init__(name, steps, fail_fast=fail_fast, history=history)
+        self.store = store
+        self.run_id = run_id or uuid.uuid4().hex
+        self.resume = resume
+        self.resumed_steps = 0
+        self._resumable = True  # whether this run's checkpoints so far allow a resume
+
+    def _first_step(self, ctx: Dict[str, Any], merged: Dict[str, Any]) -> int:
+        self._resumable = True
+        self.resumed_steps = done = self._restore(ctx, merged)
+        return done
+
+    def _restore(self, ctx: Dict[str, Any], merged: Dict[str, Any]) -> int:
+        if not self.resume:
+            self.store.clear(self.run_id)
+            return 0
+        done = 0
+        last: Optional[Checkpoint] = None
+        for cp in self.store.load(self.run_id):
+            if cp.step_index != done or done >= len(self.steps) or cp.step_name != self.steps[done].name:
+                break  # the workflow changed since that run: redo from here
+            merged.update(cp.result.output)
+            last = cp
+            done += 1
+        self.store.clear(self.run_id, from_index=done)
+        if last is not None:
+            ctx.update(last.ctx)
+        return done
+
+    def _step_done(self, index: int, step: Step, res: StepResult, ctx: Dict[str, Any]) -> None:
+        # After a tolerated failure, a resume has to redo the failed step anyway
+        self._resumable = self._resumable and res.ok and self._save(index, step, res, ctx)
+
+    def _save(self, index: int, step: Step, res: StepResult, ctx: Dict[str, Any]) -> bool:
+        try:
+            self.store.save(self.run_id, index, step.name, res, snapshot_context(ctx))
+        except (pickle.PicklingError, TypeError, AttributeError) as e:
+            warnings.warn(f"[{self.name}] cannot checkpoint {step.name} ({e}); "
+                          f"a resume of {self.run_id} restarts from it", RuntimeWarning, stacklevel=4)
+            return False
+        return True
+
+
+# ---------- Example: resuming after a late failure ----------
+
+if __name__ == "__main__":
+    store = CheckpointStore(os.path.join(tempfile.mkdtemp(prefix="composite-checkpoints-"), "runs.db"))
+    publish = FlakyStep("publish", "published", True, failures=1)  # fails on the first run only
+
+    def build_workflow() -> CheckpointedGroup:
+        return CheckpointedGroup("catalog-workflow", [
+            ParallelGroup("fetch-assets", steps=[
+                SleepStep("download-catalog", 1.2, "catalog", {"n": 120}),
+                SleepStep("download-prices",  1.0, "prices",  {"currency": "USD"}),
+            ], max_workers=2),
+            SleepStep("validate-catalog", 0.5, "validated_catalog", True),
+            publish,
+        ], store, run_id="nightly-2024-06-01")
+
+    for attempt in (1, 2):
+        workflow = build_workflow()
+        ctx: Dict[str, Any] = {}
+        result = workflow.run(ctx)
+        print(f"Attempt {attempt}: OK={result.ok}, {result.duration_ms} ms, "
+              f"resumed {workflow.resumed_steps} step(s), ctx keys: {sorted(ctx)}")
+        if not result.ok:
+            print("  Error:", result.error)
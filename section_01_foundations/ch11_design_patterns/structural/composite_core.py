@@ -0,0 +1,138 @@
+from dataclasses import dataclass, field
+from typing import Protocol, Any, Dict, List, Optional, Callable
+import contextvars
+import threading
+import weakref
+from collections import ChainMap
+
+# The types every composite_parallel module shares: the StepResult a step
+# returns, the copy-on-write Context it reads and writes, and the
+# CancelToken its group uses to stop it.
+
+# ---------- Core types ----------
+
+@dataclass
+class StepResult:
+    ok: bool
+    output: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+    duration_ms: int = 0
+    attempts: int = 1        # runs needed, see composite_retry
+    hedged: bool = False     # a duplicate was launched for the last attempt
+    hedge_won: bool = False  # ... and finished first
+
+class Step(Protocol):
+    name: str
+    def run(self, ctx: Dict[str, Any]) -> StepResult: ...
+
+class Context(ChainMap):
+    """
+    Layered copy-on-write context. Forking adds an empty writable layer on top
+    of the shared ones, so every step gets an isolated view in O(1) instead of
+    a copy of every key. Writes land in the step's own layer; keys that only
+    live in a parent layer cannot be deleted. Chains deeper than MAX_DEPTH are
+    flattened once to keep lookups cheap.
+
+    A fork is a Mapping but not a dict, and a group's fork also carries its
+    CancelToken: json.dumps(ctx) and isinstance(ctx, dict) fail on it. Steps
+    that need a real dict take plain_context(ctx).
+    """
+    MAX_DEPTH = 32
+
+    def fork(self) -> "Context":
+        if len(self.maps) >= self.MAX_DEPTH:
+            return Context({}, dict(self))
+        return self.new_child()
+
+    # Code that calls ctx.copy() gets a fork, not a full copy
+    copy = fork
+    __copy__ = fork
+
+def fork_context(ctx: Dict[str, Any]) -> Context:
+    """An O(1) isolated view of ctx for one step; plain dicts become the base layer."""
+    if isinstance(ctx, Context):
+        return ctx.fork()
+    return Context({}, ctx)
+
+CANCEL_KEY = "cancel_token"
+
+class CancelToken:
+    """
+    Cooperative cancellation flag. Groups put one into each child's ctx under
+    CANCEL_KEY and cancel it on timeout or fail_fast; long-running steps poll
+    `cancelled` or sleep with `wait()` so they stop early. Cancelling a token
+    also cancels every token derived from it (nested groups).
+    """
+    def __init__(self, parent: Optional["CancelToken"] = None):
+        self._event = threading.Event()
+        self._children: "weakref.WeakSet[CancelToken]" = weakref.WeakSet()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+        self.reason: Optional[str] = None
+        if parent is not None:
+            parent._adopt(self)
+
+    def _adopt(self, child: "CancelToken") -> None:
+        with self._lock:
+            self._children.add(child)
+        if self.cancelled:
+            child.cancel(self.reason)
+
+    def cancel(self, reason: Optional[str] = "cancelled") -> None:
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            children = list(self._children)
+            callbacks, self._callbacks = self._callbacks, []
+        for child in children:
+            child.cancel(reason)
+        for callback in callbacks:
+            callback()
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Calls callback() once when cancelled (now, if already); returns an unsubscribe function."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._unsubscribe(callback)
+        callback()
+        return lambda: None
+
+    def _unsubscribe(self, callback: Callable[[], None]) -> None:
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Sleeps up to timeout seconds; returns True (early) if cancelled."""
+        return self._event.wait(timeout)
+
+NEVER_CANCELLED = CancelToken()
+
+def cancel_token(ctx: Dict[str, Any]) -> CancelToken:
+    return ctx.get(CANCEL_KEY) or NEVER_CANCELLED
+
+def plain_context(ctx: Dict[str, Any]) -> Dict[str, Any]:
+    """A flat dict copy of ctx without its cancel token, e.g. for json.dumps()."""
+    return {k: v for k, v in ctx.items() if k != CANCEL_KEY}
+
+def child_context(ctx: Dict[str, Any], token: CancelToken) -> Context:
+    """A forked ctx for one child step, carrying its group's cancel token."""
+    child = fork_context(ctx)
+    child[CANCEL_KEY] = token
+    return child
+
+# ---------- Current run ----------
+
+_current_runtime: contextvars.ContextVar[Optional["WorkflowRuntime"]] = \
+    contextvars.ContextVar("current_runtime", default=None)
+
+def current_runtime() -> Optional["WorkflowRuntime"]:
+    """The composite_runtime.WorkflowRuntime whose `with` block is active, if any."""
+    return _current_runtime.get()
@@ -0,0 +1,83 @@
+import asyncio
+import inspect
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, Optional
+
+from composite_core import StepResult, Step, cancel_token
+
+# The bridge between thread workflows and async steps. Async steps (run()
+# is a coroutine function) run on one shared event loop thread; sync code
+# waits for them with run_step(), and the runtime submits them to the loop
+# without taking a pool thread.
+
+def is_async_step(step: Any) -> bool:
+    """Steps whose run() is a coroutine function (e.g. composite_asyncio.AStep)."""
+    return inspect.iscoroutinefunction(getattr(step, "run", None))
+
+class EventLoopThread:
+    """
+    A long-lived asyncio loop on a daemon thread. Async steps of every
+    workflow run share it, so thousands of them can wait on I/O at once
+    without a thread each.
+    """
+    def __init__(self, name: str = "workflow-loop"):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, coro: Any) -> Future:
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def in_loop_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def stop(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+_shared_loop: Optional[EventLoopThread] = None
+_shared_loop_lock = threading.Lock()
+
+def shared_loop() -> EventLoopThread:
+    """The process-wide loop for async steps, started on first use."""
+    global _shared_loop
+    with _shared_loop_lock:
+        if _shared_loop is None:
+            _shared_loop = EventLoopThread()
+        return _shared_loop
+
+def as_step_result(res: Any, duration_ms: int = 0) -> StepResult:
+    """Async steps may return any result with ok/output/error (e.g. AResult)."""
+    if isinstance(res, StepResult):
+        return res
+    return StepResult(bool(res.ok), dict(res.output or {}), res.error, duration_ms=duration_ms)
+
+async def run_async_step(step: Any, ctx: Dict[str, Any]) -> StepResult:
+    start = time.perf_counter()
+    token = cancel_token(ctx)
+    task = asyncio.current_task()
+    loop = asyncio.get_running_loop()
+    # Cancelling the group's token cancels the task at its next await
+    unsubscribe = token.on_cancel(lambda: loop.call_soon_threadsafe(task.cancel))
+    try:
+        res = await step.run(ctx)
+    except asyncio.CancelledError:
+        if not token.cancelled:
+            raise  # the future itself was cancelled
+        return StepResult(False, error=f"{step.name} cancelled",
+                          duration_ms=int((time.perf_counter() - start) * 1000))
+    finally:
+        unsubscribe()
+    return as_step_result(res, int((time.perf_counter() - start) * 1000))
+
+def run_step(step: Step, ctx: Dict[str, Any]) -> StepResult:
+    """step.run(ctx) for sync steps; async steps run on the shared loop while this thread waits."""
+    if not is_async_step(step):
+        return step.run(ctx)
+    loop = shared_loop()
+    if loop.in_loop_thread():
+        raise RuntimeError(f"{step.name}: cannot block the shared event loop; await the step instead")
+    return loop.submit(run_async_step(step, ctx)).result()
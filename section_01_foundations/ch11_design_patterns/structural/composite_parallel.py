@@ -1,25 +1,28 @@
 from dataclasses import dataclass, field
-from typing import Protocol, Any, Dict, List, Optional, Callable, Iterable
+from typing import Any, Dict, List, Optional, Callable, Iterable, Iterator, Set, Tuple
+import json
+import os
+import tempfile
+import zlib
+import threading
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed, CancelledError, Future
-
-# ---------- Core types ----------
-
-@dataclass
-class StepResult:
-    ok: bool
-    output: Dict[str, Any] = field(default_factory=dict)
-    error: Optional[str] = None
-    duration_ms: int = 0
-
-class Step(Protocol):
-    name: str
-    def run(self, ctx: Dict[str, Any]) -> StepResult: ...
+from collections import ChainMap, deque
+from contextlib import closing, contextmanager
+from itertools import islice
+from concurrent.futures import wait, FIRST_COMPLETED, CancelledError, Future
+
+from composite_core import StepResult, Step, Context, CancelToken, cancel_token, child_context, current_runtime
+from composite_runtime import (RESOURCE_POLL, BACKENDS, OUT_OF_PROCESS, WorkflowRuntime, backend_for, check_picklable,
+                               process_context, requires, resources_for, run_workflow, traced_run)
+from composite_scheduling import (PRIORITIES, DurationHistory, ScheduleReport, child_estimates, expected_durations,
+                                  group_history, longest_first, lower_bound_ms)
+from composite_shm import SharedBuffer
+from composite_tracing import Tracer, current_tracer, trace_future
 
 # ---------- Concrete steps (examples) ----------
 
 class SleepStep:
-    """Simulates I/O-bound work via sleep; writes a key into context."""
+    """Simulates I/O-bound work via sleep; writes a key into context. Stops early when cancelled."""
     def __init__(self, name: str, seconds: float, key: str, value: Any):
         self.name = name
         self.seconds = seconds
@@ -29,11 +32,38 @@ class SleepStep:
     def run(self, ctx: Dict[str, Any]) -> StepResult:
         start = time.perf_counter()
         try:
-            time.sleep(self.seconds)
+            if cancel_token(ctx).wait(self.seconds):
+                return StepResult(False, error=f"{self.name} cancelled", duration_ms=int((time.perf_counter()-start)*1000))
             return StepResult(True, {self.key: self.value}, duration_ms=int((time.perf_counter()-start)*1000))
         except Exception as e:
             return StepResult(False, error=f"{self.name} failed: {e}", duration_ms=int((time.perf_counter()-start)*1000))
 
+class FlakyStep:
+    """An I/O-ish step that fails its first `failures` runs and stalls on every `stall_every`-th."""
+    def __init__(self, name: str, key: str, value: Any, *, seconds: float = 0.05,
+                 failures: int = 0, stall_every: int = 0, stall_seconds: float = 1.0):
+        self.name = name
+        self.key = key
+        self.value = value
+        self.seconds = seconds
+        self.failures = failures
+        self.stall_every = stall_every
+        self.stall_seconds = stall_seconds
+        self._runs = 0
+        self._lock = threading.Lock()
+
+    def run(self, ctx: Dict[str, Any]) -> StepResult:
+        with self._lock:
+            self._runs += 1
+            run = self._runs
+        if run <= self.failures:
+            return StepResult(False, error=f"{self.name}: transient failure #{run}")
+        stalls = self.stall_every and run % self.stall_every == 0
+        seconds = self.stall_seconds if stalls else self.seconds
+        if cancel_token(ctx).wait(seconds):
+            return StepResult(False, error=f"{self.name} cancelled")
+        return StepResult(True, {self.key: self.value})
+
 class FailStep:
     def __init__(self, name: str, msg: str = "boom"):
         self.name = name
@@ -45,25 +75,85 @@ class FailStep:
 # ---------- Groups ----------
 
 class SequentialGroup:
-    def __init__(self, name: str, steps: List[Step], fail_fast: bool = True):
+    def __init__(self, name: str, steps: List[Step], fail_fast: bool = True, *,
+                 history: Optional[DurationHistory] = None):
         self.name = name
         self.steps = steps
         self.fail_fast = fail_fast
+        self.history = history
 
     def run(self, ctx: Dict[str, Any]) -> StepResult:
         start = time.perf_counter()
         merged: Dict[str, Any] = {}
-        for step in self.steps:
-            res = step.run(ctx)
+        token = cancel_token(ctx)
+        history = group_history(self)
+        first = self._first_step(ctx, merged)
+        for index, step in enumerate(self.steps[first:], start=first):
+            if token.cancelled:
+                return StepResult(False, merged, error=f"[{self.name}] cancelled before {step.name}",
+                                  duration_ms=int((time.perf_counter()-start)*1000))
+            step_start = time.perf_counter()
+            res = self._run_step(step, ctx, token)
             if res.ok:
+                if history is not None:
+                    history.record(step.name, (time.perf_counter() - step_start) * 1000)
                 merged.update(res.output)
                 ctx.update(res.output)  # option: feed-forward into context
-            else:
-                if self.fail_fast:
-                    return StepResult(False, merged, error=f"[{self.name}] {res.error}",
-                                      duration_ms=int((time.perf_counter()-start)*1000))
+            self._step_done(index, step, res, ctx)
+            if not res.ok and self.fail_fast:
+                return StepResult(False, merged, error=f"[{self.name}] {res.error}",
+                                  duration_ms=int((time.perf_counter()-start)*1000))
         return StepResult(True, merged, duration_ms=int((time.perf_counter()-start)*1000))
 
+    # Hooks for subclasses (see composite_checkpoint.CheckpointedGroup)
+    def _first_step(self, ctx: Dict[str, Any], merged: Dict[str, Any]) -> int:
+        """Index of the first step to run; earlier ones may be restored into ctx and merged."""
+        return 0
+
+    def _step_done(self, index: int, step: Step, res: StepResult, ctx: Dict[str, Any]) -> None:
+        """Called after each step that ran, with its output already fed into ctx."""
+
+    @staticmethod
+    def _run_step(step: Step, ctx: Dict[str, Any], token: CancelToken) -> StepResult:
+        runtime = current_runtime()
+        resources = resources_for(step)
+        if runtime is None or not resources:
+            return traced_run(step, ctx)
+        if not runtime.acquire(resources, token):
+            return StepResult(False, error=f"{step.name} cancelled waiting for {', '.join(resources)}")
+        try:
+            return traced_run(step, ctx)
+        finally:
+            runtime.release(resources)
+
+@contextmanager
+def _cancel_at(token: CancelToken, deadline: Optional[float]) -> Iterator[None]:
+    """Cancels token ("timeout") if the block is still running at deadline (a perf_counter time)."""
+    if deadline is None:
+        yield
+        return
+    timer = threading.Timer(max(0.0, deadline - time.perf_counter()), token.cancel, ("timeout",))
+    timer.daemon = True
+    timer.start()
+    try:
+        yield
+    finally:
+        timer.cancel()
+
+def _submit_child(runtime: "WorkflowRuntime", step: Step, ctx: Dict[str, Any], backend: str,
+                  running: Dict[Future, Any], token: CancelToken, deadline: Optional[float],
+                  ready_us: Optional[float]) -> Optional[Future]:
+    """
+    Starts one child of a group. While the group has children in flight, it
+    waits for a free pool thread (None) rather than run the step itself, so
+    its deadline and fail_fast keep working; with none in flight the step may
+    run in the group's thread, and is stopped at the deadline all the same.
+    """
+    if running:
+        return runtime.try_submit_step(step, ctx, backend, ready_us=ready_us, caller_runs=False)
+    with _cancel_at(token, deadline):
+        return runtime.try_submit_step(step, ctx, backend, ready_us=ready_us)
+
 class ParallelGroup:
     """
     Runs child steps concurrently and merges outputs.
@@ -71,81 +161,153 @@ class ParallelGroup:
       - max_workers: degree of parallelism
       - fail_fast: cancel remaining futures on first failure
       - timeout: optional overall timeout for the group (seconds)
+      - executor: "thread" (default), "process" for CPU-bound steps, or
+        "remote" for the runtime's remote workers; a step's own `executor`
+        attribute takes precedence
+      - priority: "fifo" (default) starts steps in list order; "longest_first"
+        starts the steps with the longest recorded durations first
+      - history: where durations are recorded and read; defaults to the
+        workflow's (see WorkflowRuntime), and without one nothing is recorded
+        and longest_first keeps list order
+    After a run, last_report compares the makespan with its lower bound.
     """
+    fans_out = True
+
     def __init__(self, name: str, steps: List[Step], *, max_workers: int = 4,
-                 fail_fast: bool = False, timeout: Optional[float] = None):
+                 fail_fast: bool = False, timeout: Optional[float] = None,
+                 executor: str = "thread", priority: str = "fifo",
+                 history: Optional[DurationHistory] = None):
+        if priority not in PRIORITIES:
+            raise ValueError(f"priority must be one of {PRIORITIES}, got {priority!r}")
         self.name = name
         self.steps = steps
         self.max_workers = max_workers
         self.fail_fast = fail_fast
         self.timeout = timeout
+        self.executor = executor
+        self.priority = priority
+        self.history = history
+        self.last_report: Optional[ScheduleReport] = None
+        # Fail at build time rather than halfway through a run
+        for step in steps:
+            if backend_for(step, executor) in OUT_OF_PROCESS:
+                check_picklable(step, f"[{name}] step {step.name!r}")
 
     def run(self, ctx: Dict[str, Any]) -> StepResult:
         start = time.perf_counter()
         merged: Dict[str, Any] = {}
         errors: List[str] = []
 
-        # Submit all tasks
-        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{self.name}-") as pool:
-            futures: Dict[Future, Step] = {pool.submit(step.run, ctx.copy()): step for step in self.steps}
-
-            try:
-                # as_completed supports a timeout per iteration; we implement an overall timeout.
-                deadline = (time.perf_counter() + self.timeout) if self.timeout else None
-                done_count = 0
-
-                while futures:
-                    remaining = self._remaining_time(deadline)
-                    # Wait for at least one to finish
-                    for fut in as_completed(list(futures.keys()), timeout=remaining):
-                        step = futures.pop(fut)
-                        try:
-                            res: StepResult = fut.result()
-                            if res.ok:
-                                merged.update(res.output)
-                            else:
-                                errors.append(res.error or f"{step.name} failed")
-                                if self.fail_fast:
-                                    # Cancel all remaining futures
-                                    for f in futures:
-                                        f.cancel()
-                                    futures.clear()
-                                    raise RuntimeError("fail_fast")
-                        except CancelledError:
-                            errors.append(f"{step.name} cancelled")
-                        except Exception as e:
-                            errors.append(f"{step.name} raised: {e}")
-                            if self.fail_fast:
-                                for f in futures:
-                                    f.cancel()
-                                futures.clear()
-                                raise RuntimeError("fail_fast")
-
-                        done_count += 1
-
-                    # If we set a deadline and exceeded it:
-                    if deadline is not None and time.perf_counter() > deadline and futures:
-                        for f, st in list(futures.items()):
-                            f.cancel()
-                            errors.append(f"{st.name} timed out")
-                            futures.pop(f, None)
+        # Inside a WorkflowRuntime all groups share its pool; standalone groups get their own.
+        runtime = current_runtime()
+        own_runtime = runtime is None
+        if own_runtime:
+            runtime = WorkflowRuntime(self.max_workers, name=self.name, max_processes=self.max_workers)
+
+        # Children see this token; cancelling it stops steps that are already running
+        token = CancelToken(parent=cancel_token(ctx))
+        tracer = current_tracer()
+        ready_us = tracer.now_us() if tracer else None  # every child is runnable from the start
+        history = group_history(self)
+        durations: List[float] = []
+        try:
+            deadline = (time.perf_counter() + self.timeout) if self.timeout else None
+            steps = self.steps
+            if self.priority == "longest_first" and history is not None:
+                steps = longest_first(steps, history)
+            queue = deque(steps)
+            running: Dict[Future, Step] = {}
+            submitted: Dict[Future, float] = {}
+
+            while queue or running:
+                if token.cancelled:
+                    # An enclosing group gave up on us, or a step we ran ourselves
+                    # outlived the deadline: don't start anything new
+                    why = "timed out" if token.reason == "timeout" else "cancelled"
+                    errors.extend(f"{st.name} {why}" for st in queue)
+                    queue.clear()
+
+                # Keep at most max_workers of this group's steps in flight; steps
+                # whose resources are busy stay queued while later ones start
+                for step in list(queue):
+                    if len(running) >= self.max_workers:
                         break
-
-            except TimeoutError:
-                # (per-iteration timeout) defensive—shouldn’t happen with our loop, but safe-guard
-                for f, st in futures.items():
-                    f.cancel()
-                    errors.append(f"{st.name} timed out")
-                futures.clear()
-            except RuntimeError:
-                # fail_fast path already handled cancellation/collect errors
-                pass
-
-        duration_ms = int((time.perf_counter() - start) * 1000)
+                    fut = _submit_child(runtime, step, child_context(ctx, token), backend_for(step, self.executor),
+                                        running, token, deadline, ready_us)
+                    if fut is not None:
+                        queue.remove(step)
+                        running[fut] = step
+                        submitted[fut] = time.perf_counter()
+                if not running and not queue:
+                    break
+
+                timeout = self._remaining_time(deadline)
+                if queue and len(running) < self.max_workers:
+                    timeout = RESOURCE_POLL if timeout is None else min(timeout, RESOURCE_POLL)
+                done = self._wait_any(running, timeout, token)
+                if not done and deadline is not None and time.perf_counter() >= deadline:
+                    # Overall deadline reached: signal stragglers and return without them
+                    token.cancel("timeout")
+                    for f, st in running.items():
+                        f.cancel()
+                        errors.append(f"{st.name} timed out")
+                    errors.extend(f"{st.name} timed out" for st in queue)
+                    break
+                if not done:
+                    continue  # retry the steps waiting for resources
+
+                failed = False
+                for fut in done:
+                    step = running.pop(fut)
+                    try:
+                        res: StepResult = fut.result()
+                        if res.ok:
+                            took = res.duration_ms or (time.perf_counter() - submitted[fut]) * 1000
+                            if history is not None:
+                                history.record(step.name, took)
+                            durations.append(took)
+                            merged.update(res.output)
+                        else:
+                            errors.append(res.error or f"{step.name} failed")
+                            failed = True
+                    except CancelledError:
+                        errors.append(f"{step.name} cancelled")
+                    except Exception as e:
+                        errors.append(f"{step.name} raised: {e}")
+                        failed = True
+
+                if failed and self.fail_fast:
+                    # Cancel everything that is still pending or running
+                    token.cancel("fail_fast")
+                    for f in running:
+                        f.cancel()
+                    break
+        finally:
+            if own_runtime:
+                runtime.shutdown(wait=False, cancel_futures=True)
+
+        makespan_ms = (time.perf_counter() - start) * 1000
+        self.last_report = ScheduleReport(makespan_ms, lower_bound_ms(durations, self.max_workers), len(durations))
+        duration_ms = int(makespan_ms)
         if errors:
             return StepResult(False, merged, error=f"[{self.name}] " + " | ".join(errors), duration_ms=duration_ms)
         return StepResult(True, merged, duration_ms=duration_ms)
 
+    def estimate_from_children(self, history: DurationHistory) -> Optional[float]:
+        """Bounded by the longest child and by the children's total work per worker."""
+        est = child_estimates(self.steps, history)
+        if not est:
+            return None
+        return max(max(est), sum(est) / self.max_workers)
+
+    @staticmethod
+    def _wait_any(running: Dict[Future, Any], timeout: Optional[float], token: CancelToken) -> Set[Future]:
+        if not running:
+            token.wait(timeout)  # only waiting for resources: nothing can complete
+            return set()
+        done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+        return done
+
     @staticmethod
     def _remaining_time(deadline: Optional[float]) -> Optional[float]:
         if deadline is None:
@@ -154,6 +316,256 @@ class ParallelGroup:
         return max(rem, 0.0)
 
 
+@dataclass
+class DagNode:
+    """A step plus the context keys it reads (needs) and writes (produces)."""
+    step: Step
+    needs: List[str] = field(default_factory=list)
+    produces: List[str] = field(default_factory=list)
+
+class DagGroup:
+    """
+    Runs steps as soon as the context keys they need are available, instead of
+    waiting for a whole parallel stage. End-to-end latency is then bounded by
+    the critical path of the graph rather than the slowest member of each stage.
+    Needs that no node produces must be present in the incoming ctx.
+    Options:
+      - max_workers: degree of parallelism
+      - fail_fast: stop scheduling and cancel pending steps on first failure;
+        otherwise only the failed step's dependents are skipped
+      - timeout: optional overall timeout for the group (seconds)
+      - priority: "fifo" (default) starts ready nodes in list order;
+        "longest_first" starts the ready nodes with the longest expected path
+        to the end of the graph first (critical path first)
+      - history: where durations are recorded and read; defaults to the
+        workflow's (see WorkflowRuntime), and without one nothing is recorded
+        and longest_first keeps list order
+    After a run, last_report compares the makespan with its lower bound.
+    """
+    def __init__(self, name: str, nodes: List[DagNode], *, max_workers: int = 4,
+                 fail_fast: bool = True, timeout: Optional[float] = None,
+                 priority: str = "fifo", history: Optional[DurationHistory] = None):
+        if priority not in PRIORITIES:
+            raise ValueError(f"priority must be one of {PRIORITIES}, got {priority!r}")
+        self.name = name
+        self.nodes = nodes
+        self.max_workers = max_workers
+        self.fail_fast = fail_fast
+        self.timeout = timeout
+        self.priority = priority
+        self.history = history
+        self.last_report: Optional[ScheduleReport] = None
+        self.producer_of = self._index_producers(nodes)
+        self._check_acyclic()
+        for node in nodes:
+            if backend_for(node.step, "thread") in OUT_OF_PROCESS:
+                check_picklable(node.step, f"[{name}] step {node.step.name!r}")
+
+    @staticmethod
+    def _index_producers(nodes: List[DagNode]) -> Dict[str, DagNode]:
+        producer_of: Dict[str, DagNode] = {}
+        for node in nodes:
+            for key in node.produces:
+                if key in producer_of:
+                    raise ValueError(f"key {key!r} is produced by both "
+                                     f"{producer_of[key].step.name!r} and {node.step.name!r}")
+                producer_of[key] = node
+        return producer_of
+
+    def _upstream(self, node: DagNode) -> List[DagNode]:
+        return [self.producer_of[k] for k in node.needs if k in self.producer_of]
+
+    def _check_acyclic(self) -> None:
+        # Depth-first search; a node met again while still on the stack closes a cycle.
+        visiting, done = set(), set()
+        path: List[DagNode] = []
+
+        def visit(node: DagNode) -> None:
+            if id(node) in done:
+                return
+            if id(node) in visiting:
+                cycle = path[path.index(node):] + [node]
+                raise ValueError(f"[{self.name}] dependency cycle: "
+                                 + " -> ".join(n.step.name for n in cycle))
+            visiting.add(id(node))
+            path.append(node)
+            for up in self._upstream(node):
+                visit(up)
+            path.pop()
+            visiting.discard(id(node))
+            done.add(id(node))
+
+        for node in self.nodes:
+            visit(node)
+
+    def _path_lengths(self, weight: Dict[int, float]) -> Dict[int, float]:
+        # Longest weighted path from each node to the end of the graph
+        downstream: Dict[int, List[DagNode]] = {id(n): [] for n in self.nodes}
+        for node in self.nodes:
+            for up in self._upstream(node):
+                downstream[id(up)].append(node)
+        memo: Dict[int, float] = {}
+
+        def length(node: DagNode) -> float:
+            if id(node) not in memo:
+                memo[id(node)] = weight.get(id(node), 0.0) + max(
+                    (length(d) for d in downstream[id(node)]), default=0.0)
+            return memo[id(node)]
+
+        return {id(n): length(n) for n in self.nodes}
+
+    def bottom_levels(self, history: DurationHistory) -> Dict[int, float]:
+        """Expected time (ms) from starting each node to finishing the graph, keyed by id(node)."""
+        est = expected_durations([n.step for n in self.nodes], history)
+        return self._path_lengths({id(n): e for n, e in zip(self.nodes, est)})
+
+    def estimate_from_children(self, history: DurationHistory) -> Optional[float]:
+        """Bounded by the critical path and by the nodes' total work per worker."""
+        est = child_estimates([n.step for n in self.nodes], history)
+        if est is None:
+            return None
+        return max(max(self.bottom_levels(history).values(), default=0.0), sum(est) / self.max_workers)
+
+    def run(self, ctx: Dict[str, Any]) -> StepResult:
+        start = time.perf_counter()
+        merged: Dict[str, Any] = {}
+        errors: List[str] = []
+        token = CancelToken(parent=cancel_token(ctx))
+        view = child_context(ctx, token)  # incoming ctx; node outputs collect in merged
+        # Node outputs also stack up as layers over view; each node gets a fork
+        # of the stack as it was at launch, so siblings finishing later don't leak in
+        outputs = view
+
+        missing = [f"{n.step.name} needs {k!r}" for n in self.nodes for k in n.needs
+                   if k not in self.producer_of and k not in view]
+        if missing:
+            return StepResult(False, error=f"[{self.name}] missing inputs: " + ", ".join(missing))
+
+        available: Set[str] = set(view)
+        history = group_history(self)
+        pending = list(self.nodes)
+        if self.priority == "longest_first" and history is not None:
+            level = self.bottom_levels(history)
+            pending.sort(key=lambda n: -level[id(n)])
+        failed: Set[int] = set()
+        durations: Dict[int, float] = {}
+        submitted: Dict[Future, float] = {}
+        deadline = (time.perf_counter() + self.timeout) if self.timeout else None
+        tracer = current_tracer()
+        ready_at: Dict[int, float] = {}  # when each node's needs were first all available
+
+        runtime = current_runtime()
+        own_runtime = runtime is None
+        if own_runtime:
+            runtime = WorkflowRuntime(self.max_workers, name=self.name, max_processes=self.max_workers)
+
+        try:
+            running: Dict[Future, DagNode] = {}
+            while pending or running:
+                if token.cancelled:
+                    # An enclosing group gave up on us, or a step we ran ourselves
+                    # outlived the deadline: don't start anything new
+                    why = "timed out" if token.reason == "timeout" else "cancelled"
+                    errors.extend(f"{n.step.name} {why}" for n in pending)
+                    pending.clear()
+
+                # Skip nodes whose inputs can never arrive, launch the ready ones.
+                blocked = False
+                for node in list(pending):
+                    if any(id(up) in failed for up in self._upstream(node)):
+                        pending.remove(node)
+                        failed.add(id(node))
+                        errors.append(f"{node.step.name} skipped (upstream failed)")
+                    elif all(k in available for k in node.needs):
+                        if tracer:
+                            ready_at.setdefault(id(node), tracer.now_us())
+                        if len(running) < self.max_workers:
+                            fut = _submit_child(runtime, node.step, outputs.fork(), backend_for(node.step, "thread"),
+                                                running, token, deadline, ready_at.get(id(node)))
+                            if fut is None:
+                                blocked = True  # resources busy: retry shortly
+                            else:
+                                pending.remove(node)
+                                running[fut] = node
+                                submitted[fut] = time.perf_counter()
+                if not running and not blocked:
+                    # Whatever is left depends on a failed step further down the list
+                    errors.extend(f"{n.step.name} skipped (upstream failed)" for n in pending)
+                    break
+
+                timeout = ParallelGroup._remaining_time(deadline)
+                if blocked:
+                    timeout = RESOURCE_POLL if timeout is None else min(timeout, RESOURCE_POLL)
+                done = ParallelGroup._wait_any(running, timeout, token)
+                if not done and (not blocked or (deadline is not None and time.perf_counter() >= deadline)):
+                    token.cancel("timeout")
+                    for f, node in running.items():
+                        f.cancel()
+                        errors.append(f"{node.step.name} timed out")
+                    errors.extend(f"{n.step.name} not started (timeout)" for n in pending)
+                    break
+
+                for fut in done:
+                    node = running.pop(fut)
+                    try:
+                        res: StepResult = fut.result()
+                        if res.ok and any(k not in res.output for k in node.produces):
+                            res = StepResult(False, res.output, error=(
+                                f"{node.step.name} did not produce "
+                                + ", ".join(k for k in node.produces if k not in res.output)))
+                    except Exception as e:
+                        res = StepResult(False, error=f"{node.step.name} raised: {e}")
+                    if res.ok:
+                        durations[id(node)] = res.duration_ms or (time.perf_counter() - submitted[fut]) * 1000
+                        if history is not None:
+                            history.record(node.step.name, durations[id(node)])
+                        merged.update(res.output)
+                        available.update(res.output)
+                        outputs = outputs.new_child(res.output)
+                        if len(outputs.maps) >= Context.MAX_DEPTH:
+                            # Flatten the node layers, not the incoming ctx under them
+                            layers = outputs.maps[:len(outputs.maps) - len(view.maps)]
+                            outputs = Context(dict(ChainMap(*layers)), *view.maps)
+                    else:
+                        failed.add(id(node))
+                        errors.append(res.error or f"{node.step.name} failed")
+
+                if errors and self.fail_fast:
+                    token.cancel("fail_fast")
+                    for f in running:
+                        f.cancel()
+                    break
+        finally:
+            if own_runtime:
+                runtime.shutdown(wait=False, cancel_futures=True)
+
+        makespan_ms = (time.perf_counter() - start) * 1000
+        critical_path = max(self._path_lengths(durations).values(), default=0.0)
+        self.last_report = ScheduleReport(makespan_ms, lower_bound_ms(list(durations.values()), self.max_workers,
+                                                                      critical_path), len(durations))
+        duration_ms = int(makespan_ms)
+        if errors:
+            return StepResult(False, merged, error=f"[{self.name}] " + " | ".join(errors), duration_ms=duration_ms)
+        return StepResult(True, merged, duration_ms=duration_ms)
+
+
+def _map_chunk(name: str, fn: Callable[[Any, Dict[str, Any]], StepResult],
+               chunk: List[Tuple[int, Any]], ctx: Dict[str, Any]) -> List[Tuple[Any, StepResult]]:
+    # Module level so process pools can pickle it
+    results = []
+    token = cancel_token(ctx)
+    for i, item in chunk:
+        if token.cancelled:
+            results.append((item, StepResult(False, error=f"{name}-{i} cancelled")))
+            continue
+        try:
+            res = fn(item, ctx)
+        except Exception as e:
+            res = StepResult(False, error=f"{name}-{i} raised: {e}")
+        results.append((item, res))
+    return results
+
+
 class FnStep:
     def __init__(self, name: str, fn: Callable[[Any, Dict[str, Any]], StepResult], arg: Any):
         self.name = name
@@ -163,21 +575,153 @@ class FnStep:
         return self.fn(self.arg, ctx)
 
 class ParallelMap(Step):
+    """
+    Applies fn to every item concurrently, pulling items lazily so that
+    generators of any length can be mapped in bounded memory.
+    Options:
+      - max_workers: degree of parallelism
+      - chunk_size: items handled per task; items of one chunk share a ctx copy
+      - window: chunks in flight at once (defaults to max_workers)
+      - fail_fast: stop pulling items on first failure
+      - timeout: optional overall timeout (seconds)
+      - executor: "thread" (default), "process" or "remote"; out of process,
+        fn, the items and the context must be picklable
+    Pending items of a chunk are skipped once the map is cancelled.
+    A one-shot iterator can only be mapped once.
+    """
+    fans_out = True
+    _map_fn = staticmethod(_map_chunk)  # runs one chunk; composite_batching.BatchMap swaps in its own
+
     def __init__(
         self, name: str, items: Iterable[Any],
         fn: Callable[[Any, Dict[str, Any]], StepResult],
-        *, max_workers: int = 8, timeout: Optional[float] = None
+        *, max_workers: int = 8, timeout: Optional[float] = None,
+        chunk_size: int = 1, window: Optional[int] = None, fail_fast: bool = False,
+        executor: str = "thread"
     ):
         self.name = name
-        self.items = list(items)
+        self.items = items
         self.fn = fn
         self.max_workers = max_workers
         self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.window = window or max_workers
+        self.fail_fast = fail_fast
+        self.executor = executor
+        if executor not in BACKENDS:
+            raise ValueError(f"{name}: unknown executor {executor!r}, expected one of {BACKENDS}")
+        if chunk_size < 1:
+            raise ValueError(f"{name}: chunk_size must be at least 1, got {chunk_size}")
+        if window is not None and window < 1:
+            raise ValueError(f"{name}: window must be at least 1, got {window}")
+        if executor in OUT_OF_PROCESS:
+            check_picklable(fn, f"[{name}] fn")
+
+    def _submit_chunk(self, runtime: "WorkflowRuntime", chunk: List[Tuple[int, Any]],
+                      ctx: Dict[str, Any], caller_runs: bool = True) -> Optional[Future]:
+        if self.executor in OUT_OF_PROCESS:
+            submit = runtime.submit_process if self.executor == "process" else runtime.submit_remote
+            fut = submit(self._map_fn, self.name, self.fn, chunk, process_context(ctx))
+            tracer = current_tracer()
+            if tracer is not None:
+                trace_future(tracer, f"{self.name}[{chunk[0][0]}:{chunk[-1][0] + 1}]", fut,
+                              backend=self.executor)
+            return fut
+        return runtime.submit_traced(f"{self.name}[{chunk[0][0]}:{chunk[-1][0] + 1}]",
+                                     self._map_fn, self.name, self.fn, chunk, ctx, caller_runs=caller_runs)
+
+    def _chunks(self, source: Iterator[Tuple[int, Any]]) -> Iterator[List[Tuple[int, Any]]]:
+        while True:
+            chunk = list(islice(source, self.chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+    def iter_results(self, ctx: Dict[str, Any]) -> Iterator[Tuple[Any, StepResult]]:
+        """
+        Yields (item, StepResult) pairs in completion order; raises TimeoutError
+        at the deadline. A chunk that fails as a whole (its items cannot be
+        pickled, its worker died) yields a failed result for each of its items.
+        """
+        runtime = current_runtime()
+        own_runtime = runtime is None
+        if own_runtime:
+            runtime = WorkflowRuntime(self.max_workers, name=self.name, max_processes=self.max_workers)
+
+        deadline = (time.perf_counter() + self.timeout) if self.timeout else None
+        token = CancelToken(parent=cancel_token(ctx))
+        chunks = self._chunks(enumerate(self.items))
+        running: Dict[Future, List[Tuple[int, Any]]] = {}
+        held: Optional[List[Tuple[int, Any]]] = None  # pulled, but every pool thread was busy
+        exhausted = False
+        try:
+            while True:
+                # Top the window up from the source; never read further ahead than that
+                while not exhausted and not token.cancelled and len(running) < self.window:
+                    chunk, held = held or next(chunks, None), None
+                    if chunk is None:
+                        exhausted = True
+                        break
+                    try:
+                        # As in the groups: only run a chunk here when none is in flight
+                        if running:
+                            fut = self._submit_chunk(runtime, chunk, child_context(ctx, token), caller_runs=False)
+                        else:
+                            with _cancel_at(token, deadline):
+                                fut = self._submit_chunk(runtime, chunk, child_context(ctx, token))
+                    except Exception as e:  # e.g. a process pool broken by an earlier chunk
+                        fut = Future()
+                        fut.set_exception(e)
+                    if fut is None:
+                        held = chunk
+                        break
+                    running[fut] = chunk
+                if not running:
+                    if not exhausted and deadline is not None and time.perf_counter() >= deadline:
+                        raise TimeoutError(f"{self.name} timed out")  # a chunk we ran ourselves overran
+                    return
+
+                done, _ = wait(running, timeout=ParallelGroup._remaining_time(deadline),
+                               return_when=FIRST_COMPLETED)
+                if not done:
+                    raise TimeoutError(f"{self.name} timed out with {len(running)} chunk(s) in flight")
+                for fut in done:
+                    chunk = running.pop(fut)
+                    try:
+                        results = fut.result()
+                    except Exception as e:
+                        results = [(item, StepResult(False, error=f"{self.name}-{i} raised: {e!r}"))
+                                   for i, item in chunk]
+                    yield from results
+        finally:
+            # Also reached on timeout or when the consumer stops iterating early
+            token.cancel("stopped")
+            for f in running:
+                f.cancel()
+            chunks.close()
+            if own_runtime:
+                runtime.shutdown(wait=False, cancel_futures=True)
 
     def run(self, ctx: Dict[str, Any]) -> StepResult:
-        # Wrap fn into Steps and delegate to ParallelGroup
-        steps = [FnStep(f"{self.name}-{i}", self.fn, item) for i, item in enumerate(self.items)]
-        return ParallelGroup(self.name, steps, max_workers=self.max_workers, timeout=self.timeout).run(ctx)
+        start = time.perf_counter()
+        merged: Dict[str, Any] = {}
+        errors: List[str] = []
+        with closing(self.iter_results(ctx)) as results:
+            try:
+                for item, res in results:
+                    if res.ok:
+                        merged.update(res.output)
+                    else:
+                        errors.append(res.error or f"{self.name} failed on {item!r}")
+                        if self.fail_fast:
+                            break
+            except TimeoutError as e:
+                errors.append(str(e))
+
+        duration_ms = int((time.perf_counter() - start) * 1000)
+        if errors:
+            return StepResult(False, merged, error=f"[{self.name}] " + " | ".join(errors), duration_ms=duration_ms)
+        return StepResult(True, merged, duration_ms=duration_ms)
 
 
 def resize_image(img_path: str, ctx: Dict[str, Any]) -> StepResult:
@@ -186,6 +730,38 @@ def resize_image(img_path: str, ctx: Dict[str, Any]) -> StepResult:
     return StepResult(True, {f"resized::{img_path}": True})
 
 
+def blur_image(img_path: str, ctx: Dict[str, Any], size: int = 1024) -> StepResult:
+    # Real CPU work: a 3-tap box blur over a generated size x size grayscale image.
+    # The 1 MiB result travels back from a worker process through shared memory.
+    seed = sum(img_path.encode())
+    pixels = bytes((i * 31 + seed) & 0xFF for i in range(size * size))
+    out = bytearray(len(pixels))
+    for i in range(1, len(pixels) - 1):
+        out[i] = (pixels[i - 1] + pixels[i] + pixels[i + 1]) // 3
+    return StepResult(True, {f"blurred::{img_path}": bytes(out)})
+
+FRAME_BYTES = 8 << 20
+
+def render_frame(n: int, ctx: Dict[str, Any]) -> StepResult:
+    # A large output written straight into shared memory
+    buf = SharedBuffer.create(FRAME_BYTES)
+    with buf.view() as view:
+        view[::4096] = bytes([n & 0xFF]) * len(view[::4096])
+    return StepResult(True, {f"frame-{n}": buf})
+
+def render_frame_bytes(n: int, ctx: Dict[str, Any]) -> StepResult:
+    out = bytearray(FRAME_BYTES)
+    out[::4096] = bytes([n & 0xFF]) * len(out[::4096])
+    return StepResult(True, {f"frame-{n}": bytes(out)})
+
+def frame_crc(key: str, ctx: Dict[str, Any]) -> StepResult:
+    frame = ctx[key]
+    if isinstance(frame, SharedBuffer):
+        with frame.view() as view:
+            return StepResult(True, {f"crc-{key}": zlib.crc32(view)})
+    return StepResult(True, {f"crc-{key}": zlib.crc32(frame)})
+
+
 # ---------- Example Workflow (fan-out / fan-in) ----------
 
 if __name__ == "__main__":
@@ -223,6 +799,58 @@ if __name__ == "__main__":
     if not result.ok:
         print("Error:", result.error)
 
+# --- Cooperative cancellation ------------------
+    # The slow download notices the cancel token at the 0.5s deadline, so the
+    # group returns then instead of waiting 10s for the straggler's thread.
+    deadline_group = ParallelGroup("fetch-with-deadline", steps=[
+        SleepStep("download-catalog", 10.0, "catalog", {"n": 120}),
+        SleepStep("download-prices",  0.1, "prices",  {"currency": "USD"}),
+    ], timeout=0.5)
+    result = deadline_group.run({})
+    print("OK:", result.ok, "| Duration (ms):", result.duration_ms, "| Error:", result.error)
+
+# --- Shared runtime ----------------------------
+    # Nested groups borrow threads from one pool instead of each creating their
+    # own: 4 x 4 leaves run on at most 6 pool threads (plus blocked parents).
+    nested = ParallelGroup("regions", steps=[
+        ParallelGroup(f"region-{r}", steps=[
+            SleepStep(f"fetch-{r}-{i}", 0.05, f"stock-{r}-{i}", i) for i in range(4)
+        ], max_workers=4)
+        for r in range(4)
+    ], max_workers=4)
+
+    result = run_workflow(nested, {}, max_concurrency=6)
+
+    print("OK:", result.ok)
+    print("Duration (ms):", result.duration_ms)
+    print("Output keys:", len(result.output))
+    if not result.ok:
+        print("Error:", result.error)
+
+# --- As a dependency graph ---------------------
+    # Each validation starts as soon as its own download finishes, and persist
+    # as soon as both validations are done: ~1.5s instead of ~1.7s above.
+    dag = DagGroup("car-assembler-dag", nodes=[
+        DagNode(SleepStep("download-catalog", 1.2, "catalog", {"n": 120}), produces=["catalog"]),
+        DagNode(SleepStep("download-prices",  1.0, "prices",  {"currency": "USD"}), produces=["prices"]),
+        DagNode(SleepStep("download-stock",   0.8, "stock",   {"available": True}), produces=["stock"]),
+        DagNode(SleepStep("validate-catalog", 0.2, "validated_catalog", True),
+                needs=["catalog"], produces=["validated_catalog"]),
+        DagNode(SleepStep("validate-prices",  0.2, "validated_prices",  True),
+                needs=["prices"], produces=["validated_prices"]),
+        DagNode(SleepStep("persist", 0.1, "saved", True),
+                needs=["validated_catalog", "validated_prices", "stock"], produces=["saved"]),
+    ], max_workers=3, timeout=5.0)
+
+    ctx: Dict[str, Any] = {}
+    result = dag.run(ctx)
+
+    print("OK:", result.ok)
+    print("Duration (ms):", result.duration_ms)
+    print("Output keys:", list(result.output.keys()))
+    if not result.ok:
+        print("Error:", result.error)
+
 # --- With ParallelMap --------------------------
     parallel_resize = ParallelMap("resize-batch", ["a.jpg","b.jpg","c.jpg"], resize_image, max_workers=3)
     # Image resizing workflow
@@ -240,3 +868,87 @@ if __name__ == "__main__":
     if not result.ok:
         print("Error:", result.error)
 
+# --- CPU-bound steps in processes --------------
+    # Threads serialize on the GIL here; processes scale with the available cores.
+    images = ["a.jpg", "b.jpg"]
+    for backend in ("thread", "process"):
+        blur = ParallelMap(f"blur-{backend}", images, blur_image, max_workers=2, executor=backend)
+        result = blur.run({})
+        print(f"Blur on {backend} backend: OK={result.ok}, {result.duration_ms} ms on {os.cpu_count()} CPU(s), "
+              f"{sum(len(v) for v in result.output.values()) // (1 << 20)} MiB returned")
+
+# --- Per-resource limits ----------------------
+    # Three regions each write 4 rows to the DB (2 concurrent calls allowed
+    # across the whole run) and upload 4 files to the object store; uploads
+    # are not held up behind the DB queue.
+    regional = ParallelGroup("sync-regions", steps=[
+        ParallelGroup(f"sync-{r}", steps=[
+            requires(SleepStep(f"write-{r}-{i}", 0.05, f"row-{r}-{i}", i), "db") for i in range(4)
+        ] + [
+            requires(SleepStep(f"upload-{r}-{i}", 0.05, f"file-{r}-{i}", i), "object-store") for i in range(4)
+        ], max_workers=8)
+        for r in range(3)
+    ], max_workers=3)
+    result = run_workflow(regional, {}, max_concurrency=32, limits={"db": 2, "object-store": 32})
+    print(f"Resource-limited: OK={result.ok}, {result.duration_ms} ms for 12 DB writes at 2 at a time")
+
+# --- Longest-first scheduling ------------------
+    # Six short exports and one long one listed last, on 2 workers. In list
+    # order the long export starts at 0.15s; once its duration is on record,
+    # longest_first starts it immediately and the short ones fill the other slot.
+    history = DurationHistory()
+    for priority in ("fifo", "longest_first"):
+        exports = ParallelGroup("exports", steps=[
+            SleepStep(f"export-{i}", 0.05, f"export-{i}", i) for i in range(6)
+        ] + [SleepStep("export-archive", 0.3, "archive", True)],
+            max_workers=2, priority=priority, history=history)
+        result = exports.run({})
+        report = exports.last_report
+        print(f"{priority:<13}: OK={result.ok}, makespan {report.makespan_ms:.0f} ms, "
+              f"lower bound {report.lower_bound_ms:.0f} ms ({report.efficiency:.0%})")
+
+# --- Zero-copy handoff -------------------------
+    # Four 8 MiB frames rendered in processes, then checksummed in processes.
+    # As bytes they are copied back to the parent and pickled into every
+    # downstream task's ctx; as SharedBuffers only their names travel.
+    frames = [f"frame-{n}" for n in range(4)]
+    for render in (render_frame_bytes, render_frame):
+        pipeline = SequentialGroup(f"frames-{render.__name__}", steps=[
+            ParallelGroup("render", [FnStep(f"render-{n}", render, n) for n in range(4)],
+                          executor="process"),
+            ParallelMap("checksum", frames, frame_crc, executor="process", max_workers=4),
+        ])
+        result = run_workflow(pipeline, {})
+        print(f"{render.__name__:<18}: OK={result.ok}, {result.duration_ms} ms")
+
+# --- Tracing -----------------------------------
+    # One span per step with its queue wait; open the file in ui.perfetto.dev.
+    # With max_workers=2 the third download visibly waits for a slot.
+    throttled = SequentialGroup("throttled-workflow", steps=[
+        ParallelGroup("fetch-assets", steps=[
+            SleepStep("download-catalog", 0.3, "catalog", {"n": 120}),
+            SleepStep("download-prices",  0.2, "prices",  {"currency": "USD"}),
+            SleepStep("download-stock",   0.1, "stock",   {"available": True}),
+        ], max_workers=2),
+        validate,
+    ])
+    with Tracer() as tracer:
+        result = run_workflow(throttled, {})
+    trace_path = os.path.join(tempfile.gettempdir(), "composite-trace.json")
+    tracer.export(trace_path)
+    waited = max(tracer.spans, key=lambda sp: sp.queue_wait_us)
+    print(f"Traced {len(tracer.spans)} spans to {trace_path}; longest queue wait: "
+          f"{waited.name} {waited.queue_wait_us / 1000:.0f} ms")
+
+# --- Streaming ParallelMap ---------------------
+    # A lazy source of 100k items, 500 per task, at most 4 tasks in flight:
+    # results are consumed as they complete and never held all at once.
+    def checksum(n: int, ctx: Dict[str, Any]) -> StepResult:
+        return StepResult(True, {"sum": n * n})
+
+    streaming = ParallelMap("checksums", (n for n in range(100_000)), checksum,
+                            max_workers=4, chunk_size=500)
+    start = time.perf_counter()
+    total = sum(res.output["sum"] for _, res in streaming.iter_results({}))
+    print("Streamed total:", total, f"in {(time.perf_counter() - start) * 1000:.0f} ms")
+
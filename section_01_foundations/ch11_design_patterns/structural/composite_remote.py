@@ -0,0 +1,408 @@
+import argparse
+import multiprocessing
+import os
+import pickle
+import selectors
+import socket
+import struct
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass, field
+from itertools import count
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple, Union
+
+from composite_core import StepResult
+from composite_parallel import SleepStep, ParallelGroup, ParallelMap, blur_image
+from composite_runtime import WorkflowRuntime
+
+# A worker-process backend over sockets. RemoteExecutor listens on a Unix
+# socket (or TCP port) and hands pickled tasks to whichever workers connect:
+# local processes it starts itself, or `python composite_remote.py worker
+# ADDRESS` on any host that can import the same modules. Workers send a
+# heartbeat while connected; a worker that disconnects or goes quiet is
+# dropped and its task is re-dispatched to another worker. Each result is
+# sent back as soon as its task finishes.
+#
+# Wire format: a 4-byte big-endian length, then a pickle. Pickles are only
+# safe between trusted peers: bind to localhost or a private Unix socket.
+
+HEADER = struct.Struct("!I")
+HEARTBEAT_INTERVAL = 0.5   # seconds between worker heartbeats
+HEARTBEAT_MISSES = 6       # silent intervals before a worker counts as dead
+
+Address = Union[str, Tuple[str, int]]
+
+class WorkerLost(RuntimeError):
+    """A task's worker died more often than max_redispatch allows."""
+
+def send_msg(sock: socket.socket, msg: Any) -> None:
+    data = pickle.dumps(msg, protocol=pickle.HIGHEST_PROTOCOL)
+    sock.sendall(HEADER.pack(len(data)) + data)
+
+def _recv_exact(sock: socket.socket, n: int) -> Optional[bytes]:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return bytes(buf)
+
+def recv_msg(sock: socket.socket) -> Optional[Any]:
+    """The next message, or None once the peer has closed the connection."""
+    header = _recv_exact(sock, HEADER.size)
+    if header is None:
+        return None
+    data = _recv_exact(sock, HEADER.unpack(header)[0])
+    return None if data is None else pickle.loads(data)
+
+def parse_address(text: str) -> Address:
+    # "host:port" for TCP, anything else is a Unix socket path
+    host, sep, port = text.rpartition(":")
+    if sep and port.isdigit():
+        return host, int(port)
+    return text
+
+def _connect(address: Address) -> socket.socket:
+    if isinstance(address, str):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.connect(address)
+    return sock
+
+# ---------- Worker ----------
+
+def worker_main(address: Address, heartbeat_interval: float = HEARTBEAT_INTERVAL) -> None:
+    """Runs tasks from the executor at `address`, one at a time, until told to stop."""
+    sock = _connect(address)
+    send_lock = threading.Lock()
+    stop = threading.Event()
+
+    def send(msg: Any) -> None:
+        with send_lock:
+            send_msg(sock, msg)
+
+    def heartbeat() -> None:
+        # From a separate thread, so a long task does not look like a dead worker
+        while not stop.wait(heartbeat_interval):
+            try:
+                send(("heartbeat",))
+            except OSError:
+                return
+
+    send(("hello", os.getpid()))
+    threading.Thread(target=heartbeat, name="heartbeat", daemon=True).start()
+    try:
+        while True:
+            msg = recv_msg(sock)
+            if msg is None or msg[0] == "shutdown":
+                break
+            _, task_id, payload = msg
+            try:
+                fn, args = pickle.loads(payload)
+                reply = pickle.dumps(("result", task_id, True, fn(*args)), protocol=pickle.HIGHEST_PROTOCOL)
+            except BaseException as e:
+                try:
+                    reply = pickle.dumps(("result", task_id, False, e))
+                except Exception:
+                    reply = pickle.dumps(("result", task_id, False, RuntimeError(repr(e))))
+            with send_lock:
+                sock.sendall(HEADER.pack(len(reply)) + reply)
+    except (ConnectionError, OSError):
+        pass  # the executor went away
+    finally:
+        stop.set()
+        sock.close()
+
+# ---------- Executor ----------
+
+@dataclass
+class _Task:
+    id: int
+    payload: bytes
+    future: Future
+    attempts: int = 0
+
+@dataclass
+class _Worker:
+    conn: socket.socket
+    buffer: bytearray = field(default_factory=bytearray)
+    pid: Optional[int] = None       # known after "hello"
+    task: Optional[_Task] = None
+    last_seen: float = field(default_factory=time.monotonic)
+
+    def messages(self) -> List[Any]:
+        msgs = []
+        while len(self.buffer) >= HEADER.size:
+            size = HEADER.unpack_from(self.buffer)[0]
+            if len(self.buffer) < HEADER.size + size:
+                break
+            msgs.append(pickle.loads(bytes(self.buffer[HEADER.size:HEADER.size + size])))
+            del self.buffer[:HEADER.size + size]
+        return msgs
+
+class RemoteExecutor(Executor):
+    """
+    concurrent.futures.Executor whose tasks run on socket-connected workers.
+    Options:
+      - num_workers: local worker processes to start (0 = only external workers)
+      - address: Unix socket path or (host, port); defaults to a private Unix socket
+      - heartbeat_interval: how often workers report; a worker silent for
+        HEARTBEAT_MISSES intervals is dropped
+      - max_redispatch: re-runs allowed per task after its worker dies
+      - respawn: replace local workers that die
+    fn and args must be picklable and importable on the workers. A task that
+    is already running cannot be cancelled.
+    """
+    def __init__(self, num_workers: Optional[int] = None, *, address: Optional[Address] = None,
+                 heartbeat_interval: float = HEARTBEAT_INTERVAL, max_redispatch: int = 2,
+                 respawn: bool = True):
+        self.num_workers = (os.cpu_count() or 1) if num_workers is None else num_workers
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_interval * HEARTBEAT_MISSES
+        self.max_redispatch = max_redispatch
+        self.respawn = respawn
+        self.redispatched = 0
+
+        self._tmpdir: Optional[str] = None
+        if address is None:
+            self._tmpdir = tempfile.mkdtemp(prefix="composite-remote-")
+            address = os.path.join(self._tmpdir, "executor.sock")
+        family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+        self._listener = socket.socket(family, socket.SOCK_STREAM)
+        self._listener.bind(address)
+        self._listener.listen()
+        self.address: Address = self._listener.getsockname()
+
+        self._ids = count()
+        self._queue: Deque[_Task] = deque()
+        self._workers: Dict[socket.socket, _Worker] = {}
+        self._processes: List[multiprocessing.Process] = []
+        self._lock = threading.Lock()
+        self._shutdown = False
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._selector = selectors.DefaultSelector()
+        self._selector.register(self._listener, selectors.EVENT_READ)
+        self._selector.register(self._wake_r, selectors.EVENT_READ)
+
+        for _ in range(self.num_workers):
+            self._spawn()
+        self._thread = threading.Thread(target=self._serve, name="remote-dispatcher", daemon=True)
+        self._thread.start()
+
+    # -- Executor API --------------------------------
+
+    def submit(self, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Future:
+        if kwargs:
+            fn, args = _call_with_kwargs, (fn, *args, kwargs)
+        payload = pickle.dumps((fn, args), protocol=pickle.HIGHEST_PROTOCOL)  # fails here, not remotely
+        fut: Future = Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot submit after shutdown")
+            self._queue.append(_Task(next(self._ids), payload, fut))
+        self._wake()
+        return fut
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        with self._lock:
+            self._shutdown = True
+            if cancel_futures:
+                for task in self._queue:
+                    task.future.cancel()
+                self._queue.clear()
+        self._wake()
+        if wait:
+            self._thread.join()
+
+    def live_workers(self) -> List[int]:
+        with self._lock:
+            return [w.pid for w in self._workers.values() if w.pid is not None]
+
+    # -- Dispatcher thread ---------------------------
+
+    def _spawn(self) -> None:
+        p = multiprocessing.Process(target=worker_main, args=(self.address, self.heartbeat_interval),
+                                    name="remote-worker", daemon=True)
+        p.start()
+        self._processes.append(p)
+
+    def _wake(self) -> None:
+        try:
+            self._wake_w.send(b"\0")
+        except OSError:
+            pass  # already closed
+
+    def _serve(self) -> None:
+        try:
+            while True:
+                with self._lock:
+                    busy = any(w.task is not None for w in self._workers.values())
+                    if self._shutdown and not self._queue and not busy:
+                        break
+                for key, _ in self._selector.select(timeout=self.heartbeat_interval):
+                    if key.fileobj is self._listener:
+                        conn, _ = self._listener.accept()
+                        self._selector.register(conn, selectors.EVENT_READ)
+                        with self._lock:
+                            self._workers[conn] = _Worker(conn)
+                    elif key.fileobj is self._wake_r:
+                        self._wake_r.recv(4096)
+                    else:
+                        self._read(self._workers[key.fileobj])
+                self._check_heartbeats()
+                self._reap_processes()
+                self._dispatch()
+        finally:
+            self._close()
+
+    def _read(self, worker: _Worker) -> None:
+        try:
+            data = worker.conn.recv(1 << 16)
+        except OSError:
+            data = b""
+        if not data:
+            self._lost(worker, "connection closed")
+            return
+        worker.buffer += data
+        worker.last_seen = time.monotonic()
+        for msg in worker.messages():
+            if msg[0] == "hello":
+                worker.pid = msg[1]
+            elif msg[0] == "result":
+                _, task_id, ok, value = msg
+                task, worker.task = worker.task, None
+                if task is None or task.id != task_id or task.future.done():
+                    continue  # e.g. a result that arrived after its task was re-dispatched
+                if ok:
+                    task.future.set_result(value)
+                else:
+                    task.future.set_exception(value)
+
+    def _lost(self, worker: _Worker, reason: str) -> None:
+        self._selector.unregister(worker.conn)
+        worker.conn.close()
+        with self._lock:
+            del self._workers[worker.conn]
+            task, worker.task = worker.task, None
+            if task is None:
+                return
+            task.attempts += 1
+            if task.attempts > self.max_redispatch:
+                task.future.set_exception(WorkerLost(
+                    f"task {task.id}: worker {worker.pid} lost ({reason}), tried {task.attempts} time(s)"))
+            else:
+                self.redispatched += 1
+                self._queue.appendleft(task)
+
+    def _check_heartbeats(self) -> None:
+        deadline = time.monotonic() - self.heartbeat_timeout
+        for worker in list(self._workers.values()):
+            if worker.last_seen < deadline:
+                for p in self._processes:
+                    if p.pid == worker.pid:
+                        p.kill()  # one of ours that hangs: make room for a replacement
+                self._lost(worker, "missed heartbeats")
+
+    def _reap_processes(self) -> None:
+        alive = [p for p in self._processes if p.is_alive()]
+        died = len(self._processes) - len(alive)
+        self._processes = alive
+        if self.respawn and not self._shutdown:
+            for _ in range(died):
+                self._spawn()
+
+    def _dispatch(self) -> None:
+        with self._lock:
+            idle = [w for w in self._workers.values() if w.pid is not None and w.task is None]
+            while idle and self._queue:
+                task = self._queue.popleft()
+                if task.attempts == 0 and not task.future.set_running_or_notify_cancel():
+                    continue  # cancelled while queued
+                worker = idle.pop()
+                worker.task = task
+                try:
+                    send_msg(worker.conn, ("task", task.id, task.payload))
+                except OSError:
+                    pass  # noticed as a closed connection on the next read
+            if self._shutdown and not self._workers and not self._processes:
+                # Nobody is left to run these (and nobody new is started)
+                for task in self._queue:
+                    if task.attempts or task.future.set_running_or_notify_cancel():
+                        task.future.set_exception(WorkerLost("no workers left"))
+                self._queue.clear()
+
+    def _close(self) -> None:
+        for worker in list(self._workers.values()):
+            try:
+                send_msg(worker.conn, ("shutdown",))
+            except OSError:
+                pass
+            worker.conn.close()
+        self._workers.clear()
+        for p in self._processes:
+            p.join(timeout=5)
+        self._selector.close()
+        self._listener.close()
+        self._wake_r.close()
+        self._wake_w.close()
+        if self._tmpdir is not None:
+            try:
+                os.remove(self.address)
+                os.rmdir(self._tmpdir)
+            except OSError:
+                pass
+
+def _call_with_kwargs(fn: Callable[..., Any], *args: Any) -> Any:
+    *args, kwargs = args
+    return fn(*args, **kwargs)
+
+
+# ---------- Example: fan-out to socket workers ----------
+
+def _die_once(item: int, ctx: Dict[str, Any]) -> StepResult:
+    # Kills its worker the first time it sees item 3, to show re-dispatch
+    marker = os.path.join(ctx["scratch"], "died")
+    if item == 3 and not os.path.exists(marker):
+        open(marker, "w").close()
+        os._exit(1)
+    return StepResult(True, {f"square-{item}": item * item})
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Socket workers for composite_parallel")
+    sub = parser.add_subparsers(dest="command")
+    worker = sub.add_parser("worker", help="serve an executor at ADDRESS (host:port or socket path)")
+    worker.add_argument("address", type=parse_address)
+    worker.add_argument("--heartbeat", type=float, default=HEARTBEAT_INTERVAL)
+    args = parser.parse_args(argv)
+
+    if args.command == "worker":
+        worker_main(args.address, args.heartbeat)
+        return
+
+    with RemoteExecutor(num_workers=3) as executor:
+        print(f"Executor listening on {executor.address} with workers {executor.live_workers() or '(starting)'}")
+        with WorkflowRuntime(remote=executor):
+            group = ParallelGroup("fetch-remote", steps=[
+                SleepStep("download-catalog", 0.5, "catalog", {"n": 120}),
+                SleepStep("download-prices",  0.3, "prices",  {"currency": "USD"}),
+            ], executor="remote")
+            result = group.run({})
+            print(f"Remote group: OK={result.ok}, {result.duration_ms} ms, keys={sorted(result.output)}")
+
+            squares = ParallelMap("squares", range(8), _die_once, executor="remote", max_workers=3)
+            result = squares.run({"scratch": tempfile.mkdtemp(prefix="composite-remote-demo-")})
+            print(f"With a worker killed mid-run: OK={result.ok}, {len(result.output)} results, "
+                  f"{executor.redispatched} task(s) re-dispatched")
+
+            blur = ParallelMap("blur-remote", ["a.jpg", "b.jpg"], blur_image, executor="remote")
+            result = blur.run({})
+            print(f"Blur on remote workers: OK={result.ok}, {result.duration_ms} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import random
+import time
+from concurrent.futures import wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from composite_core import StepResult, Step, CancelToken, cancel_token, child_context, current_runtime
+from composite_loop import run_step
+from composite_parallel import FlakyStep
+from composite_runtime import WorkflowRuntime
+from composite_scheduling import DurationHistory, group_history
+
+# Retries and hedged requests for composite_parallel steps. ResilientStep
+# retries a failed step after a jittered exponential backoff and, for
+# idempotent steps, launches a duplicate of an attempt that runs longer
+# than the step usually takes.
+
+@dataclass
+class RetryPolicy:
+    """Exponential backoff with jitter: attempt n waits up to base_delay * multiplier**(n-1)."""
+    max_attempts: int = 3
+    base_delay: float = 0.1
+    max_delay: float = 5.0
+    multiplier: float = 2.0
+    jitter: float = 1.0  # fraction of the delay that is randomized (1.0 = "full jitter")
+
+    def delay(self, attempt: int) -> float:
+        capped = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1))
+        return capped * (1 - self.jitter * random.random())
+
+class ResilientStep:
+    """
+    Wraps a step with retries and, optionally, hedging. Failed attempts are
+    retried after a jittered exponential backoff. With hedge=True, an attempt
+    that runs longer than the step's historical hedge_percentile duration gets
+    a duplicate; whichever copy finishes first wins and the other is cancelled
+    through its token. Only idempotent steps should be hedged.
+    The threshold is capped at max_hedge_ratio times the median duration, so
+    the stalls being hedged against cannot push it up until hedging stops.
+    Copies run on the workflow's pool; when no pool thread is free, the step
+    runs without a hedge.
+    Durations are recorded into history, or else the workflow's; hedging needs
+    one of them. The wrapped step's `resources` and `executor` carry over.
+    """
+    def __init__(self, step: Step, *, retry: Optional[RetryPolicy] = None, hedge: bool = False,
+                 hedge_percentile: float = 95, min_samples: int = 5, max_hedge_ratio: float = 3.0,
+                 history: Optional[DurationHistory] = None):
+        self.step = step
+        self.name = step.name
+        self.retry = retry or RetryPolicy(max_attempts=1)
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.min_samples = min_samples
+        self.max_hedge_ratio = max_hedge_ratio
+        self.history = history
+        self.resources = getattr(step, "resources", ())
+        self.executor = getattr(step, "executor", None)
+
+    def _call(self, ctx: Dict[str, Any]) -> StepResult:
+        start = time.perf_counter()
+        try:
+            res = run_step(self.step, ctx)
+        except Exception as e:
+            res = StepResult(False, error=f"{self.name} raised: {e}")
+        res.duration_ms = res.duration_ms or int((time.perf_counter() - start) * 1000)
+        history = group_history(self)
+        if res.ok and history is not None:
+            history.record(self.name, (time.perf_counter() - start) * 1000)
+        return res
+
+    def hedge_threshold_ms(self) -> Optional[float]:
+        """How long an attempt may run before it is hedged (None: no history or too few samples)."""
+        history = group_history(self)
+        if history is None:
+            return None
+        threshold_ms = history.percentile(self.name, self.hedge_percentile, self.min_samples)
+        if threshold_ms is None:
+            return None
+        return min(threshold_ms, self.max_hedge_ratio * history.percentile(self.name, 50))
+
+    def _attempt(self, ctx: Dict[str, Any]) -> StepResult:
+        threshold_ms = self.hedge_threshold_ms() if self.hedge else None
+        if threshold_ms is None:
+            return self._call(ctx)
+
+        runtime = current_runtime()
+        own_runtime = runtime is None
+        if own_runtime:
+            runtime = WorkflowRuntime(2, name=self.name)
+        try:
+            return self._hedged(runtime, ctx, threshold_ms)
+        finally:
+            if own_runtime:
+                runtime.shutdown(wait=False)
+
+    def _hedged(self, runtime: "WorkflowRuntime", ctx: Dict[str, Any], threshold_ms: float) -> StepResult:
+        # Each copy gets its own token so the loser can be stopped. Copies only
+        # take free pool threads: a copy run inline could not be abandoned.
+        parent = cancel_token(ctx)
+        primary_token, hedge_token = CancelToken(parent), CancelToken(parent)
+        primary = runtime.submit(self._call, child_context(ctx, primary_token), caller_runs=False)
+        if primary is None:
+            return self._call(ctx)
+        done, _ = wait([primary], timeout=threshold_ms / 1000)
+        if done:
+            return primary.result()
+
+        hedge = runtime.submit(self._call, child_context(ctx, hedge_token), caller_runs=False)
+        if hedge is None:
+            return primary.result()
+        copies = {primary: (primary_token, hedge_token, False), hedge: (hedge_token, primary_token, True)}
+        pending = set(copies)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                _, other_token, is_hedge = copies[fut]
+                res = fut.result()
+                if res.ok or not pending:
+                    other_token.cancel("hedge lost")
+                    res.hedged = True
+                    res.hedge_won = is_hedge and res.ok
+                    return res
+        raise AssertionError("unreachable")
+
+    def run(self, ctx: Dict[str, Any]) -> StepResult:
+        token = cancel_token(ctx)
+        start = time.perf_counter()
+        for attempt in range(1, self.retry.max_attempts + 1):
+            res = self._attempt(ctx)
+            res.attempts = attempt
+            if res.ok or token.cancelled or attempt == self.retry.max_attempts:
+                break
+            if token.wait(self.retry.delay(attempt)):
+                break
+        res.duration_ms = int((time.perf_counter() - start) * 1000)
+        return res
+
+
+if __name__ == "__main__":
+    flaky = ResilientStep(FlakyStep("download-rates", "rates", {"EUR": 0.92}, failures=2),
+                          retry=RetryPolicy(max_attempts=4, base_delay=0.05))
+    result = flaky.run({})
+    print(f"Retried: OK={result.ok}, attempts={result.attempts}, {result.duration_ms} ms")
+
+    # One call in 20 stalls for 1s; after a few samples, a copy is launched at
+    # the historical p95 and the stalled one is abandoned.
+    stalling = ResilientStep(FlakyStep("download-stock", "stock", {"available": True}, seconds=0.01,
+                                       stall_every=20), hedge=True, history=DurationHistory())
+    runs = [stalling.run({}) for _ in range(60)]
+    print(f"Hedged: {sum(r.hedged for r in runs)} hedges, {sum(r.hedge_won for r in runs)} won, "
+          f"worst {max(r.duration_ms for r in runs)} ms")
@@ -0,0 +1,335 @@
+import contextvars
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor, Future
+from multiprocessing import resource_tracker
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from composite_core import StepResult, Step, CancelToken, plain_context, current_runtime, _current_runtime
+from composite_loop import is_async_step, shared_loop, run_async_step, run_step
+from composite_scheduling import DurationHistory
+from composite_shm import SharedBuffer, call_in_worker, call_in_remote_worker, unpack_outputs, shared_buffers
+from composite_tracing import current_tracer, traced_call, trace_future
+
+# The pools a composite_parallel workflow runs on. A WorkflowRuntime is
+# shared by every group of a run: one thread pool, a process pool and a
+# remote executor for out-of-process steps, and the resource limits that
+# hold back steps tagged with a busy resource.
+
+# ---------- Resource limits ----------
+
+RESOURCE_POLL = 0.01  # seconds between retries while a step's resources are busy
+
+class ConcurrencyLimit:
+    """At most `limit` steps hold the resource at once."""
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._slots = threading.BoundedSemaphore(limit)
+
+    def try_acquire(self) -> bool:
+        return self._slots.acquire(blocking=False)
+
+    def release(self) -> None:
+        self._slots.release()
+
+class TokenBucket:
+    """At most `rate` step starts per second, in bursts of up to `burst`."""
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def release(self) -> None:
+        pass  # tokens come back with time, not when the step ends
+
+def resources_for(step: Any) -> Tuple[str, ...]:
+    """The resource tags of a step: its `resources` attribute, if any."""
+    return tuple(sorted(set(getattr(step, "resources", ()))))
+
+def requires(step: Any, *resources: str) -> Any:
+    """Tags a step with the resources it uses, e.g. requires(SleepStep(...), "db")."""
+    step.resources = tuple(resources)
+    return step
+
+# ---------- Runtime ----------
+
+class _ProcessFuture(Future):
+    """
+    The caller's view of a process pool future. It stays pending while the
+    task is queued, so cancel() works until a worker takes the task and is
+    passed on to the pool; a task the pool cancels is cancelled here too.
+    """
+    def __init__(self, inner: Future):
+        super().__init__()
+        self._inner = inner
+
+    def cancel(self) -> bool:
+        return self._inner.cancel() and super().cancel()
+
+    def running(self) -> bool:
+        return not self.done() and self._inner.running()
+
+class WorkflowRuntime:
+    """
+    One long-lived thread pool shared by every group of a workflow run.
+    max_concurrency caps the pool threads used by the whole run, however deeply
+    groups are nested. When every slot is taken, a group that has none of its
+    own steps in flight runs the next one in its own thread instead ("caller
+    runs"), so a parent blocked on its children always makes progress and the
+    shared pool cannot deadlock; a group with steps in flight waits for a slot.
+    The cap is therefore soft: each thread blocked in a group may run one step
+    on top of it.
+
+    limits caps named resources across the run: an int is a concurrency limit,
+    or pass a ConcurrencyLimit / TokenBucket. A step tagged with a busy resource
+    waits in its group while untagged or other-tagged steps go ahead. Tags
+    without a limit are not restricted. A group must not be tagged with a
+    resource its own children need beyond its limit, or they wait forever.
+
+    remote is the Executor behind the "remote" backend (e.g. a
+    composite_remote.RemoteExecutor); the runtime does not shut it down.
+
+    history is where the run's groups record step durations, unless a group
+    has a history of its own; without either, nothing is recorded.
+
+    SharedBuffers created during the run are freed when the `with` block ends.
+
+        with WorkflowRuntime(max_concurrency=8, limits={"db": 2, "api": TokenBucket(10)}):
+            workflow.run(ctx)
+    """
+    def __init__(self, max_concurrency: int = 16, *, name: str = "workflow",
+                 max_processes: Optional[int] = None, limits: Optional[Dict[str, Any]] = None,
+                 remote: Optional[Executor] = None, history: Optional[DurationHistory] = None):
+        self.max_concurrency = max_concurrency
+        self.remote = remote
+        self.history = history
+        self.limits = {res: ConcurrencyLimit(lim) if isinstance(lim, int) else lim
+                       for res, lim in (limits or {}).items()}
+        self.max_processes = max_processes or os.cpu_count() or 1
+        self._pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix=f"{name}-")
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._process_lock = threading.Lock()
+        self._buffers: List["SharedBuffer"] = []
+        self._buffers_lock = threading.Lock()
+        self._token: Optional[contextvars.Token] = None
+
+    def submit(self, fn: Callable[..., Any], *args: Any, caller_runs: bool = True) -> Optional[Future]:
+        """
+        Runs fn(*args) on a pool thread. When every slot is taken, fn runs
+        right here, or with caller_runs=False, None is returned instead.
+        """
+        if self._slots.acquire(blocking=False):
+            # Workers inherit the caller's context, so nested groups find this runtime
+            fut = self._pool.submit(contextvars.copy_context().run, fn, *args)
+            fut.add_done_callback(lambda _: self._slots.release())  # also fires if cancelled
+            return fut
+        if not caller_runs:
+            return None
+        fut: Future = Future()
+        fut.set_running_or_notify_cancel()
+        try:
+            fut.set_result(fn(*args))
+        except BaseException as e:
+            fut.set_exception(e)
+        return fut
+
+    def submit_process(self, fn: Callable[..., Any], *args: Any) -> Future:
+        """Runs fn(*args) in the run's process pool (created on first use)."""
+        with self._process_lock:
+            if self._process_pool is None:
+                # Workers then share this process's resource tracker; one of their
+                # own would unlink every SharedBuffer they touched when they exit.
+                resource_tracker.ensure_running()
+                self._process_pool = ProcessPoolExecutor(max_workers=self.max_processes)
+        inner = self._process_pool.submit(call_in_worker, fn, *args)
+        outer = _ProcessFuture(inner)
+        owner = current_runtime()  # takes over SharedBuffers the worker returns
+
+        def resolve(f: Future) -> None:
+            if f.cancelled():
+                outer.cancel()
+            elif f.exception() is not None:
+                outer.set_exception(f.exception())
+            else:
+                result = unpack_outputs(f.result())
+                if owner is not None:
+                    owner.adopt_outputs(result)
+                outer.set_result(result)
+
+        inner.add_done_callback(resolve)
+        return outer
+
+    def submit_traced(self, name: str, fn: Callable[..., Any], *args: Any,
+                      ready_us: Optional[float] = None, caller_runs: bool = True) -> Optional[Future]:
+        """
+        submit(), recording a span named `name` when tracing. Its queue wait
+        runs from ready_us (when the caller could first have started it; by
+        default now) until a thread picks it up.
+        """
+        tracer = current_tracer()
+        if tracer is None:
+            return self.submit(fn, *args, caller_runs=caller_runs)
+        return self.submit(traced_call, name, tracer.now_us() if ready_us is None else ready_us, fn, *args,
+                           caller_runs=caller_runs)
+
+    def submit_remote(self, fn: Callable[..., Any], *args: Any) -> Future:
+        if self.remote is None:
+            raise RuntimeError("the remote backend needs WorkflowRuntime(remote=<Executor>)")
+        fut = self.remote.submit(call_in_remote_worker, fn, *args)
+        owner = current_runtime()
+        if owner is not None:
+            fut.add_done_callback(lambda f: f.cancelled() or f.exception() or owner.adopt_outputs(f.result()))
+        return fut
+
+    def adopt(self, buf: "SharedBuffer") -> None:
+        """Frees buf when this runtime's `with` block ends."""
+        with self._buffers_lock:
+            self._buffers.append(buf)
+
+    def adopt_outputs(self, value: Any) -> None:
+        for buf in shared_buffers(value):
+            self.adopt(buf)
+
+    def release_buffers(self) -> None:
+        with self._buffers_lock:
+            buffers, self._buffers = self._buffers, []
+        for buf in buffers:
+            buf.release()
+
+    def submit_step(self, step: Step, ctx: Dict[str, Any], backend: str = "thread", *,
+                    ready_us: Optional[float] = None, caller_runs: bool = True) -> Optional[Future]:
+        if backend in ("process", "remote", "async"):
+            if backend == "process":
+                fut = self.submit_process(_run_step, step, process_context(ctx))
+            elif backend == "remote":
+                fut = self.submit_remote(_run_step, step, process_context(ctx))
+            else:
+                # Runs on the shared event loop: no pool thread or slot is taken
+                fut = shared_loop().submit(run_async_step(step, ctx))
+            tracer = current_tracer()
+            if tracer is not None:
+                trace_future(tracer, step.name, fut, ready_us, backend)
+            return fut
+        return self.submit_traced(step.name, step.run, ctx, ready_us=ready_us, caller_runs=caller_runs)
+
+    def try_acquire(self, resources: Tuple[str, ...]) -> bool:
+        """Takes every limited resource in `resources`, or none of them."""
+        taken = []
+        for res in resources:
+            limit = self.limits.get(res)
+            if limit is None:
+                continue
+            if not limit.try_acquire():
+                for lim in taken:
+                    lim.release()
+                return False
+            taken.append(limit)
+        return True
+
+    def acquire(self, resources: Tuple[str, ...], token: "CancelToken") -> bool:
+        """Blocks until the resources are taken (True) or token is cancelled (False)."""
+        while not self.try_acquire(resources):
+            if token.wait(RESOURCE_POLL):
+                return False
+        return True
+
+    def release(self, resources: Tuple[str, ...]) -> None:
+        for res in resources:
+            limit = self.limits.get(res)
+            if limit is not None:
+                limit.release()
+
+    def try_submit_step(self, step: Step, ctx: Dict[str, Any], backend: str = "thread", *,
+                        ready_us: Optional[float] = None, caller_runs: bool = True) -> Optional[Future]:
+        """
+        submit_step(), or None without running anything if the step's resources
+        are busy (or, with caller_runs=False, every pool thread is).
+        """
+        resources = resources_for(step)
+        if not self.try_acquire(resources):
+            return None
+        try:
+            fut = self.submit_step(step, ctx, backend, ready_us=ready_us, caller_runs=caller_runs)
+        except BaseException:
+            self.release(resources)
+            raise
+        if fut is None:
+            self.release(resources)
+            return None
+        fut.add_done_callback(lambda _: self.release(resources))
+        return fut
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False) -> None:
+        self._pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+    def __enter__(self) -> "WorkflowRuntime":
+        self._token = _current_runtime.set(self)
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        _current_runtime.reset(self._token)
+        self.shutdown()
+        self.release_buffers()
+
+def traced_run(step: Step, ctx: Dict[str, Any]) -> StepResult:
+    """step.run(ctx), recorded as a span when a Tracer is active."""
+    return traced_call(step.name, None, run_step, step, ctx)
+
+def run_workflow(step: Step, ctx: Dict[str, Any], *, max_concurrency: int = 16,
+                 limits: Optional[Dict[str, Any]] = None, remote: Optional[Executor] = None,
+                 history: Optional[DurationHistory] = None) -> StepResult:
+    """Runs a workflow with every group sharing one pool of max_concurrency threads."""
+    with WorkflowRuntime(max_concurrency, name=step.name, limits=limits, remote=remote, history=history):
+        return traced_run(step, ctx)
+
+# ---------- Process backend ----------
+
+BACKENDS = ("thread", "process", "remote")
+OUT_OF_PROCESS = ("process", "remote")  # steps and their inputs are pickled
+
+def backend_for(step: Any, default: str) -> str:
+    """
+    A step may pick its own backend with an `executor` attribute. Steps that
+    dispatch their own children (fans_out = True) always run on a thread:
+    their `executor` applies to the children. Async steps always run on the
+    shared event loop.
+    """
+    if is_async_step(step):
+        return "async"
+    if getattr(step, "fans_out", False):
+        return "thread"
+    backend = getattr(step, "executor", None) or default
+    if backend not in BACKENDS:
+        raise ValueError(f"{step.name}: unknown executor {backend!r}, expected one of {BACKENDS}")
+    return backend
+
+def process_context(ctx: Dict[str, Any]) -> Dict[str, Any]:
+    # A flat, picklable snapshot; cancel tokens cannot cross the process
+    # boundary, so a running process step is only stopped between tasks.
+    return plain_context(ctx)
+
+def check_picklable(obj: Any, what: str) -> None:
+    try:
+        pickle.dumps(obj)
+    except Exception as e:
+        raise TypeError(f"{what} must be picklable to run in a process pool: {e}") from e
+
+def _run_step(step: Step, ctx: Dict[str, Any]) -> StepResult:
+    return step.run(ctx)
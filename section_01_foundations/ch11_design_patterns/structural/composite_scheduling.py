@@ -0,0 +1,105 @@
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, List, Optional
+
+from composite_core import current_runtime
+
+# Duration history and scheduling for composite_parallel groups. Groups
+# record how long each step took; longest_first() uses the medians to start
+# the longest steps first, and ScheduleReport compares a run's makespan
+# with the best any schedule could have done.
+
+class DurationHistory:
+    """
+    The most recent durations (ms) of each step name, for percentile estimates.
+    Only the max_names most recently recorded names are kept, so workflows with
+    a fresh name per step (maps, generated groups) don't grow it forever.
+    """
+    def __init__(self, max_samples: int = 200, max_names: int = 10_000):
+        self.max_samples = max_samples
+        self.max_names = max_names
+        self._samples: "OrderedDict[str, deque]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, name: str, duration_ms: float) -> None:
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.max_samples)
+                if len(self._samples) > self.max_names:
+                    self._samples.popitem(last=False)
+            else:
+                self._samples.move_to_end(name)
+            samples.append(duration_ms)
+
+    def samples(self, name: str) -> List[float]:
+        with self._lock:
+            return list(self._samples.get(name, ()))
+
+    def percentile(self, name: str, q: float, min_samples: int = 1) -> Optional[float]:
+        values = sorted(self.samples(name))
+        if len(values) < max(min_samples, 1):
+            return None
+        return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+DURATION_HISTORY = DurationHistory()  # process-wide; pass it as history= to share samples across runs
+
+def group_history(group: Any) -> Optional[DurationHistory]:
+    """A group's own history, else its workflow's; None when durations are not recorded."""
+    runtime = current_runtime()
+    return getattr(group, "history", None) or (runtime.history if runtime is not None else None)
+
+PRIORITIES = ("fifo", "longest_first")
+
+@dataclass
+class ScheduleReport:
+    """How close a group's run came to the best possible schedule."""
+    makespan_ms: float     # wall time from first submission to last completion
+    lower_bound_ms: float  # no schedule on max_workers can beat this, given the actual durations
+    steps: int
+
+    @property
+    def efficiency(self) -> float:
+        return self.lower_bound_ms / self.makespan_ms if self.makespan_ms else 1.0
+
+def estimate_ms(step: Any, history: DurationHistory) -> Optional[float]:
+    """
+    Expected duration from the step's own median, or for a group never seen
+    before, from its children's. A step with `steps` runs them in sequence
+    and sums them; groups that run their children concurrently estimate
+    themselves through estimate_from_children(history) (see ParallelGroup).
+    """
+    own = history.percentile(step.name, 50)
+    if own is not None:
+        return own
+    from_children = getattr(step, "estimate_from_children", None)
+    if from_children is not None:
+        return from_children(history)
+    est = child_estimates(getattr(step, "steps", None) or [], history)
+    if not est:
+        return None
+    return sum(est)
+
+def child_estimates(steps: List[Any], history: DurationHistory) -> Optional[List[float]]:
+    """estimate_ms() of every step, or None when any of them has no estimate."""
+    est = [estimate_ms(st, history) for st in steps]
+    return None if None in est else est
+
+def expected_durations(steps: List[Any], history: DurationHistory) -> List[float]:
+    """estimate_ms() of every step, for ordering them."""
+    # Steps without history count as the longest known one, so they start
+    # early and get measured; with no history at all, order is unchanged.
+    est = [estimate_ms(st, history) for st in steps]
+    fallback = max((e for e in est if e is not None), default=0.0)
+    return [fallback if e is None else e for e in est]
+
+def longest_first(steps: List[Any], history: DurationHistory) -> List[Any]:
+    """LPT order: the longest expected steps go first (stable for ties)."""
+    est = expected_durations(steps, history)
+    return [st for _, st in sorted(zip(est, steps), key=lambda pair: -pair[0])]
+
+def lower_bound_ms(durations: List[float], workers: int, critical_path: float = 0.0) -> float:
+    if not durations:
+        return 0.0
+    return max(max(durations), sum(durations) / workers, critical_path)
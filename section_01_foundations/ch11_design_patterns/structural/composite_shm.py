@@ -0,0 +1,176 @@
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator
+from multiprocessing import resource_tracker, shared_memory
+
+from composite_core import StepResult, current_runtime
+
+# Shared memory for composite_parallel steps that run in worker processes.
+# Large bytes outputs of process steps come back to the parent through a
+# shared memory block instead of the result pipe, and steps can hand
+# SharedBuffers to each other so only a name and a size are pickled.
+
+# ---------- Process transport ----------
+
+SHM_THRESHOLD = 1 << 20  # outputs at least this big travel through shared memory
+
+@dataclass
+class _ShmPayload:
+    """Stands in for a large bytes-like output on its way from a worker process."""
+    name: str
+    size: int
+    kind: type
+
+    def materialize(self) -> Any:
+        shm = shared_memory.SharedMemory(name=self.name)
+        try:
+            return self.kind(shm.buf[:self.size])
+        finally:
+            shm.close()
+            shm.unlink()
+
+def _to_shm(value: Any) -> Any:
+    if not isinstance(value, (bytes, bytearray)) or len(value) < SHM_THRESHOLD:
+        return value
+    shm = shared_memory.SharedMemory(create=True, size=len(value))
+    shm.buf[:len(value)] = value
+    shm.close()
+    # The parent unlinks it after reading; stop this worker's tracker from doing it too
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return _ShmPayload(shm.name, len(value), type(value))
+
+def _pack(value: Any) -> Any:
+    if isinstance(value, StepResult):
+        value.output = {k: _to_shm(v) for k, v in value.output.items()}
+    elif isinstance(value, list):
+        for _, res in value:
+            _pack(res)
+    return value
+
+def unpack_outputs(value: Any) -> Any:
+    """Reads the outputs call_in_worker() moved to shared memory back, and frees them."""
+    if isinstance(value, StepResult):
+        value.output = {k: v.materialize() if isinstance(v, _ShmPayload) else v
+                        for k, v in value.output.items()}
+    elif isinstance(value, list):
+        for _, res in value:
+            unpack_outputs(res)
+    return value
+
+def call_in_worker(fn: Callable[..., Any], *args: Any) -> Any:
+    """fn(*args) in a process pool worker; large bytes outputs go back through shared memory."""
+    try:
+        return _pack(fn(*args))
+    finally:
+        _detach_all()  # pool workers outlive the task: don't pin its buffers
+
+def call_in_remote_worker(fn: Callable[..., Any], *args: Any) -> Any:
+    """fn(*args) in a composite_remote worker."""
+    global _track_buffers
+    # A remote worker has a resource tracker of its own, which would unlink
+    # the buffers it created or opened when the worker exits
+    _track_buffers = False
+    try:
+        return fn(*args)
+    finally:
+        _detach_all()
+
+# ---------- Shared buffers ----------
+
+# Mappings this process has open, by shared memory name
+_attached: Dict[str, shared_memory.SharedMemory] = {}
+_attached_lock = threading.Lock()
+_track_buffers = True  # whether this process's resource tracker may clean buffers up
+
+class SharedBuffer:
+    """
+    A handle to a block of shared memory, for step outputs too big to copy.
+    Only the name and size are pickled, so a downstream step in any local
+    process or thread reads the same pages through view() without copying.
+    Buffers created inside a WorkflowRuntime, or returned to it by process
+    and remote steps, are freed when the run ends; otherwise call release().
+    Drop every view before the buffer is released.
+    """
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+
+    @classmethod
+    def create(cls, size: int) -> "SharedBuffer":
+        """A new zero-filled buffer; fill it through view()."""
+        shm = _untracked(shared_memory.SharedMemory(create=True, size=max(size, 1)))
+        with _attached_lock:
+            _attached[shm.name] = shm
+        buf = cls(shm.name, size)
+        runtime = current_runtime()
+        if runtime is not None:
+            runtime.adopt(buf)
+        return buf
+
+    @classmethod
+    def from_bytes(cls, data: Any) -> "SharedBuffer":
+        buf = cls.create(len(data))
+        with buf.view() as view:
+            view[:] = data
+        return buf
+
+    def _shm(self) -> shared_memory.SharedMemory:
+        with _attached_lock:
+            shm = _attached.get(self.name)
+            if shm is None:
+                shm = _attached[self.name] = _untracked(shared_memory.SharedMemory(name=self.name))
+            return shm
+
+    def view(self) -> memoryview:
+        """A writable, zero-copy memoryview of the data."""
+        return self._shm().buf[:self.size]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __repr__(self) -> str:
+        return f"SharedBuffer({self.name!r}, size={self.size})"
+
+    def release(self) -> None:
+        """Frees the memory for every process; safe to call more than once."""
+        with _attached_lock:
+            shm = _attached.pop(self.name, None)
+        try:
+            shm = shm or shared_memory.SharedMemory(name=self.name)
+        except FileNotFoundError:
+            return  # already released
+        _close_quietly(shm)
+        if not _track_buffers:
+            resource_tracker.register(shm._name, "shared_memory")  # unlink() unregisters it
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+def _untracked(shm: shared_memory.SharedMemory) -> shared_memory.SharedMemory:
+    # Opening or creating a segment registers it with the resource tracker
+    if not _track_buffers:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+def _close_quietly(shm: shared_memory.SharedMemory) -> None:
+    try:
+        shm.close()
+    except BufferError:
+        pass  # a view is still alive; the mapping goes away with the last one
+
+def _detach_all() -> None:
+    # Unmap (not unlink) every buffer this process opened
+    with _attached_lock:
+        shms = list(_attached.values())
+        _attached.clear()
+    for shm in shms:
+        _close_quietly(shm)
+
+def shared_buffers(value: Any) -> Iterator[SharedBuffer]:
+    """The SharedBuffers among the outputs of a StepResult or ParallelMap chunk."""
+    if isinstance(value, StepResult):
+        yield from (v for v in value.output.values() if isinstance(v, SharedBuffer))
+    elif isinstance(value, list):
+        for _, res in value:
+            yield from shared_buffers(res)
@@ -0,0 +1,153 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from itertools import count
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from composite_core import StepResult
+
+# Step tracing for composite_parallel workflows. Groups, maps and the
+# runtime report every step they start to the active Tracer, which keeps
+# one Span per execution and exports them as Chrome trace events.
+
+@dataclass
+class Span:
+    """One execution of a step (or ParallelMap chunk); times in µs since the tracer started."""
+    id: int
+    name: str
+    parent: Optional[int]
+    queued_us: float
+    start_us: float
+    end_us: float
+    pid: int
+    thread_id: int
+    thread_name: str
+    ok: bool
+    args: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def queue_wait_us(self) -> float:
+        return self.start_us - self.queued_us
+
+_current_tracer: contextvars.ContextVar[Optional["Tracer"]] = \
+    contextvars.ContextVar("current_tracer", default=None)
+_current_span: contextvars.ContextVar[Optional[int]] = \
+    contextvars.ContextVar("current_span", default=None)
+
+def current_tracer() -> Optional["Tracer"]:
+    return _current_tracer.get()
+
+class Tracer:
+    """
+    Records a span for every step a group runs: when it was submitted, when a
+    thread picked it up (the difference is time spent waiting for a pool slot),
+    when it finished, on which thread, and under which parent span. Export the
+    result as Chrome trace-event JSON and open it in chrome://tracing or
+    ui.perfetto.dev.
+
+        with Tracer() as tracer:
+            run_workflow(workflow, ctx)
+        tracer.export("trace.json")
+
+    Steps on the process backend are timed from the parent process: their
+    span covers pickling and the process pool's own queue.
+    """
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._ids = count(1)
+        self._lock = threading.Lock()
+        self._origin_ns = time.perf_counter_ns()
+        self._token: Optional[contextvars.Token] = None
+
+    def now_us(self) -> float:
+        return (time.perf_counter_ns() - self._origin_ns) / 1000
+
+    def new_id(self) -> int:
+        with self._lock:
+            return next(self._ids)
+
+    def record(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def to_chrome(self) -> Dict[str, Any]:
+        events: List[Dict[str, Any]] = []
+        threads: Dict[Tuple[int, int], str] = {}
+        for sp in sorted(self.spans, key=lambda sp: sp.start_us):
+            threads[(sp.pid, sp.thread_id)] = sp.thread_name
+            args = {"span_id": sp.id, "parent": sp.parent, "ok": sp.ok,
+                    "queue_wait_ms": round(sp.queue_wait_us / 1000, 3), **sp.args}
+            events.append({"name": sp.name, "cat": "step", "ph": "X", "ts": round(sp.start_us, 3),
+                           "dur": round(sp.end_us - sp.start_us, 3), "pid": sp.pid, "tid": sp.thread_id,
+                           "args": args})
+            if sp.queue_wait_us > 0:
+                # Async pair: drawn on its own track, outside the worker thread's timeline
+                wait_event = {"name": f"queued: {sp.name}", "cat": "queue", "id": sp.id,
+                              "pid": sp.pid, "tid": sp.thread_id}
+                events.append({**wait_event, "ph": "b", "ts": round(sp.queued_us, 3)})
+                events.append({**wait_event, "ph": "e", "ts": round(sp.start_us, 3)})
+        for (pid, tid), name in threads.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                           "args": {"name": name}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_chrome(), f)
+
+    def __enter__(self) -> "Tracer":
+        self._token = _current_tracer.set(self)
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        _current_tracer.reset(self._token)
+
+def traced_call(name: str, queued_us: Optional[float], fn: Callable[..., Any], *args: Any) -> Any:
+    """Calls fn(*args) inside a span of the active tracer, if any."""
+    tracer = _current_tracer.get()
+    if tracer is None:
+        return fn(*args)
+    span_id = tracer.new_id()
+    parent = _current_span.get()
+    reset = _current_span.set(span_id)  # spans opened by fn become our children
+    start_us = tracer.now_us()
+    result = None
+    try:
+        result = fn(*args)
+        return result
+    finally:
+        _current_span.reset(reset)
+        thread = threading.current_thread()
+        tracer.record(Span(span_id, name, parent, start_us if queued_us is None else queued_us,
+                           start_us, tracer.now_us(), os.getpid(), thread.ident or 0, thread.name,
+                           **_span_outcome(result)))
+
+def _span_outcome(result: Any) -> Dict[str, Any]:
+    if isinstance(result, StepResult):
+        args = {"attempts": result.attempts, "hedged": result.hedged} if result.attempts > 1 or result.hedged else {}
+        return {"ok": result.ok, "args": {"error": result.error, **args} if result.error else args}
+    if isinstance(result, list):  # a ParallelMap chunk
+        return {"ok": all(res.ok for _, res in result), "args": {"items": len(result)}}
+    return {"ok": False, "args": {"error": "raised"}}
+
+def trace_future(tracer: Tracer, name: str, fut: Future,
+                 ready_us: Optional[float] = None, backend: str = "process") -> None:
+    # Worker processes and the event loop cannot reach the tracer, so the
+    # span runs from submission to completion as seen from here.
+    span_id, parent, start_us = tracer.new_id(), _current_span.get(), tracer.now_us()
+    queued_us = start_us if ready_us is None else ready_us
+    thread_id, thread_name = {"process": (0, "process-pool"), "remote": (1, "remote-workers"),
+                              "async": (2, "event-loop")}[backend]
+
+    def done(f: Future) -> None:
+        result = None if f.cancelled() or f.exception() is not None else f.result()
+        outcome = _span_outcome(result)
+        outcome["args"]["backend"] = backend
+        tracer.record(Span(span_id, name, parent, queued_us, start_us, tracer.now_us(),
+                           os.getpid(), thread_id, thread_name, **outcome))
+
+    fut.add_done_callback(done)
@@ -0,0 +1,263 @@
+# test_composite_asyncio.py
+import asyncio
+import threading
+import time
+from typing import Any, Dict, List
+
+import pytest
+
+from composite_core import StepResult, CancelToken, CANCEL_KEY
+from composite_loop import run_step, shared_loop
+from composite_parallel import SleepStep, ParallelGroup, SequentialGroup
+from composite_runtime import run_workflow
+from composite_asyncio import (AResult, ASleep, AFnStep, AParallelGroup, ASequentialGroup, AParallelMap,
+                               Stage, APipeline)
+
+
+class AFail:
+    def __init__(self, name: str, after: float = 0.0):
+        self.name, self.after = name, after
+
+    async def run(self, ctx: Dict[str, Any]) -> AResult:
+        await asyncio.sleep(self.after)
+        return AResult(False, {}, f"{self.name}: boom")
+
+
+class ATracked:
+    """Records how its task ended."""
+    def __init__(self, name: str, seconds: float, log: List[str]):
+        self.name, self.seconds, self.log = name, seconds, log
+
+    async def run(self, ctx: Dict[str, Any]) -> AResult:
+        try:
+            await asyncio.sleep(self.seconds)
+        except asyncio.CancelledError:
+            self.log.append(f"{self.name} cancelled")
+            raise
+        self.log.append(f"{self.name} done")
+        return AResult(True, {self.name: True})
+
+
+def test_parallel_group_runs_async_and_sync_steps_concurrently():
+    group = AParallelGroup("g", [ASleep("a", 0.2, "a", 1), SleepStep("b", 0.2, "b", 2)])
+    start = time.perf_counter()
+    res = asyncio.run(group.run({}))
+
+    assert res.ok and res.output == {"a": 1, "b": 2}
+    assert time.perf_counter() - start < 0.35
+    assert group.last_stats.succeeded == 2
+
+
+def test_fail_fast_cancels_siblings_before_returning():
+    log: List[str] = []
+    group = AParallelGroup("g", [ATracked("slow", 5, log), AFail("bad", after=0.05),
+                                 ATracked("queued", 0, log)],
+                           max_concurrency=2, fail_fast=True)
+
+    async def main():
+        res = await group.run({})
+        return res, {t for t in asyncio.all_tasks() if t is not asyncio.current_task()}
+
+    res, leftover = asyncio.run(main())
+    assert not res.ok
+    assert log == ["slow cancelled"]  # finished before run() returned
+    assert not leftover
+    assert "queued not started (cancelled)" in res.error
+    assert group.last_stats.cancelled == 2 and group.last_stats.failed == 1
+
+
+def test_fail_fast_sets_the_token_of_sync_steps():
+    group = AParallelGroup("g", [SleepStep("sync", 5, "s", 1), AFail("bad", after=0.05)], fail_fast=True)
+    start = time.perf_counter()
+    res = asyncio.run(group.run({}))
+    assert not res.ok
+    assert time.perf_counter() - start < 1
+
+
+def test_step_and_group_timeouts():
+    group = AParallelGroup("g", [ASleep("slow", 5, "s", 1), ASleep("fast", 0, "f", 1)], step_timeout=0.1)
+    res = asyncio.run(group.run({}))
+    assert "slow timed out" in res.error and res.output == {"f": 1}
+    assert group.last_stats.timed_out == 1
+
+    group = AParallelGroup("g", [ASleep(f"s{i}", 5, f"k{i}", i) for i in range(3)],
+                           max_concurrency=1, timeout=0.1)
+    start = time.perf_counter()
+    res = asyncio.run(group.run({}))
+    assert time.perf_counter() - start < 1
+    assert "s0 timed out" in res.error and "s2 not started (timeout)" in res.error
+
+
+def test_max_concurrency_limits_steps_in_flight():
+    running, peak = 0, 0
+
+    async def track(i: int, ctx: Dict[str, Any]) -> AResult:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return AResult(True, {f"k{i}": i})
+
+    group = AParallelGroup("g", [AFnStep(f"s{i}", track, i) for i in range(20)], max_concurrency=3)
+    assert asyncio.run(group.run({})).ok
+    assert peak == 3
+
+
+def test_invalid_max_concurrency():
+    with pytest.raises(ValueError):
+        AParallelGroup("g", [], max_concurrency=0)
+
+
+def test_sequential_group_feeds_forward_and_times_out():
+    async def double(_: Any, ctx: Dict[str, Any]) -> AResult:
+        return AResult(True, {"y": ctx["x"] * 2})
+
+    group = ASequentialGroup("seq", [ASleep("a", 0, "x", 21), AFnStep("b", double, None)])
+    assert asyncio.run(group.run({})).output == {"x": 21, "y": 42}
+
+    group = ASequentialGroup("seq", [ASleep("a", 5, "x", 1)], timeout=0.1)
+    assert "a timed out (group timeout)" in asyncio.run(group.run({})).error
+
+
+def test_parallel_map_pulls_lazily():
+    pulled: List[int] = []
+
+    def source():
+        for i in range(10_000):
+            pulled.append(i)
+            yield i
+
+    async def check(n: int, ctx: Dict[str, Any]) -> AResult:
+        await asyncio.sleep(0)
+        if n == 5:
+            return AResult(False, {}, f"item {n} bad")
+        return AResult(True, {})
+
+    res = asyncio.run(AParallelMap("m", source(), check, max_concurrency=4, fail_fast=True).run({}))
+    assert not res.ok and "item 5 bad" in res.error
+    assert len(pulled) < 20
+
+
+def test_parallel_map_runs_sync_functions_in_threads():
+    def square(n: int, ctx: Dict[str, Any]) -> StepResult:
+        return StepResult(True, {f"sq{n}": n * n})
+
+    res = asyncio.run(AParallelMap("m", range(5), square, max_concurrency=2).run({}))
+    assert res.output == {f"sq{n}": n * n for n in range(5)}
+
+
+def test_pipeline_preserves_items_and_drops_none():
+    def parse(n: int, ctx: Dict[str, Any]) -> Any:
+        return None if n % 2 else n * 10
+
+    async def tag(n: int, ctx: Dict[str, Any]) -> str:
+        return f"item-{n}"
+
+    pipeline = APipeline("p", range(10), [Stage("parse", parse, concurrency=2), Stage("tag", tag)],
+                         output_key="out")
+    res = asyncio.run(pipeline.run({}))
+    assert res.ok
+    assert sorted(res.output["out"]) == sorted(f"item-{n * 10}" for n in range(0, 10, 2))
+    assert pipeline.last_stats["parse"].processed == 10
+
+
+def test_pipeline_backpressure_bounds_items_in_flight():
+    pulled = 0
+
+    async def source():
+        nonlocal pulled
+        for i in range(1000):
+            pulled += 1
+            yield i
+
+    async def slow_sink(n: int, ctx: Dict[str, Any]) -> None:
+        await asyncio.sleep(1)
+
+    async def main():
+        pipeline = APipeline("p", source(), [Stage("fast", lambda n, ctx: n, buffer=4),
+                                             Stage("sink", slow_sink, buffer=4)])
+        task = asyncio.create_task(pipeline.run({}))
+        await asyncio.sleep(0.3)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert pulled <= 4 + 4 + 2 + 2  # buffers, one item per worker, one waiting at the source
+
+
+def test_pipeline_errors():
+    async def bad(n: int, ctx: Dict[str, Any]) -> int:
+        if n % 10 == 0:
+            raise ValueError(f"bad {n}")
+        return n
+
+    pipeline = APipeline("p", range(1000), [Stage("check", bad)], fail_fast=False)
+    res = asyncio.run(pipeline.run({}))
+    assert not res.ok
+    assert "(+80 more)" in res.error
+    assert pipeline.last_stats["check"].failed == 100
+
+    res = asyncio.run(APipeline("p", range(1000), [Stage("check", bad)]).run({}))
+    assert res.error.count("bad") == 1
+
+    with pytest.raises(ValueError):
+        APipeline("p", [], [])
+
+
+# ---------- Async steps in thread workflows ----------
+
+def test_thread_groups_run_async_steps_on_the_shared_loop():
+    group = ParallelGroup("g", [ASleep(f"a{i}", 0.2, f"a{i}", i) for i in range(20)] + [SleepStep("s", 0.2, "s", 1)],
+                          max_workers=21)
+    start = time.perf_counter()
+    res = run_workflow(group, {}, max_concurrency=2)
+
+    assert res.ok
+    assert res.output == {**{f"a{i}": i for i in range(20)}, "s": 1}
+    assert time.perf_counter() - start < 0.6  # the async steps took no pool thread
+
+
+def test_sequential_group_feeds_async_results_forward():
+    async def double(_: Any, ctx: Dict[str, Any]) -> AResult:
+        return AResult(True, {"y": ctx["x"] * 2})
+
+    group = SequentialGroup("seq", [ASleep("a", 0, "x", 21), AFnStep("b", double, None)])
+    assert group.run({}).output == {"x": 21, "y": 42}
+    assert run_workflow(group, {}).output == {"x": 21, "y": 42}
+
+
+def test_cancelling_the_token_cancels_a_running_async_step():
+    log: List[str] = []
+    token = CancelToken()
+    threading.Timer(0.05, token.cancel).start()
+    start = time.perf_counter()
+    res = run_step(ATracked("slow", 5, log), {CANCEL_KEY: token})
+
+    assert not res.ok and res.error == "slow cancelled"
+    assert log == ["slow cancelled"]
+    assert time.perf_counter() - start < 1
+
+
+def test_group_timeout_cancels_its_async_steps():
+    log: List[str] = []
+    group = ParallelGroup("g", [ATracked("slow", 5, log), ASleep("quick", 0, "quick", 1)], timeout=0.1)
+    start = time.perf_counter()
+    res = run_workflow(group, {})
+
+    assert not res.ok
+    assert res.output == {"quick": 1}
+    assert time.perf_counter() - start < 1
+    deadline = time.monotonic() + 1
+    while not log and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert log == ["slow cancelled"]
+
+
+def test_run_step_refuses_to_block_the_shared_loop():
+    async def nested() -> StepResult:
+        return run_step(ASleep("a", 0, "a", 1), {})
+
+    with pytest.raises(RuntimeError, match="cannot block the shared event loop"):
+        shared_loop().submit(nested()).result(timeout=5)
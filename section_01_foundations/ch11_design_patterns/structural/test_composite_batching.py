@@ -0,0 +1,85 @@
+# test_composite_batching.py
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import pytest
+
+from composite_batching import BatchMap, MicroBatcher, BatchedFnStep
+from composite_core import StepResult
+from composite_parallel import ParallelGroup
+from composite_runtime import run_workflow
+
+
+def test_batch_map_calls_batch_fn_per_batch():
+    calls: List[int] = []
+
+    def double_all(items: List[int], ctx: Dict[str, Any]) -> List[Any]:
+        calls.append(len(items))
+        return [StepResult(True, {f"d{i}": i * 2}) if i != 7 else ValueError("seven") for i in items]
+
+    res = BatchMap("double", range(20), double_all, batch_size=8, max_workers=2).run({})
+    assert sorted(calls) == [4, 8, 8]
+    assert not res.ok and "seven" in res.error
+    assert res.output["d19"] == 38 and "d7" not in res.output
+
+
+def test_batch_map_rejects_empty_batches():
+    with pytest.raises(ValueError, match="batch_size must be at least 1"):
+        BatchMap("b", range(3), lambda rows, ctx: [], batch_size=0)
+
+
+def test_micro_batcher_coalesces_concurrent_steps():
+    seen: List[List[int]] = []
+
+    def insert(rows: List[int], ctx: Dict[str, Any]) -> List[StepResult]:
+        seen.append(rows)
+        time.sleep(0.01)
+        return [StepResult(True, {f"row-{r}": r}) for r in rows]
+
+    batcher = MicroBatcher(insert, batch_size=10, max_linger=0.05)
+    try:
+        group = ParallelGroup("insert", [BatchedFnStep(f"insert-{i}", batcher, i) for i in range(30)],
+                              max_workers=30)
+        res = run_workflow(group, {}, max_concurrency=32)
+    finally:
+        batcher.close()
+
+    assert res.ok
+    assert res.output == {f"row-{i}": i for i in range(30)}
+    assert batcher.batches < 30
+    assert sorted(r for rows in seen for r in rows) == list(range(30))
+
+
+def test_micro_batcher_counts_every_batch_under_concurrent_submits():
+    sizes: List[int] = []
+
+    def insert(rows: List[int], ctx: Dict[str, Any]) -> List[StepResult]:
+        sizes.append(len(rows))
+        return [StepResult(True, {}) for _ in rows]
+
+    batcher = MicroBatcher(insert, batch_size=7, max_linger=0.001)
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            futures = [pool.submit(batcher.submit, i, {}) for i in range(500)]
+            results = [f.result().result(timeout=5) for f in futures]
+    finally:
+        batcher.close()
+
+    assert all(res.ok for res in results)
+    assert sum(sizes) == 500 and max(sizes) <= 7
+    assert batcher.batches == len(sizes)
+
+
+def test_micro_batcher_fails_every_item_of_a_failed_batch():
+    def broken(rows: List[int], ctx: Dict[str, Any]) -> List[StepResult]:
+        raise RuntimeError("db down")
+
+    batcher = MicroBatcher(broken, batch_size=2, max_linger=0.01)
+    try:
+        results = [batcher.submit(i, {}) for i in range(2)]
+        assert all(not f.result(1).ok and "db down" in f.result().error for f in results)
+    finally:
+        batcher.close()
+    with pytest.raises(RuntimeError, match="closed"):
+        batcher.submit(3, {})
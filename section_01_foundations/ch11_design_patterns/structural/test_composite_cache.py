@@ -0,0 +1,100 @@
+# test_composite_cache.py
+import time
+from typing import Any, Dict
+
+from composite_core import StepResult
+from composite_parallel import SleepStep, FailStep
+from composite_runtime import backend_for, requires, resources_for
+from composite_cache import MemoryCache, DiskCache, CachedStep
+
+
+class Counting:
+    """Counts its runs and echoes ctx["x"]."""
+    def __init__(self, name: str = "count"):
+        self.name = name
+        self.calls = 0
+
+    def run(self, ctx: Dict[str, Any]) -> StepResult:
+        self.calls += 1
+        return StepResult(True, {"y": ctx.get("x")})
+
+
+def test_cached_step_reuses_output_until_its_inputs_change():
+    step = Counting()
+    cached = CachedStep(step, MemoryCache(), reads=["x"])
+
+    assert cached.run({"x": 1}).output == {"y": 1}
+    assert cached.run({"x": 1, "other": True}).output == {"y": 1}
+    assert cached.run({"x": 2}).output == {"y": 2}
+    assert step.calls == 2
+    st = cached.cache.stats["count"]
+    assert (st.hits, st.misses) == (1, 2)
+
+
+def test_step_state_is_part_of_the_key():
+    cache = MemoryCache()
+    CachedStep(SleepStep("s", 0, "k", "USD"), cache).run({})
+    res = CachedStep(SleepStep("s", 0, "k", "EUR"), cache).run({})
+    assert res.output == {"k": "EUR"}
+    assert cache.stats["s"].misses == 2
+
+
+def test_failures_are_not_cached():
+    cache = MemoryCache()
+    cached = CachedStep(FailStep("bad"), cache)
+    assert not cached.run({}).ok
+    assert not cached.run({}).ok
+    assert cache.stats["bad"].hits == 0
+
+
+def test_memory_cache_expires_and_evicts_least_recently_used():
+    cache = MemoryCache(max_entries=2)
+    cache.put("a", {"a": 1})
+    cache.put("b", {"b": 1})
+    cache.get("a")
+    cache.put("c", {"c": 1})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"a": 1}
+
+    cache.put("t", {"t": 1}, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("t") is None
+
+
+def test_disk_cache_survives_new_instances(tmp_path):
+    step = Counting()
+    for _ in range(2):
+        res = CachedStep(step, DiskCache(str(tmp_path)), reads=["x"], identity="count-v1").run({"x": 5})
+
+    assert res.output == {"y": 5}
+    assert step.calls == 1
+
+
+def test_disk_cache_evicts_past_max_entries(tmp_path):
+    cache = DiskCache(str(tmp_path), max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.put(key, {key: 1})
+        time.sleep(0.01)  # distinct mtimes
+    assert cache.get("a") is None
+    assert cache.get("c") == {"c": 1}
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_unpicklable_output_is_returned_but_not_stored(tmp_path):
+    class Lock:
+        name = "lock"
+        def run(self, ctx):
+            return StepResult(True, {"fn": lambda: None})
+
+    res = CachedStep(Lock(), DiskCache(str(tmp_path))).run({})
+    assert res.ok and callable(res.output["fn"])
+    assert not list(tmp_path.glob("*.pkl"))
+
+
+def test_cached_step_keeps_the_resources_and_executor_of_its_step():
+    step = requires(SleepStep("write", 0, "row", 1), "db")
+    step.executor = "process"
+    cached = CachedStep(step, MemoryCache())
+
+    assert resources_for(cached) == ("db",)
+    assert backend_for(cached, "thread") == "process"
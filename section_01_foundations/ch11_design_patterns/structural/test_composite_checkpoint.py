@@ -0,0 +1,133 @@
+# test_composite_checkpoint.py
+import os
+import threading
+import time
+from typing import Any, Dict, List
+
+import pytest
+
+from composite_core import StepResult
+from composite_parallel import SleepStep, FlakyStep, ParallelGroup
+from composite_runtime import requires, run_workflow
+from composite_scheduling import DurationHistory
+from composite_checkpoint import CheckpointStore, CheckpointedGroup
+
+
+class Counting:
+    def __init__(self, name: str, key: str):
+        self.name = name
+        self.key = key
+        self.calls = 0
+
+    def run(self, ctx: Dict[str, Any]) -> StepResult:
+        self.calls += 1
+        return StepResult(True, {self.key: self.calls})
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = CheckpointStore(os.path.join(tmp_path, "runs.db"))
+    yield store
+    store.close()
+
+
+def test_resume_skips_completed_steps_and_restores_context(store):
+    fetch, validate = Counting("fetch", "catalog"), Counting("validate", "valid")
+    publish = FlakyStep("publish", "published", True, failures=1)
+
+    def build(steps: List[Any]) -> CheckpointedGroup:
+        return CheckpointedGroup("wf", steps, store, run_id="run-1")
+
+    first = build([fetch, validate, publish])
+    assert not first.run({}).ok
+
+    second = build([fetch, validate, publish])
+    ctx: Dict[str, Any] = {}
+    res = second.run(ctx)
+
+    assert res.ok
+    assert second.resumed_steps == 2
+    assert (fetch.calls, validate.calls) == (1, 1)
+    assert ctx == {"catalog": 1, "valid": 1, "published": True}
+    assert res.output == ctx
+
+
+def test_resume_false_discards_old_checkpoints(store):
+    step = Counting("fetch", "catalog")
+    CheckpointedGroup("wf", [step], store, run_id="run-1").run({})
+    group = CheckpointedGroup("wf", [step], store, run_id="run-1", resume=False)
+
+    assert group.run({}).output == {"catalog": 2}
+    assert group.resumed_steps == 0
+
+
+def test_changed_workflow_redoes_from_the_first_mismatch(store):
+    a, b, c = Counting("a", "a"), Counting("b", "b"), Counting("c", "c")
+    CheckpointedGroup("wf", [a, b], store, run_id="run-1").run({})
+    group = CheckpointedGroup("wf", [a, c, b], store, run_id="run-1")
+    group.run({})
+
+    assert group.resumed_steps == 1
+    assert (a.calls, b.calls, c.calls) == (1, 2, 1)
+    assert [cp.step_name for cp in store.load("run-1")] == ["a", "c", "b"]
+
+
+def test_runs_are_kept_apart(store):
+    CheckpointedGroup("wf", [SleepStep("s", 0, "k", 1)], store, run_id="one").run({})
+    CheckpointedGroup("wf", [SleepStep("s", 0, "k", 2)], store, run_id="two").run({})
+    assert sorted(store.runs()) == ["one", "two"]
+    assert store.load("two")[0].result.output == {"k": 2}
+
+
+def test_unpicklable_output_stops_checkpointing_but_not_the_run(store):
+    class Connects:
+        name = "connect"
+        def run(self, ctx):
+            return StepResult(True, {"conn": lambda: None})
+
+    after = Counting("after", "after")
+    group = CheckpointedGroup("wf", [Counting("fetch", "catalog"), Connects(), after], store, run_id="run-1")
+    with pytest.warns(RuntimeWarning, match="cannot checkpoint connect"):
+        res = group.run({})
+
+    assert res.ok and set(res.output) == {"catalog", "conn", "after"}
+    assert [cp.step_name for cp in store.load("run-1")] == ["fetch"]
+
+    resumed = CheckpointedGroup("wf", [Counting("fetch", "catalog"), Connects(), after], store, run_id="run-1")
+    with pytest.warns(RuntimeWarning):
+        assert resumed.run({}).ok
+    assert resumed.resumed_steps == 1
+    assert after.calls == 2
+
+
+def test_steps_run_under_resource_limits_and_are_timed(tmp_path):
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    class Write:
+        def __init__(self, name: str):
+            self.name = name
+
+        def run(self, ctx):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+            return StepResult(True, {self.name: True})
+
+    history = DurationHistory()
+    stores = [CheckpointStore(os.path.join(tmp_path, f"{r}.db")) for r in range(3)]
+    workflow = ParallelGroup("regions", [
+        CheckpointedGroup(f"region-{r}", [requires(Write(f"write-{r}-{i}"), "db") for i in range(3)], stores[r],
+                          history=history)
+        for r in range(3)
+    ], max_workers=3)
+    res = run_workflow(workflow, {}, limits={"db": 1})
+    for s in stores:
+        s.close()
+
+    assert res.ok
+    assert peak[0] == 1
+    assert len(history.samples("write-0-0")) == 1
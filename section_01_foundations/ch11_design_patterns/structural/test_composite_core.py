@@ -0,0 +1,45 @@
+# test_composite_core.py
+from typing import List
+
+from composite_core import CancelToken, Context
+
+
+def test_cancel_token_propagates_to_children_and_callbacks():
+    parent = CancelToken()
+    child = CancelToken(parent=parent)
+    calls: List[str] = []
+    child.on_cancel(lambda: calls.append("child"))
+    unsubscribe = parent.on_cancel(lambda: calls.append("removed"))
+    unsubscribe()
+
+    parent.cancel("timeout")
+    parent.cancel("again")  # only the first cancel counts
+
+    assert child.cancelled and child.reason == "timeout"
+    assert calls == ["child"]
+    assert child.wait(10) is True
+    # Subscribing after the fact calls back right away
+    child.on_cancel(lambda: calls.append("late"))
+    assert calls == ["child", "late"]
+    # A token derived from a cancelled one starts cancelled
+    assert CancelToken(parent=parent).cancelled
+
+
+def test_context_forks_are_isolated():
+    base = Context({"shared": 1})
+    a, b = base.fork(), base.copy()
+    a["shared"] = 2
+    a["own"] = True
+
+    assert b["shared"] == 1 and "own" not in b
+    assert base == {"shared": 1}
+    assert a["shared"] == 2
+
+
+def test_context_chains_are_flattened_past_max_depth():
+    ctx = Context({"k": 0})
+    for i in range(Context.MAX_DEPTH * 2):
+        ctx = ctx.fork()
+        ctx[f"k{i}"] = i
+    assert len(ctx.maps) <= Context.MAX_DEPTH
+    assert ctx["k"] == 0 and ctx[f"k{Context.MAX_DEPTH * 2 - 1}"] == Context.MAX_DEPTH * 2 - 1
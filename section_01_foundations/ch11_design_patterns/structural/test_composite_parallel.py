@@ -0,0 +1,411 @@
+# test_composite_parallel.py
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List
+
+import pytest
+
+from composite_core import StepResult, CancelToken, Context, CANCEL_KEY, cancel_token, plain_context
+from composite_parallel import (SequentialGroup, ParallelGroup, DagGroup, DagNode, ParallelMap, SleepStep, FailStep,
+                                FnStep)
+from composite_runtime import run_workflow
+from composite_scheduling import DURATION_HISTORY, DurationHistory
+
+
+class Record:
+    """Sleeps without looking at the cancel token and logs when it started."""
+    def __init__(self, name: str, seconds: float, log: List[str], key: str = None):
+        self.name = name
+        self.seconds = seconds
+        self.log = log
+        self.key = key or name
+
+    def run(self, ctx: Dict[str, Any]) -> StepResult:
+        self.log.append(self.name)
+        time.sleep(self.seconds)
+        return StepResult(True, {self.key: True})
+
+
+class Reads:
+    """Returns what it saw under `key` when it ran."""
+    def __init__(self, name: str, key: str, seconds: float = 0.0):
+        self.name = name
+        self.key = key
+        self.seconds = seconds
+
+    def run(self, ctx: Dict[str, Any]) -> StepResult:
+        time.sleep(self.seconds)
+        return StepResult(True, {f"{self.name}-saw": ctx.get(self.key)})
+
+
+# ---------- Groups ----------
+
+def test_sequential_group_feeds_outputs_forward_and_stops_on_failure():
+    ctx: Dict[str, Any] = {"base": 1}
+    group = SequentialGroup("seq", [
+        SleepStep("a", 0, "a", 1),
+        Reads("b", "a"),
+        FailStep("c"),
+        SleepStep("d", 0, "d", 4),
+    ])
+    res = group.run(ctx)
+
+    assert not res.ok
+    assert res.output == {"a": 1, "b-saw": 1}
+    assert "c: boom" in res.error
+    assert "d" not in ctx
+
+
+def test_parallel_group_runs_steps_concurrently_and_merges():
+    group = ParallelGroup("par", [SleepStep(f"s{i}", 0.2, f"k{i}", i) for i in range(4)], max_workers=4)
+    start = time.perf_counter()
+    res = group.run({})
+
+    assert res.ok
+    assert res.output == {f"k{i}": i for i in range(4)}
+    assert time.perf_counter() - start < 0.6
+
+
+def test_parallel_group_fail_fast_cancels_running_steps():
+    group = ParallelGroup("par", [SleepStep("slow", 5, "slow", 1), FailStep("bad")],
+                          max_workers=2, fail_fast=True)
+    start = time.perf_counter()
+    res = group.run({})
+
+    assert not res.ok
+    assert "bad: boom" in res.error
+    assert time.perf_counter() - start < 1
+
+
+def test_parallel_group_timeout_reports_stragglers():
+    group = ParallelGroup("par", [SleepStep("slow", 5, "slow", 1), SleepStep("fast", 0, "fast", 1)],
+                          max_workers=2, timeout=0.2)
+    start = time.perf_counter()
+    res = group.run({})
+
+    assert not res.ok
+    assert "slow timed out" in res.error
+    assert res.output == {"fast": 1}
+    assert time.perf_counter() - start < 1
+
+
+def test_timeout_holds_when_every_pool_thread_is_busy():
+    group = ParallelGroup("par", [SleepStep(f"s{i}", 2, f"k{i}", i) for i in range(3)], timeout=0.3)
+    start = time.perf_counter()
+    res = run_workflow(group, {}, max_concurrency=1)
+
+    assert not res.ok and "timed out" in res.error
+    assert time.perf_counter() - start < 1
+
+
+def test_timeout_stops_a_step_the_group_runs_itself():
+    # The outer group holds the only pool thread, so the inner one runs its steps inline
+    inner = ParallelGroup("inner", [SleepStep(f"s{i}", 2, f"k{i}", i) for i in range(3)], timeout=0.3)
+    start = time.perf_counter()
+    res = run_workflow(ParallelGroup("outer", [inner]), {}, max_concurrency=1)
+
+    assert not res.ok
+    assert "s2 timed out" in res.error
+    assert time.perf_counter() - start < 1
+
+
+def test_fail_fast_holds_when_every_pool_thread_is_busy():
+    group = ParallelGroup("par", [FailStep("bad"), SleepStep("slow", 2, "slow", 1)], fail_fast=True)
+    start = time.perf_counter()
+    res = run_workflow(ParallelGroup("outer", [group]), {}, max_concurrency=1)
+
+    assert not res.ok and "bad: boom" in res.error
+    assert time.perf_counter() - start < 1
+
+
+def test_parallel_map_timeout_holds_when_every_pool_thread_is_busy():
+    def slow(n: int, ctx: Dict[str, Any]) -> StepResult:
+        cancel_token(ctx).wait(2)
+        return StepResult(True, {f"n{n}": n})
+
+    mapper = ParallelMap("slow", range(4), slow, timeout=0.3)
+    start = time.perf_counter()
+    res = run_workflow(ParallelGroup("outer", [mapper]), {}, max_concurrency=1)
+
+    assert not res.ok and "timed out" in res.error
+    assert time.perf_counter() - start < 1
+
+
+def test_nested_groups_share_one_runtime():
+    res = run_workflow(ParallelGroup("outer", [
+        ParallelGroup(f"inner-{i}", [SleepStep(f"s{i}{j}", 0.05, f"k{i}{j}", j) for j in range(3)])
+        for i in range(3)
+    ], max_workers=3), {}, max_concurrency=4)
+
+    assert res.ok
+    assert len(res.output) == 9
+
+
+# ---------- DagGroup ----------
+
+def test_dag_group_runs_nodes_when_their_inputs_exist():
+    log: List[str] = []
+    dag = DagGroup("dag", [
+        DagNode(Record("save", 0, log), needs=["a", "b"], produces=["save"]),
+        DagNode(Record("a", 0.05, log), produces=["a"]),
+        DagNode(Record("b", 0.05, log), produces=["b"]),
+    ])
+    res = dag.run({})
+
+    assert res.ok
+    assert log[-1] == "save"
+    assert set(res.output) == {"a", "b", "save"}
+
+
+def test_dag_group_detects_cycles():
+    with pytest.raises(ValueError, match="dependency cycle: .*a.*b.*a|dependency cycle: .*b.*a.*b"):
+        DagGroup("dag", [
+            DagNode(SleepStep("a", 0, "x", 1), needs=["y"], produces=["x"]),
+            DagNode(SleepStep("b", 0, "y", 1), needs=["x"], produces=["y"]),
+        ])
+
+
+def test_dag_group_rejects_two_producers_of_one_key():
+    with pytest.raises(ValueError, match="produced by both"):
+        DagGroup("dag", [
+            DagNode(SleepStep("a", 0, "x", 1), produces=["x"]),
+            DagNode(SleepStep("b", 0, "x", 2), produces=["x"]),
+        ])
+
+
+def test_dag_group_reports_missing_inputs():
+    dag = DagGroup("dag", [DagNode(SleepStep("a", 0, "x", 1), needs=["config"], produces=["x"])])
+    res = dag.run({})
+    assert not res.ok
+    assert "missing inputs" in res.error and "'config'" in res.error
+    assert dag.run({"config": {}}).ok
+
+
+def test_dag_group_skips_only_the_dependents_of_a_failed_node():
+    log: List[str] = []
+    dag = DagGroup("dag", [
+        DagNode(FailStep("fetch"), produces=["raw"]),
+        DagNode(Record("parse", 0, log), needs=["raw"], produces=["parsed"]),
+        DagNode(Record("index", 0, log), needs=["parsed"], produces=["index"]),
+        DagNode(Record("other", 0, log), produces=["other"]),
+    ], fail_fast=False)
+    res = dag.run({})
+
+    assert not res.ok
+    assert log == ["other"]
+    assert "parse skipped (upstream failed)" in res.error
+    assert "index skipped (upstream failed)" in res.error
+    assert res.output == {"other": True}
+
+
+def test_dag_group_fails_a_node_that_does_not_produce_its_keys():
+    dag = DagGroup("dag", [DagNode(SleepStep("a", 0, "x", 1), produces=["x", "y"])])
+    res = dag.run({})
+    assert not res.ok
+    assert "a did not produce y" in res.error
+
+
+def test_dag_nodes_only_see_outputs_produced_before_they_started():
+    dag = DagGroup("dag", [
+        DagNode(Reads("slow", "fast", seconds=0.1), produces=["slow-saw"]),
+        DagNode(SleepStep("fast", 0, "fast", 1), produces=["fast"]),
+        DagNode(Reads("after", "fast"), needs=["fast"], produces=["after-saw"]),
+    ], max_workers=2)
+    res = dag.run({})
+
+    assert res.ok
+    assert res.output["slow-saw"] is None
+    assert res.output["after-saw"] == 1
+
+
+def test_dag_nodes_see_every_upstream_output_in_a_long_chain():
+    def count_inputs(i: int, ctx: Dict[str, Any]) -> StepResult:
+        return StepResult(True, {f"k{i}": sum(f"k{j}" in ctx for j in range(i))})
+
+    n = Context.MAX_DEPTH * 2
+    dag = DagGroup("chain", [DagNode(FnStep(f"n{i}", count_inputs, i), needs=[f"k{i - 1}"] if i else [],
+                                     produces=[f"k{i}"]) for i in range(n)])
+    res = dag.run({"base": True})
+
+    assert res.ok
+    assert res.output == {f"k{i}": i for i in range(n)}
+
+
+def test_dag_group_stops_scheduling_once_its_parent_is_cancelled():
+    log: List[str] = []
+    dag = DagGroup("dag", [
+        DagNode(Record("a", 0.2, log), produces=["a"]),
+        DagNode(Record("b", 0, log), needs=["a"], produces=["b"]),
+    ])
+    token = CancelToken()
+    timer = threading.Timer(0.05, token.cancel)
+    timer.start()
+    res = dag.run({CANCEL_KEY: token})
+    timer.join()
+
+    assert not res.ok
+    assert log == ["a"]
+    assert "b cancelled" in res.error
+
+
+# ---------- Context ----------
+
+def test_parallel_steps_do_not_see_each_others_writes():
+    class Writer:
+        name = "writer"
+        def run(self, ctx):
+            ctx["leak"] = True
+            return StepResult(True)
+
+    group = ParallelGroup("par", [Writer(), Reads("reader", "leak", seconds=0.05)], max_workers=2)
+    res = group.run({})
+    assert res.output == {"reader-saw": None}
+
+
+def test_plain_context_gives_steps_a_json_serializable_dict():
+    def dump(_: Any, ctx: Dict[str, Any]) -> StepResult:
+        try:
+            json.dumps(ctx)
+        except TypeError:
+            return StepResult(True, {"json": json.dumps(plain_context(ctx))})
+        return StepResult(False, error="a fork is not a dict")
+
+    res = ParallelGroup("g", [FnStep("dump", dump, None)]).run({"a": 1})
+    assert res.ok
+    assert json.loads(res.output["json"]) == {"a": 1}
+
+
+# ---------- Maps ----------
+
+def test_parallel_map_pulls_lazily_within_its_window():
+    pulled: List[int] = []
+
+    def source():
+        for i in range(1000):
+            pulled.append(i)
+            yield i
+
+    def square(n: int, ctx: Dict[str, Any]) -> StepResult:
+        return StepResult(True, {"sq": n * n})
+
+    mapper = ParallelMap("squares", source(), square, max_workers=2, chunk_size=10)
+    results = mapper.iter_results({})
+    first = [next(results) for _ in range(5)]
+    results.close()
+
+    assert all(res.ok for _, res in first)
+    assert len(pulled) < 1000
+
+
+def test_parallel_map_merges_and_reports_failures():
+    def check(n: int, ctx: Dict[str, Any]) -> StepResult:
+        if n == 3:
+            return StepResult(False, error=f"item {n} bad")
+        return StepResult(True, {f"n{n}": n})
+
+    res = ParallelMap("check", range(6), check, max_workers=3).run({})
+    assert not res.ok
+    assert "item 3 bad" in res.error
+    assert res.output == {f"n{n}": n for n in range(6) if n != 3}
+
+
+def test_parallel_map_rejects_empty_chunks_and_windows():
+    def noop(n: int, ctx: Dict[str, Any]) -> StepResult:
+        return StepResult(True)
+
+    with pytest.raises(ValueError, match="chunk_size must be at least 1"):
+        ParallelMap("m", range(3), noop, chunk_size=0)
+    with pytest.raises(ValueError, match="window must be at least 1"):
+        ParallelMap("m", range(3), noop, window=0)
+
+
+def _square(n: int, ctx: Dict[str, Any]) -> StepResult:
+    return StepResult(True, {f"sq{n}": n * n})
+
+
+def test_nested_process_groups_run_their_children_in_worker_processes():
+    squares = ParallelMap("squares", range(4), _square, max_workers=2, executor="process")
+    res = run_workflow(ParallelGroup("outer", [squares, SleepStep("nap", 0.01, "napped", True)]), {})
+
+    assert res.ok
+    assert res.output == {"sq0": 0, "sq1": 1, "sq2": 4, "sq3": 9, "napped": True}
+
+
+def _exit_on_one(n: int, ctx: Dict[str, Any]) -> StepResult:
+    if n == 1:
+        os._exit(1)
+    return StepResult(True, {f"n{n}": n})
+
+
+def test_parallel_map_reports_unpicklable_items_as_failed():
+    items = [2, threading.Lock(), 3]
+    res = ParallelMap("squares", items, _square, max_workers=2, executor="process").run({})
+
+    assert not res.ok
+    assert "squares-1 raised" in res.error
+    assert res.output == {"sq2": 4, "sq3": 9}
+
+
+def test_parallel_map_reports_chunks_of_a_dead_worker_as_failed():
+    res = ParallelMap("exits", range(4), _exit_on_one, max_workers=2, executor="process").run({})
+
+    assert not res.ok
+    assert "exits-1 raised" in res.error
+
+
+# ---------- Scheduling ----------
+
+def test_groups_record_durations_only_into_a_history_they_are_given():
+    def workflow() -> SequentialGroup:
+        return SequentialGroup("wf", [
+            ParallelGroup("fetch", [SleepStep("fetch-unrecorded", 0, "a", 1)]),
+            DagGroup("dag", [DagNode(SleepStep("dag-unrecorded", 0, "b", 1), produces=["b"])]),
+            SleepStep("seq-unrecorded", 0, "c", 1),
+        ])
+
+    run_workflow(workflow(), {})
+    names = ("fetch-unrecorded", "dag-unrecorded", "seq-unrecorded")
+    assert all(DURATION_HISTORY.samples(name) == [] for name in names)
+
+    history = DurationHistory()
+    run_workflow(workflow(), {}, history=history)
+    assert all(len(history.samples(name)) == 1 for name in names)
+
+    own = DurationHistory()
+    ParallelGroup("fetch", [SleepStep("fetch-own", 0, "a", 1)], history=own).run({})
+    assert len(own.samples("fetch-own")) == 1
+
+
+def test_parallel_group_longest_first_starts_the_long_step_first():
+    history = DurationHistory()
+    log: List[str] = []
+    steps = [Record("short-1", 0.01, log), Record("short-2", 0.01, log), Record("long", 0.1, log)]
+    ParallelGroup("fifo", steps, max_workers=1, history=history).run({})
+    assert log == ["short-1", "short-2", "long"]
+
+    log.clear()
+    group = ParallelGroup("lpt", steps, max_workers=1, priority="longest_first", history=history)
+    assert group.run({}).ok
+    assert log[0] == "long"
+    report = group.last_report
+    assert report.steps == 3
+    assert report.lower_bound_ms <= report.makespan_ms
+
+
+def test_unknown_priority_is_rejected():
+    with pytest.raises(ValueError, match="priority"):
+        ParallelGroup("par", [], priority="lifo")
+
+
+def test_dag_bottom_levels_follow_the_critical_path():
+    history = DurationHistory()
+    for name, ms in [("a", 10), ("b", 100), ("c", 20)]:
+        history.record(name, ms)
+    a = DagNode(SleepStep("a", 0, "a", 1), produces=["a"])
+    b = DagNode(SleepStep("b", 0, "b", 1), needs=["a"], produces=["b"])
+    c = DagNode(SleepStep("c", 0, "c", 1), produces=["c"])
+    levels = DagGroup("dag", [a, b, c]).bottom_levels(history)
+
+    assert levels == {id(a): 110, id(b): 100, id(c): 20}
@@ -0,0 +1,143 @@
+# test_composite_remote.py
+import os
+import signal
+import subprocess
+import sys
+import time
+from typing import Any, Dict
+
+import pytest
+
+from composite_core import StepResult
+from composite_parallel import ParallelMap
+from composite_runtime import WorkflowRuntime
+from composite_shm import SharedBuffer
+from composite_remote import RemoteExecutor, WorkerLost
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _pid_after(seconds: float) -> int:
+    time.sleep(seconds)
+    return os.getpid()
+
+
+def _announce_and_wait(path: str, seconds: float) -> int:
+    # Tells the test which worker took the task, then stays busy
+    with open(path + ".tmp", "w") as f:
+        f.write(str(os.getpid()))
+    os.replace(path + ".tmp", path)
+    time.sleep(seconds)
+    return os.getpid()
+
+
+def _always_dies() -> None:
+    os._exit(1)
+
+
+def _dies_on_two(item: int, ctx: Dict[str, Any]) -> StepResult:
+    if item == 2:
+        os._exit(1)
+    return StepResult(True, {f"sq{item}": item * item})
+
+
+def _fill(n: int, ctx: Dict[str, Any]) -> StepResult:
+    return StepResult(True, {f"buf{n}": SharedBuffer.from_bytes(bytes([n]) * 4096)})
+
+
+def _wait_for(path: str, timeout: float = 10) -> int:
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(path):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"nobody wrote {path}")
+        time.sleep(0.01)
+    with open(path) as f:
+        return int(f.read())
+
+
+def test_unix_socket_workers_run_tasks_and_raise_their_errors():
+    with RemoteExecutor(num_workers=2) as executor:
+        assert isinstance(executor.address, str)
+        assert executor.submit(pow, 2, 10).result(timeout=10) == 1024
+        assert executor.submit(sorted, [3, 1, 2], reverse=True).result(timeout=10) == [3, 2, 1]
+        with pytest.raises(ValueError):
+            executor.submit(int, "x").result(timeout=10)
+
+
+def test_unpicklable_tasks_fail_at_submit():
+    with RemoteExecutor(num_workers=0) as executor:
+        with pytest.raises(Exception):
+            executor.submit(lambda: None)
+
+
+def test_task_of_a_killed_worker_is_dispatched_again(tmp_path):
+    marker = str(tmp_path / "running")
+    with RemoteExecutor(num_workers=2) as executor:
+        fut = executor.submit(_announce_and_wait, marker, 0.5)
+        victim = _wait_for(marker)
+        os.kill(victim, signal.SIGKILL)
+
+        assert fut.result(timeout=20) != victim
+        assert executor.redispatched == 1
+
+
+def test_tcp_workers_started_by_hand(tmp_path):
+    marker = str(tmp_path / "running")
+    with RemoteExecutor(num_workers=0, address=("127.0.0.1", 0)) as executor:
+        host, port = executor.address
+
+        def start_worker() -> subprocess.Popen:
+            return subprocess.Popen([sys.executable, "composite_remote.py", "worker", f"{host}:{port}"], cwd=HERE)
+
+        first = start_worker()
+        try:
+            fut = executor.submit(_announce_and_wait, marker, 0.5)
+            assert _wait_for(marker) == first.pid
+            first.kill()
+            first.wait()
+
+            second = start_worker()
+            try:
+                assert fut.result(timeout=20) == second.pid
+                assert executor.redispatched == 1
+                assert executor.submit(_pid_after, 0).result(timeout=10) == second.pid
+            finally:
+                executor.shutdown()  # tells the worker to stop
+                second.wait(timeout=10)
+        finally:
+            first.kill()
+
+
+def test_worker_lost_after_max_redispatch():
+    with RemoteExecutor(num_workers=1, max_redispatch=1) as executor:
+        fut = executor.submit(_always_dies)
+        with pytest.raises(WorkerLost, match="tried 2 time"):
+            fut.result(timeout=20)
+        assert executor.redispatched == 1
+        # The replacement worker still serves new tasks
+        assert executor.submit(pow, 3, 2).result(timeout=20) == 9
+
+
+def test_remote_map_reports_lost_chunks_as_failed_items():
+    with RemoteExecutor(num_workers=2, max_redispatch=0) as executor:
+        with WorkflowRuntime(remote=executor):
+            res = ParallelMap("squares", range(5), _dies_on_two, executor="remote", max_workers=2).run({})
+
+    assert not res.ok
+    assert "squares-2 raised: WorkerLost" in res.error
+    assert res.output == {f"sq{i}": i * i for i in (0, 1, 3, 4)}
+
+
+def test_shared_buffers_from_remote_workers_outlive_the_workers():
+    with RemoteExecutor(num_workers=1) as executor:
+        runtime = WorkflowRuntime(remote=executor)
+        res = runtime.submit_remote(_fill, 7, {}).result(timeout=10)
+        runtime.shutdown()
+    time.sleep(0.5)  # the exited worker's resource tracker would unlink it by now
+
+    buf = res.output["buf7"]
+    try:
+        with buf.view() as view:
+            assert bytes(view) == bytes([7]) * 4096
+    finally:
+        buf.release()
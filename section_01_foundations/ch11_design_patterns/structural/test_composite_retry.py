@@ -0,0 +1,76 @@
+# test_composite_retry.py
+import time
+from typing import Any, Dict
+
+from composite_core import StepResult, cancel_token
+from composite_parallel import SleepStep, FlakyStep
+from composite_retry import ResilientStep, RetryPolicy
+from composite_runtime import backend_for, requires, resources_for, run_workflow
+from composite_scheduling import DURATION_HISTORY, DurationHistory
+
+
+class StallsOnce:
+    """Stalls until cancelled on its first run, then answers in 10 ms."""
+    name = "lookup"
+
+    def __init__(self):
+        self.runs = 0
+
+    def run(self, ctx: Dict[str, Any]) -> StepResult:
+        self.runs += 1
+        if cancel_token(ctx).wait(5 if self.runs == 1 else 0.01):
+            return StepResult(False, error="lookup cancelled")
+        return StepResult(True, {"value": self.runs})
+
+
+def _hedging_history() -> DurationHistory:
+    history = DurationHistory()
+    for ms in [10] * 10 + [5000] * 2:  # two earlier stalls
+        history.record("lookup", ms)
+    return history
+
+
+def test_resilient_step_hedges_a_stalled_primary():
+    step = ResilientStep(StallsOnce(), hedge=True, history=_hedging_history())
+    assert step.hedge_threshold_ms() == 30  # capped at 3x the median, not the p95 stall
+
+    start = time.perf_counter()
+    res = run_workflow(step, {}, max_concurrency=4)
+
+    assert res.ok and res.output == {"value": 2}
+    assert res.hedged and res.hedge_won
+    assert time.perf_counter() - start < 1
+
+
+def test_resilient_step_hedges_outside_a_workflow():
+    res = ResilientStep(StallsOnce(), hedge=True, history=_hedging_history()).run({})
+    assert res.ok and res.hedge_won
+
+
+def test_resilient_step_retries_with_backoff():
+    step = ResilientStep(FlakyStep("rates", "rates", 1, seconds=0, failures=2),
+                         retry=RetryPolicy(max_attempts=3, base_delay=0.001))
+    res = step.run({})
+    assert res.ok and res.attempts == 3 and not res.hedged
+
+
+def test_resilient_step_records_durations_only_into_a_history_it_is_given():
+    def step() -> ResilientStep:
+        return ResilientStep(SleepStep("resilient-unrecorded", 0, "a", 1), hedge=True)
+
+    assert step().run({}).ok
+    assert DURATION_HISTORY.samples("resilient-unrecorded") == []
+    assert step().hedge_threshold_ms() is None
+
+    history = DurationHistory()
+    run_workflow(step(), {}, history=history)
+    assert len(history.samples("resilient-unrecorded")) == 1
+
+
+def test_resilient_step_keeps_the_resources_and_executor_of_its_step():
+    step = requires(SleepStep("write", 0, "row", 1), "db")
+    step.executor = "process"
+    resilient = ResilientStep(step, retry=RetryPolicy(max_attempts=2))
+
+    assert resources_for(resilient) == ("db",)
+    assert backend_for(resilient, "thread") == "process"
@@ -0,0 +1,64 @@
+# test_composite_runtime.py
+import threading
+import time
+from typing import Any, Dict
+
+from composite_core import StepResult
+from composite_parallel import ParallelGroup, FnStep
+from composite_runtime import WorkflowRuntime, requires, run_workflow
+
+
+class Concurrency:
+    """Counts how many steps sharing it run at once."""
+    def __init__(self):
+        self.now = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def step(self, name: str, seconds: float = 0.03) -> "FnStep":
+        def run(_: Any, ctx: Dict[str, Any]) -> StepResult:
+            with self.lock:
+                self.now += 1
+                self.peak = max(self.peak, self.now)
+            time.sleep(seconds)
+            with self.lock:
+                self.now -= 1
+            return StepResult(True, {name: True})
+        return FnStep(name, run, None)
+
+
+def test_queued_process_tasks_can_be_cancelled():
+    runtime = WorkflowRuntime(max_processes=1)
+    try:
+        futures = [runtime.submit_process(time.sleep, 0.3) for _ in range(6)]
+        last = futures[-1]
+        assert not last.running()
+        assert last.cancel() and last.cancelled()
+        assert last._inner.cancelled()
+        assert not futures[0].cancel()  # already taken by the worker
+        assert futures[0].result(timeout=10) is None
+    finally:
+        runtime.shutdown(cancel_futures=True)
+    assert all(f.done() for f in futures)
+
+
+def test_process_tasks_cancelled_by_the_pool_are_cancelled_for_the_caller():
+    runtime = WorkflowRuntime(max_processes=1)
+    futures = [runtime.submit_process(time.sleep, 0.3) for _ in range(6)]
+    runtime.shutdown(wait=True, cancel_futures=True)
+
+    assert futures[-1].cancelled()
+    assert futures[0].result(timeout=0) is None
+
+
+def test_resource_limit_caps_concurrency_across_groups():
+    counter = Concurrency()
+    workflow = ParallelGroup("regions", [
+        ParallelGroup(f"region-{r}", [requires(counter.step(f"write-{r}-{i}"), "db") for i in range(3)],
+                      max_workers=3)
+        for r in range(3)
+    ], max_workers=3)
+    res = run_workflow(workflow, {}, max_concurrency=16, limits={"db": 2})
+
+    assert res.ok
+    assert counter.peak == 2
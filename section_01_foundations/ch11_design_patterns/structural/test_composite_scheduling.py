@@ -0,0 +1,49 @@
+# test_composite_scheduling.py
+from composite_parallel import SequentialGroup, ParallelGroup, DagGroup, DagNode, SleepStep
+from composite_scheduling import DurationHistory, estimate_ms, longest_first
+
+
+def test_longest_first_orders_by_history_and_tries_unknown_steps_early():
+    history = DurationHistory()
+    for name, ms in [("short", 10), ("long", 500), ("mid", 100)]:
+        history.record(name, ms)
+    steps = [SleepStep(n, 0, n, 1) for n in ("short", "new", "mid", "long")]
+
+    assert [s.name for s in longest_first(steps, history)] == ["new", "long", "mid", "short"]
+
+
+def test_duration_history_percentiles():
+    history = DurationHistory(max_samples=3)
+    for ms in (1, 2, 3, 100):
+        history.record("a", ms)
+
+    assert history.samples("a") == [2, 3, 100]
+    assert history.percentile("a", 50) == 3
+    assert history.percentile("a", 50, min_samples=4) is None
+
+
+def test_duration_history_forgets_the_least_recently_recorded_names():
+    history = DurationHistory(max_names=2)
+    history.record("a", 1)
+    history.record("b", 5)
+    history.record("a", 2)
+    history.record("c", 6)
+
+    assert history.samples("b") == []
+    assert history.samples("a") == [1, 2]
+    assert history.samples("c") == [6]
+
+
+def test_unseen_groups_are_estimated_from_their_children():
+    history = DurationHistory()
+    for name, ms in [("a", 10), ("b", 100), ("c", 20)]:
+        history.record(name, ms)
+    steps = [SleepStep(n, 0, n, 1) for n in ("a", "b", "c")]
+
+    assert estimate_ms(SequentialGroup("seq", steps), history) == 130
+    assert estimate_ms(ParallelGroup("par", steps, max_workers=3), history) == 100
+    assert estimate_ms(ParallelGroup("narrow", steps, max_workers=1), history) == 130
+    a, b, c = (DagNode(st, produces=[st.name]) for st in steps)
+    b.needs = ["a"]
+    assert estimate_ms(DagGroup("dag", [a, b, c], max_workers=3), history) == 110
+    assert estimate_ms(ParallelGroup("unknown", steps + [SleepStep("new", 0, "new", 1)]), history) is None
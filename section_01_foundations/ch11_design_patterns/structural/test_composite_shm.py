@@ -0,0 +1,45 @@
+# test_composite_shm.py
+import os
+import time
+from typing import Any, Dict
+
+import pytest
+
+from composite_core import StepResult
+from composite_parallel import ParallelGroup, ParallelMap, FnStep
+from composite_shm import SHM_THRESHOLD, SharedBuffer
+
+
+def _big(n: int, ctx: Dict[str, Any]) -> StepResult:
+    data = bytes([n]) * SHM_THRESHOLD
+    return StepResult(True, {f"big{n}": bytearray(data) if n == 1 else data})
+
+
+def _shm_segments() -> set:
+    return {name for name in os.listdir("/dev/shm") if name.startswith("psm_")}
+
+
+@pytest.mark.skipif(not os.path.isdir("/dev/shm"), reason="needs POSIX shared memory in /dev/shm")
+def test_large_process_outputs_come_back_through_shared_memory_and_are_freed():
+    before = _shm_segments()
+    res = ParallelMap("big", range(3), _big, max_workers=2, executor="process").run({})
+
+    assert res.ok
+    assert res.output == {f"big{n}": bytes([n]) * SHM_THRESHOLD for n in range(3)}
+    assert type(res.output["big1"]) is bytearray
+    assert _shm_segments() == before
+
+
+def _fill(n: int, ctx: Dict[str, Any]) -> StepResult:
+    return StepResult(True, {f"buf{n}": SharedBuffer.from_bytes(bytes([n]) * 4096)})
+
+
+def test_shared_buffer_from_a_process_step_outlives_the_pool():
+    res = ParallelGroup("fill", [FnStep("fill-7", _fill, 7)], executor="process").run({})
+    buf = res.output["buf7"]
+    time.sleep(0.5)  # a resource tracker of the exited worker's own would unlink it by now
+    try:
+        with buf.view() as view:
+            assert bytes(view) == bytes([7]) * 4096
+    finally:
+        buf.release()
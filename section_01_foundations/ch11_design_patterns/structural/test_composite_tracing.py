@@ -0,0 +1,24 @@
+# test_composite_tracing.py
+import json
+
+from composite_parallel import SequentialGroup, ParallelGroup, SleepStep
+from composite_runtime import run_workflow
+from composite_tracing import Tracer
+
+
+def test_tracer_records_nested_spans(tmp_path):
+    tracer = Tracer()
+    with tracer:
+        run_workflow(SequentialGroup("wf", [
+            ParallelGroup("fetch", [SleepStep("a", 0.01, "a", 1), SleepStep("b", 0.01, "b", 2)]),
+        ]), {})
+
+    names = {span.name for span in tracer.spans}
+    assert {"wf", "fetch", "a", "b"} <= names
+    by_name = {span.name: span for span in tracer.spans}
+    assert by_name["a"].parent == by_name["fetch"].id
+
+    path = tmp_path / "trace.json"
+    tracer.export(str(path))
+    events = json.loads(path.read_text())["traceEvents"]
+    assert any(e.get("name") == "a" for e in events)